@@ -1,4 +1,3 @@
-import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -6,7 +5,9 @@ from flask_apscheduler import APScheduler
 from flask_cors import CORS
 import os
 
-db = SQLAlchemy()
+from app.database import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 scheduler = APScheduler()
 
@@ -23,10 +24,45 @@ def create_app(config_class=None):
     # Configure CORS
     configure_cors(app)
 
+    # Opt-in profiler; registered before everything it should measure
+    from app import profiling
+    profiling.init_app(app)
+
+    # Time every request; registered early so its hooks wrap the others
+    from app import instrumentation
+    instrumentation.init_app(app)
+
+    from app.slow_queries import slow_query_log
+    slow_query_log.init_app(app)
+
+    # Scope every request to the caller's restaurant
+    from app import tenancy
+    tenancy.init_app(app)
+
     # Initialize extensions
+    from app import database
+    database.configure_binds(app)
     db.init_app(app)
+    database.init_app(app, db)
     migrate.init_app(app, db)
-    scheduler.init_app(app)
+    if not scheduler.running:
+        scheduler.init_app(app)
+
+    from app.recipe_queue import recipe_queue
+    recipe_queue.init_app(app)
+
+    from app.allocation import allocation_coordinator
+    allocation_coordinator.init_app(app)
+
+    from app.recipe_graph import recipe_graph
+    recipe_graph.init_app(app)
+
+    # Created and dropped together with the tables
+    from app import search
+    search.init_app(app)
+
+    from app import dashboard
+    dashboard.init_app(app)
 
     with app.app_context():
         # Import models
@@ -35,29 +71,37 @@ def create_app(config_class=None):
         # Create tables
         db.create_all()
 
+        # Replays its journal, so it needs the tables
+        from app.inventory_engine import inventory_engine
+        inventory_engine.init_app(app)
+
         # Import and register blueprints
         register_blueprints(app)
 
-        # Start the scheduler
-        scheduler.start()
+        # Register CLI commands
+        from app.commands import register_commands
+        register_commands(app)
+
+        # Start the scheduler unless a designated process owns it
+        if app.config.get('SCHEDULER_ENABLED', True):
+            start_scheduler()
 
     return app
 
-def setup_logging(app):
-    """Configure logging for the Flask application."""
-    # Create a file handler
-    handler = logging.StreamHandler()
-    handler.setLevel(logging.DEBUG)
-
-    # Define log format
-    formatter = logging.Formatter(
-        '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
-    )
-    handler.setFormatter(formatter)
+def start_scheduler():
+    """Start the background scheduler in this process if it is not running."""
+    if not scheduler.running:
+        scheduler.start()
 
-    # Add handler to the app's logger
-    app.logger.addHandler(handler)
-    app.logger.setLevel(logging.DEBUG)
+def shutdown_scheduler(wait=True):
+    """Stop the background scheduler, letting running jobs finish when `wait`."""
+    if scheduler.running:
+        scheduler.shutdown(wait=wait)
+
+def setup_logging(app):
+    """Route all logging through the queued JSON pipeline in app.log."""
+    from app import log
+    log.init_app(app)
 
 def configure_cors(app):
     """Configure CORS to allow requests from the frontend."""
@@ -78,7 +122,14 @@ def register_blueprints(app):
         restaurant_routes,
         event_routes,
         stats_routes,
-        recipe_execution_routes
+        recipe_execution_routes,
+        job_routes,
+        export_routes,
+        metrics_routes,
+        admin_routes,
+        search_routes,
+        audit_routes,
+        budget_routes
     )
 
     app.register_blueprint(user_routes.user_bp)
@@ -88,4 +139,11 @@ def register_blueprints(app):
     app.register_blueprint(restaurant_routes.restaurant_bp)
     app.register_blueprint(event_routes.event_bp)
     app.register_blueprint(stats_routes.stats_bp)
-    app.register_blueprint(recipe_execution_routes.recipe_execution_bp)
\ No newline at end of file
+    app.register_blueprint(recipe_execution_routes.recipe_execution_bp)
+    app.register_blueprint(job_routes.job_bp)
+    app.register_blueprint(export_routes.export_bp)
+    app.register_blueprint(metrics_routes.metrics_bp)
+    app.register_blueprint(admin_routes.admin_bp)
+    app.register_blueprint(search_routes.search_bp)
+    app.register_blueprint(audit_routes.audit_bp)
+    app.register_blueprint(budget_routes.budget_bp)
\ No newline at end of file
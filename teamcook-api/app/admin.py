@@ -0,0 +1,30 @@
+# app/admin.py
+
+import hmac
+from functools import wraps
+
+from flask import request, jsonify, current_app
+
+ADMIN_HEADER = 'X-Admin-Token'
+
+
+def admin_error():
+    """None if the request carries a valid admin token, else the reason it does not."""
+    expected = current_app.config.get('ADMIN_TOKEN')
+    if not expected:
+        return 'Admin endpoints are disabled; set ADMIN_TOKEN'
+    supplied = request.headers.get(ADMIN_HEADER, '')
+    if not hmac.compare_digest(supplied.encode(), expected.encode()):
+        return 'Invalid admin token'
+    return None
+
+
+def admin_required(view):
+    """Allow the view only with an X-Admin-Token matching ADMIN_TOKEN."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        error = admin_error()
+        if error:
+            return jsonify({'message': error}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,104 @@
+# app/allocation.py
+
+"""
+In-process coalescing of concurrent stock allocations.
+
+When several requests allocate the same ingredient at once, the first one
+becomes the leader: it waits a few milliseconds for others to join, then
+serves the whole group with one FIFO pass and one commit (see
+app.utils.allocate_batch). The batch runs on a session of its own, so it
+never commits work the leader's request has pending, and a failed batch
+does not roll that work back. Requests arriving while a group is being served
+queue up and the first of them leads the next group, so each caller only
+ever waits for at most one batch ahead of its own.
+"""
+
+import threading
+import time
+
+from app import db
+from app.utils import allocate_batch
+
+
+class _Request:
+    __slots__ = ('amount', 'unit', 'result', 'done', 'lead', 'event')
+
+    def __init__(self, amount, unit):
+        self.amount = amount
+        self.unit = unit
+        self.result = None
+        self.done = False
+        self.lead = False
+        self.event = threading.Event()
+
+
+class _IngredientState:
+    __slots__ = ('busy', 'pending')
+
+    def __init__(self):
+        self.busy = False
+        self.pending = []
+
+
+class AllocationCoordinator:
+    def __init__(self, window_seconds=0.002, max_batch=256):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def init_app(self, app):
+        app.config.setdefault('ALLOCATION_COALESCING', False)
+        app.config.setdefault('ALLOCATION_COALESCE_WINDOW_MS', 2)
+        if app.config['ALLOCATION_COALESCING']:
+            self.window_seconds = app.config['ALLOCATION_COALESCE_WINDOW_MS'] / 1000.0
+            app.extensions['allocation_coordinator'] = self
+
+    def allocate(self, ingredient_id, amount, unit=None):
+        """Same contract as allocate_batch for a single request."""
+        request = _Request(amount, unit)
+        with self._lock:
+            state = self._states.get(ingredient_id)
+            if state is None:
+                state = self._states[ingredient_id] = _IngredientState()
+            state.pending.append(request)
+            if not state.busy:
+                state.busy = True
+                request.lead = True
+
+        if not request.lead:
+            # Woken either with a result or promoted to lead the next batch
+            request.event.wait()
+        if request.done:
+            return request.result
+
+        if self.window_seconds:
+            time.sleep(self.window_seconds)
+        with self._lock:
+            batch = state.pending[:self.max_batch]
+            del state.pending[:self.max_batch]
+
+        try:
+            with db.session.session_factory() as session:
+                results = allocate_batch(ingredient_id, [(r.amount, r.unit) for r in batch], session)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for member, result in zip(batch, results):
+            member.result = result
+            member.done = True
+            if member is not request:
+                member.event.set()
+
+        with self._lock:
+            if state.pending:
+                successor = state.pending[0]
+                successor.lead = True
+                successor.event.set()
+            else:
+                state.busy = False
+                del self._states[ingredient_id]
+        return request.result
+
+
+allocation_coordinator = AllocationCoordinator()
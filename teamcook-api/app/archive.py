@@ -0,0 +1,244 @@
+# app/archive.py
+
+"""
+Archiving of old sales, waste and calendar events.
+
+Rows older than ARCHIVE_AFTER_DAYS (whole days, UTC) are copied to
+`sales_archive`, `waste_archive` and `event_archive` and deleted from the
+live tables. Sales and waste are also added to per-day totals in
+`sales_daily` and `waste_daily`, so reports keep their history without
+scanning the archive. Each batch of ARCHIVE_BATCH_SIZE rows is copied,
+totalled and deleted in its own short transaction, oldest first. An
+interrupted run therefore leaves nothing half-moved and resumes where it
+stopped. Sales still referenced by a recipe job and recurring events that
+have not ended stay live.
+
+`sales_totals` and `waste_totals` combine live rows with the daily totals,
+so callers see the whole history whatever has been archived. Archived data
+has day granularity: a period boundary inside a day includes that whole
+archived day.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, exists, func, or_, and_
+
+from app import db
+from app.models import (
+    Sales, Waste, Event, Stock, RecipeJob, SalesArchive, WasteArchive, EventArchive, SalesDaily, WasteDaily
+)
+
+logger = logging.getLogger(__name__)
+
+sales_table = Sales.__table__
+waste_table = Waste.__table__
+event_table = Event.__table__
+
+
+def cutoff_for(now, after_days):
+    """Start of the first day that stays live."""
+    return (now - timedelta(days=after_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def run(after_days, batch_size, now=None):
+    """Archive everything older than `after_days`; returns the rows moved per table."""
+    now = now or datetime.utcnow()
+    cutoff = cutoff_for(now, after_days)
+    counts = {}
+    for name, archive_batch in (('sales', _archive_sales), ('waste', _archive_waste), ('event', _archive_events)):
+        counts[name] = 0
+        while True:
+            moved = _in_transaction(archive_batch, cutoff, batch_size, now)
+            if not moved:
+                break
+            counts[name] += moved
+    if any(counts.values()):
+        logger.info('Archived rows older than %s: %s', cutoff.date().isoformat(), counts)
+    return counts
+
+
+def _in_transaction(archive_batch, cutoff, batch_size, now):
+    try:
+        moved = archive_batch(cutoff, batch_size, now)
+        db.session.commit()
+        return moved
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _archive_sales(cutoff, batch_size, now):
+    rows = db.session.execute(
+        select(sales_table)
+        .where(sales_table.c.sale_date < cutoff,
+               ~exists().where(RecipeJob.sale_id == sales_table.c.id))
+        .order_by(sales_table.c.sale_date, sales_table.c.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    db.session.execute(insert(SalesArchive.__table__), [{**row._mapping, 'archived_at': now} for row in rows])
+
+    totals = {}
+    for row in rows:
+        total = totals.setdefault((row.restaurant_id, row.sale_date.date(), row.recipe_id), [0, 0.0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += row.quantity
+        total[2] += row.quantity * row.sale_price
+        total[3] += row.cost or 0.0
+    add_to_daily(SalesDaily, ('restaurant_id', 'day', 'recipe_id'), ('sales', 'quantity', 'revenue', 'cost'), totals)
+
+    db.session.execute(delete(sales_table).where(sales_table.c.id.in_([row.id for row in rows])))
+    return len(rows)
+
+
+def _archive_waste(cutoff, batch_size, now):
+    rows = db.session.execute(
+        select(waste_table, Stock.ingredient_id)
+        .outerjoin(Stock, Stock.id == waste_table.c.stock_id)
+        .where(waste_table.c.waste_date < cutoff)
+        .order_by(waste_table.c.waste_date, waste_table.c.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    db.session.execute(insert(WasteArchive.__table__), [{**row._mapping, 'archived_at': now} for row in rows])
+
+    totals = {}
+    for row in rows:
+        total = totals.setdefault(
+            (row.restaurant_id, row.waste_date.date(), row.ingredient_id, row.unit, row.reason), [0, 0.0, 0.0]
+        )
+        total[0] += 1
+        total[1] += row.waste_amount
+        total[2] += row.cost or 0.0
+    add_to_daily(
+        WasteDaily, ('restaurant_id', 'day', 'ingredient_id', 'unit', 'reason'), ('entries', 'amount', 'cost'), totals
+    )
+
+    db.session.execute(delete(waste_table).where(waste_table.c.id.in_([row.id for row in rows])))
+    return len(rows)
+
+
+def _archive_events(cutoff, batch_size, now):
+    rows = db.session.execute(
+        select(event_table)
+        .where(or_(
+            and_(event_table.c.recurrence.is_(None), event_table.c.time < cutoff),
+            and_(event_table.c.recurrence.isnot(None), event_table.c.recurrence_end < cutoff)
+        ))
+        .order_by(event_table.c.time, event_table.c.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    db.session.execute(insert(EventArchive.__table__), [{**row._mapping, 'archived_at': now} for row in rows])
+    db.session.execute(delete(event_table).where(event_table.c.id.in_([row.id for row in rows])))
+    return len(rows)
+
+
+def add_to_daily(model, keys, fields, totals):
+    """Add {key tuple: [field values]} onto the matching daily rows, creating missing ones."""
+    restaurants = {key[0] for key in totals}
+    days = {key[1] for key in totals}
+    existing = {
+        tuple(getattr(row, name) for name in keys): row
+        for row in model.query.filter(model.restaurant_id.in_(restaurants), model.day.in_(days))
+    }
+    for key, values in totals.items():
+        row = existing.get(key)
+        if row is None:
+            db.session.add(model(**dict(zip(keys, key)), **dict(zip(fields, values))))
+        else:
+            for name, value in zip(fields, values):
+                setattr(row, name, getattr(row, name) + value)
+
+
+def sales_totals(restaurant_id, start=None, end=None, recipe_ids=None, by_day=False):
+    """
+    {(recipe_id,) or (day, recipe_id): {'sales', 'quantity', 'revenue', 'cost'}}
+    over live and archived sales in [start, end).
+    """
+    day = func.date(Sales.sale_date)
+    live = db.session.query(
+        *([day] if by_day else []), Sales.recipe_id,
+        func.count(Sales.id), func.sum(Sales.quantity), func.sum(Sales.quantity * Sales.sale_price),
+        func.sum(Sales.cost)
+    ).filter(Sales.restaurant_id == restaurant_id)
+    archived = db.session.query(
+        *([SalesDaily.day] if by_day else []), SalesDaily.recipe_id,
+        func.sum(SalesDaily.sales), func.sum(SalesDaily.quantity), func.sum(SalesDaily.revenue),
+        func.sum(SalesDaily.cost)
+    ).filter(SalesDaily.restaurant_id == restaurant_id)
+    if start is not None:
+        live = live.filter(Sales.sale_date >= start)
+        archived = archived.filter(SalesDaily.day >= start.date())
+    if end is not None:
+        live = live.filter(Sales.sale_date < end)
+        archived = archived.filter(SalesDaily.day < _day_after(end))
+    if recipe_ids is not None:
+        live = live.filter(Sales.recipe_id.in_(recipe_ids))
+        archived = archived.filter(SalesDaily.recipe_id.in_(recipe_ids))
+    group = ([day] if by_day else []) + [Sales.recipe_id]
+    archived_group = ([SalesDaily.day] if by_day else []) + [SalesDaily.recipe_id]
+    return _combine(
+        (live.group_by(*group), archived.group_by(*archived_group)), by_day, ('sales', 'quantity', 'revenue', 'cost')
+    )
+
+
+def waste_totals(restaurant_id, start=None, end=None, ingredient_ids=None, by_day=False):
+    """
+    {(ingredient_id, unit) or (day, ingredient_id, unit): {'entries', 'amount', 'cost'}}
+    over live and archived waste in [start, end).
+    """
+    day = func.date(Waste.waste_date)
+    live = db.session.query(
+        *([day] if by_day else []), Stock.ingredient_id, Waste.unit,
+        func.count(Waste.id), func.sum(Waste.waste_amount), func.sum(Waste.cost)
+    ).outerjoin(Stock, Stock.id == Waste.stock_id).filter(Waste.restaurant_id == restaurant_id)
+    archived = db.session.query(
+        *([WasteDaily.day] if by_day else []), WasteDaily.ingredient_id, WasteDaily.unit,
+        func.sum(WasteDaily.entries), func.sum(WasteDaily.amount), func.sum(WasteDaily.cost)
+    ).filter(WasteDaily.restaurant_id == restaurant_id)
+    if start is not None:
+        live = live.filter(Waste.waste_date >= start)
+        archived = archived.filter(WasteDaily.day >= start.date())
+    if end is not None:
+        live = live.filter(Waste.waste_date < end)
+        archived = archived.filter(WasteDaily.day < _day_after(end))
+    if ingredient_ids is not None:
+        live = live.filter(Stock.ingredient_id.in_(ingredient_ids))
+        archived = archived.filter(WasteDaily.ingredient_id.in_(ingredient_ids))
+    group = ([day] if by_day else []) + [Stock.ingredient_id, Waste.unit]
+    archived_group = ([WasteDaily.day] if by_day else []) + [WasteDaily.ingredient_id, WasteDaily.unit]
+    return _combine((live.group_by(*group), archived.group_by(*archived_group)), by_day, ('entries', 'amount', 'cost'))
+
+
+def archived_waste(restaurant_id, ingredient_id):
+    """Daily totals of the ingredient's archived waste, newest first."""
+    return (WasteDaily.query
+            .filter(WasteDaily.restaurant_id == restaurant_id, WasteDaily.ingredient_id == ingredient_id)
+            .order_by(WasteDaily.day.desc())
+            .all())
+
+
+def _day_after(moment):
+    """Archived days that start before `moment` overlap [.., moment)."""
+    day = moment.date()
+    return day if moment == datetime.combine(day, datetime.min.time()) else day + timedelta(days=1)
+
+
+def _combine(queries, by_day, fields):
+    totals = {}
+    for query in queries:
+        for row in query:
+            row = list(row)
+            if by_day:
+                # SQLite returns date() as text
+                row[0] = row[0] if not isinstance(row[0], str) else datetime.strptime(row[0], '%Y-%m-%d').date()
+            values = row[-len(fields):]
+            entry = totals.setdefault(tuple(row[:-len(fields)]), dict.fromkeys(fields, 0))
+            for name, value in zip(fields, values):
+                entry[name] += value or 0
+    return totals
@@ -0,0 +1,182 @@
+# app/audit.py
+
+"""
+Audit log of system actions (recipe executions, stock imports, ...).
+Recipe runs also record what they used, one `ingredient.processed` or
+`ingredient.sold` entry per ingredient (see `record_consumption`).
+
+Entries are written with `record` in the same transaction as the action
+they describe, so the log never disagrees with the data. They are
+append-only: the ORM refuses to update or delete them. Only `compact`
+removes entries, through Core statements.
+
+Every entry carries its month (YYYYMM) as a partition key. Indexes lead with
+(restaurant, action, subject) for lookups, and the month index lets
+compaction walk one month at a time. Entries older than
+AUDIT_RETENTION_MONTHS are folded into monthly `audit_summary` totals, one
+row per restaurant, action, subject and unit, and then deleted. Each batch
+of AUDIT_COMPACT_BATCH_SIZE rows commits on its own, so locks stay short and
+an interrupted run resumes where it stopped.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, select, delete, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import AuditLog, AuditSummary
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogImmutable(RuntimeError):
+    pass
+
+
+@event.listens_for(AuditLog, 'before_update')
+@event.listens_for(AuditLog, 'before_delete')
+def _append_only(mapper, connection, target):
+    raise AuditLogImmutable('Audit log entries cannot be changed')
+
+
+def month_key(moment):
+    return moment.year * 100 + moment.month
+
+
+def record(restaurant_id, action, subject_type=None, subject_id=None, quantity=None, unit=None,
+           details=None, at=None):
+    """Add an entry to the current transaction; the caller commits."""
+    at = at or datetime.utcnow()
+    entry = AuditLog(
+        restaurant_id=restaurant_id,
+        occurred_at=at,
+        month=month_key(at),
+        action=action,
+        subject_type=subject_type,
+        subject_id=subject_id,
+        quantity=quantity,
+        unit=unit,
+        details=details
+    )
+    db.session.add(entry)
+    return entry
+
+
+def record_consumption(restaurant_id, action, recipe_lines, times, details, at=None):
+    """
+    Add one `action` entry per recipe line for the ingredient it used, with
+    the amount this run took, so later recipe edits leave the history alone.
+    """
+    for ri in recipe_lines:
+        record(restaurant_id, action, 'ingredient', ri.ingredient_id,
+               quantity=ri.required_amount * times, unit=ri.unit, details=details, at=at)
+
+
+def entries(restaurant_id, action=None, subject_type=None, subject_ids=None, start=None, end=None,
+            before=None, limit=DEFAULT_LIMIT):
+    """Newest entries first; `before` is the id of the last entry of the previous page."""
+    query = AuditLog.query.filter(AuditLog.restaurant_id == restaurant_id)
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if subject_type:
+        query = query.filter(AuditLog.subject_type == subject_type)
+    if subject_ids is not None:
+        query = query.filter(AuditLog.subject_id.in_(subject_ids))
+    if start:
+        query = query.filter(AuditLog.occurred_at >= start)
+    if end:
+        query = query.filter(AuditLog.occurred_at < end)
+    if before:
+        cursor = db.session.get(AuditLog, before)
+        if cursor is not None:
+            query = query.filter(tuple_(AuditLog.occurred_at, AuditLog.id) < (cursor.occurred_at, cursor.id))
+    return query.order_by(AuditLog.occurred_at.desc(), AuditLog.id.desc()).limit(limit).all()
+
+
+def summaries(restaurant_id, action=None, subject_ids=None):
+    query = AuditSummary.query.filter(AuditSummary.restaurant_id == restaurant_id)
+    if action:
+        query = query.filter(AuditSummary.action == action)
+    if subject_ids is not None:
+        query = query.filter(AuditSummary.subject_id.in_(subject_ids))
+    return query.order_by(AuditSummary.month.desc(), AuditSummary.id).all()
+
+
+def cutoff_month(now, retention_months):
+    """First month whose entries are kept in full."""
+    months = now.year * 12 + now.month - 1 - retention_months
+    return (months // 12) * 100 + months % 12 + 1
+
+
+def compact(retention_months, batch_size, now=None):
+    """Fold entries older than the retention window into monthly summaries."""
+    cutoff = cutoff_month(now or datetime.utcnow(), retention_months)
+    counts = {'entries': 0, 'batches': 0}
+    while True:
+        try:
+            compacted = _compact_batch(cutoff, batch_size)
+        except IntegrityError:
+            # A concurrent compaction created one of the summaries first; merge into it
+            compacted = _compact_batch(cutoff, batch_size)
+        if not compacted:
+            break
+        counts['entries'] += compacted
+        counts['batches'] += 1
+    if counts['entries']:
+        logger.info('Compacted %d audit entries older than %d', counts['entries'], cutoff)
+    return counts
+
+
+def _compact_batch(cutoff, batch_size):
+    table = AuditLog.__table__
+    try:
+        rows = db.session.execute(
+            select(table.c.id, table.c.restaurant_id, table.c.month, table.c.action, table.c.subject_type,
+                   table.c.subject_id, table.c.unit, table.c.quantity, table.c.occurred_at)
+            .where(table.c.month < cutoff)
+            .order_by(table.c.month, table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return 0
+
+        totals = {}
+        for row in rows:
+            key = (row.restaurant_id, row.month, row.action, row.subject_type, row.subject_id, row.unit)
+            total = totals.setdefault(key, [0, 0.0, row.occurred_at, row.occurred_at])
+            total[0] += 1
+            total[1] += row.quantity or 0.0
+            total[2] = min(total[2], row.occurred_at)
+            total[3] = max(total[3], row.occurred_at)
+
+        months = {key[1] for key in totals}
+        existing = {
+            (s.restaurant_id, s.month, s.action, s.subject_type, s.subject_id, s.unit): s
+            for s in AuditSummary.query.filter(AuditSummary.month.in_(months))
+        }
+        for key, (count, quantity, first_at, last_at) in totals.items():
+            summary = existing.get(key)
+            if summary is None:
+                restaurant_id, month, action, subject_type, subject_id, unit = key
+                db.session.add(AuditSummary(
+                    restaurant_id=restaurant_id, month=month, action=action, subject_type=subject_type,
+                    subject_id=subject_id, unit=unit, entries=count, quantity=quantity,
+                    first_at=first_at, last_at=last_at
+                ))
+            else:
+                summary.entries += count
+                summary.quantity += quantity
+                summary.first_at = min(summary.first_at, first_at)
+                summary.last_at = max(summary.last_at, last_at)
+
+        db.session.execute(delete(table).where(table.c.id.in_([row.id for row in rows])))
+        db.session.commit()
+        return len(rows)
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,399 @@
+# app/budget.py
+
+"""
+Budget and food-cost analytics.
+
+Spend is the purchase cost of stock (`Stock.cost`) by purchase day. Lots of
+processed ingredients are made in house, so their cost is reported as
+`produced` rather than spend. Revenue is sale price x quantity. A sale's
+actual food cost is the cost of the lots it drew (`Sales.cost`). Its
+theoretical food cost is what the recipe should have cost: every recipe line
+priced at its ingredient's latest purchase price (`ingredient_price`), as of
+when the sale was rolled up. Sales recorded before costs were tracked count
+towards revenue only, and food-cost ratios divide by `costed_revenue`.
+
+Reports read daily rollups instead of scanning stock and sales. `roll_up`
+adds the rows past each source's `budget_rollup_state.rolled_id` onto
+`budget_spend_daily` and `budget_recipe_daily`, in id ranges that commit on
+their own. It only goes up to the highest id seen by the previous run, so a
+transaction still in flight back then has committed by the time its rows are
+read. Queries add the few rows past `rolled_id` from the live tables, so
+their results are complete whenever the job last ran. A row is rolled up
+once: later edits of a lot's cost are not reflected, and deleting an expired
+lot does not undo its spend.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, func, case
+
+from app import db
+from app.archive import add_to_daily
+from app.dashboard import bucket_start, bucket_starts
+from app.models import (
+    Stock, Sales, SalesArchive, Ingredient, Recipe, RecipeIngredient, Restaurant,
+    BudgetSpendDaily, BudgetRecipeDaily, IngredientPrice, BudgetRollupState
+)
+from app.units import ingredient_units, UnitConversionError
+
+DEFAULT_DAYS = 30
+MAX_PERIOD_DAYS = 366
+SORTS = ('variance', 'revenue', 'actual_food_cost', 'quantity')
+
+SPEND_KEYS = ('restaurant_id', 'day', 'ingredient_type')
+SPEND_FIELDS = ('lots', 'spend')
+SALES_KEYS = ('restaurant_id', 'day', 'recipe_id')
+SALES_FIELDS = ('sales', 'quantity', 'revenue', 'costed_revenue', 'actual_cost', 'theoretical_cost')
+
+logger = logging.getLogger(__name__)
+
+
+# Rollups
+
+def roll_up(batch_size, settle=True):
+    """
+    Roll new stock and sales rows into the daily tables; returns the rows
+    rolled per source. `settle=False` also takes rows seen for the first
+    time, for backfills while nothing else writes.
+    """
+    counts = {}
+    # Stock first, so sales are priced with the purchases made before them
+    for source, roll in (('stock', _roll_stock), ('sales', _roll_sales)):
+        state = db.session.get(BudgetRollupState, source)
+        if state is None:
+            state = BudgetRollupState(source=source, rolled_id=0)
+            db.session.add(state)
+        current = _max_id(source)
+        limit = current if not settle else state.horizon
+        counts[source] = 0
+        while limit is not None and state.rolled_id < limit:
+            upper = min(state.rolled_id + batch_size, limit)
+            try:
+                counts[source] += roll(state.rolled_id, upper)
+                state.rolled_id = upper
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        state.horizon = current
+        db.session.commit()
+    if any(counts.values()):
+        logger.info('Rolled up budget rows: %s', counts)
+    return counts
+
+
+def _max_id(source):
+    if source == 'stock':
+        return db.session.execute(select(func.max(Stock.id))).scalar()
+    # Archived sales keep their ids
+    ids = [db.session.execute(select(func.max(model.id))).scalar() for model in (Sales, SalesArchive)]
+    return max((i for i in ids if i is not None), default=None)
+
+
+def _roll_stock(lower, upper):
+    rows = db.session.execute(
+        select(Stock.restaurant_id, Stock.ingredient_id, Stock.unit, Stock.cost, Stock.initial_amount,
+               Stock.amount, Stock.purchase_date, Ingredient.type)
+        .outerjoin(Ingredient, Ingredient.id == Stock.ingredient_id)
+        .where(Stock.id > lower, Stock.id <= upper)
+    ).all()
+    if not rows:
+        return 0
+    ingredients = {
+        ingredient.id: ingredient
+        for ingredient in Ingredient.query.filter(Ingredient.id.in_({row.ingredient_id for row in rows}))
+    }
+
+    totals = {}
+    latest = {}  # ingredient id -> [day, restaurant id, cost, amount in the ingredient's unit]
+    for row in rows:
+        day = (row.purchase_date or datetime.utcnow()).date()
+        total = totals.setdefault((row.restaurant_id, day, row.type or 'Raw'), [0, 0.0])
+        total[0] += 1
+        total[1] += row.cost
+
+        ingredient = ingredients.get(row.ingredient_id)
+        purchased = row.initial_amount or row.amount
+        if ingredient is None or not purchased:
+            continue
+        try:
+            amount = ingredient_units(ingredient).to_ingredient_unit(purchased, row.unit)
+        except UnitConversionError:
+            continue
+        seen = latest.get(row.ingredient_id)
+        if seen is None or day > seen[0]:
+            latest[row.ingredient_id] = [day, row.restaurant_id, row.cost, amount]
+        elif day == seen[0]:
+            seen[2] += row.cost
+            seen[3] += amount
+    add_to_daily(BudgetSpendDaily, SPEND_KEYS, SPEND_FIELDS, totals)
+
+    prices = {price.ingredient_id: price
+              for price in IngredientPrice.query.filter(IngredientPrice.ingredient_id.in_(latest))}
+    for ingredient_id, (day, restaurant_id, cost, amount) in latest.items():
+        price = prices.get(ingredient_id)
+        if price is None:
+            db.session.add(IngredientPrice(ingredient_id=ingredient_id, restaurant_id=restaurant_id,
+                                           price=cost / amount, priced_on=day))
+        elif day >= price.priced_on:
+            price.price = cost / amount
+            price.priced_on = day
+    return len(rows)
+
+
+def _roll_sales(lower, upper):
+    totals = _priced(_sales_rows(lower, upper))
+    add_to_daily(BudgetRecipeDaily, SALES_KEYS, SALES_FIELDS, {key: list(values.values()) for key, values in totals.items()})
+    return sum(values['sales'] for values in totals.values())
+
+
+def standard_costs(recipe_ids):
+    """{recipe_id: cost of one unit at the latest purchase prices}; unpriced lines count as zero."""
+    if not recipe_ids:
+        return {}
+    lines = db.session.execute(
+        select(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id, RecipeIngredient.required_amount,
+               RecipeIngredient.unit)
+        .where(RecipeIngredient.recipe_id.in_(recipe_ids))
+    ).all()
+    ingredient_ids = {line.ingredient_id for line in lines}
+    ingredients = {ingredient.id: ingredient
+                   for ingredient in Ingredient.query.filter(Ingredient.id.in_(ingredient_ids))}
+    prices = dict(db.session.execute(
+        select(IngredientPrice.ingredient_id, IngredientPrice.price)
+        .where(IngredientPrice.ingredient_id.in_(ingredient_ids))
+    ).all())
+
+    costs = dict.fromkeys(recipe_ids, 0.0)
+    for line in lines:
+        ingredient = ingredients.get(line.ingredient_id)
+        price = prices.get(line.ingredient_id)
+        if ingredient is None or price is None:
+            continue
+        try:
+            costs[line.recipe_id] += ingredient_units(ingredient).to_ingredient_unit(line.required_amount, line.unit) * price
+        except UnitConversionError:
+            continue
+    return costs
+
+
+def _sales_rows(lower, upper=None, start=None, end=None, restaurant_id=None):
+    """
+    {(restaurant_id, day, recipe_id): [sales, quantity, revenue, costed
+    revenue, costed quantity, actual cost]} of live and archived sales with
+    ids in (lower, upper].
+    """
+    rows = {}
+    for table in (Sales.__table__, SalesArchive.__table__):
+        day = func.date(table.c.sale_date)
+        costed = table.c.cost.isnot(None)
+        revenue = table.c.quantity * table.c.sale_price
+        query = (
+            select(table.c.restaurant_id, day, table.c.recipe_id, func.count(table.c.id), func.sum(table.c.quantity),
+                   func.sum(revenue), func.sum(case((costed, revenue), else_=0.0)),
+                   func.sum(case((costed, table.c.quantity), else_=0.0)), func.sum(table.c.cost))
+            .where(table.c.id > lower)
+            .group_by(table.c.restaurant_id, day, table.c.recipe_id)
+        )
+        if upper is not None:
+            query = query.where(table.c.id <= upper)
+        if start is not None:
+            query = query.where(table.c.sale_date >= start, table.c.sale_date < end)
+        if restaurant_id is not None:
+            query = query.where(table.c.restaurant_id == restaurant_id)
+        for restaurant, sold, recipe_id, *values in db.session.execute(query):
+            entry = rows.setdefault((restaurant, _as_date(sold), recipe_id), [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+            for i, value in enumerate(values):
+                entry[i] += value or 0
+    return rows
+
+
+def _priced(rows):
+    """Turn _sales_rows output into SALES_FIELDS totals, pricing the recipes at today's standard cost."""
+    standard = standard_costs({recipe_id for _, _, recipe_id in rows})
+    return {
+        key: dict(zip(SALES_FIELDS, (sales, quantity, revenue, costed_revenue, actual,
+                                     costed_quantity * standard.get(key[2], 0.0))))
+        for key, (sales, quantity, revenue, costed_revenue, costed_quantity, actual) in rows.items()
+    }
+
+
+def _stock_rows(lower, start, end, restaurant_id=None):
+    """{(restaurant_id, day, ingredient_type): [lots, spend]} of lots with ids past `lower`."""
+    day = func.date(Stock.purchase_date)
+    query = (
+        select(Stock.restaurant_id, day, Ingredient.type, func.count(Stock.id), func.sum(Stock.cost))
+        .outerjoin(Ingredient, Ingredient.id == Stock.ingredient_id)
+        .where(Stock.id > lower, Stock.purchase_date >= start, Stock.purchase_date < end)
+        .group_by(Stock.restaurant_id, day, Ingredient.type)
+    )
+    if restaurant_id is not None:
+        query = query.where(Stock.restaurant_id == restaurant_id)
+    rows = {}
+    for restaurant, purchased, type_, lots, spend in db.session.execute(query):
+        entry = rows.setdefault((restaurant, _as_date(purchased), type_ or 'Raw'), [0, 0.0])
+        entry[0] += lots
+        entry[1] += spend or 0.0
+    return rows
+
+
+# Queries
+
+def spend(start, end, by, restaurant_id=None):
+    """{key over `by` (names from SPEND_KEYS): {'lots', 'spend'}} for lots bought on days in [start, end)."""
+    totals = _rolled(BudgetSpendDaily, SPEND_FIELDS, start, end, by, restaurant_id)
+    tail = _stock_rows(_rolled_id('stock'), _midnight(start), _midnight(end), restaurant_id)
+    for key, values in tail.items():
+        _add(totals, _project(key, SPEND_KEYS, by), dict(zip(SPEND_FIELDS, values)))
+    return totals
+
+
+def food_costs(start, end, by, restaurant_id=None):
+    """{key over `by` (names from SALES_KEYS): SALES_FIELDS totals} for sales on days in [start, end)."""
+    totals = _rolled(BudgetRecipeDaily, SALES_FIELDS, start, end, by, restaurant_id)
+    tail = _priced(_sales_rows(_rolled_id('sales'), start=_midnight(start), end=_midnight(end),
+                               restaurant_id=restaurant_id))
+    for key, values in tail.items():
+        _add(totals, _project(key, SALES_KEYS, by), values)
+    return totals
+
+
+def summary(restaurant_id, start, end, bucket='day'):
+    """Spend against revenue and actual against theoretical food cost, in total and per bucket."""
+    buckets = {}
+    for (day, type_), values in spend(start, end, ('day', 'ingredient_type'), restaurant_id).items():
+        _add(buckets.setdefault(bucket_start(day, bucket), {}), type_, values)
+    sold = {}
+    for (day,), values in food_costs(start, end, ('day',), restaurant_id).items():
+        _add(sold, bucket_start(day, bucket), values)
+
+    series = [{'start': key.isoformat(), **figures(buckets.get(key, {}), sold.get(key))}
+              for key in bucket_starts(start, end, bucket)]
+    total_spend = {}
+    for by_type in buckets.values():
+        for type_, values in by_type.items():
+            _add(total_spend, type_, values)
+    total_sold = {}
+    for values in sold.values():
+        _add(total_sold, (), values)
+    return {
+        'from': start.isoformat(),
+        'to': date_before(end).isoformat(),
+        'bucket': bucket,
+        'totals': figures(total_spend, total_sold.get(())),
+        'series': series
+    }
+
+
+def recipes(restaurant_id, start, end, sort='variance'):
+    """Food cost per recipe over the period, the biggest `sort` first."""
+    totals = food_costs(start, end, ('recipe_id',), restaurant_id)
+    recipe_ids = [recipe_id for (recipe_id,) in totals]
+    names = dict(db.session.execute(
+        select(Recipe.id, Recipe.name).where(Recipe.id.in_(recipe_ids))
+    ).all()) if recipe_ids else {}
+    standard = standard_costs(recipe_ids)
+    result = [
+        {
+            'recipe_id': recipe_id,
+            'name': names.get(recipe_id),
+            'standard_cost': round(standard.get(recipe_id, 0.0), 4),
+            **figures({}, values, include_spend=False)
+        }
+        for (recipe_id,), values in totals.items()
+    ]
+    return sorted(result, key=lambda entry: (-entry[sort], entry['recipe_id']))
+
+
+def restaurants(start, end):
+    """Spend, revenue and food cost of every restaurant over the period."""
+    by_restaurant = {}
+    for (restaurant_id, type_), values in spend(start, end, ('restaurant_id', 'ingredient_type')).items():
+        _add(by_restaurant.setdefault(restaurant_id, {}), type_, values)
+    sold = food_costs(start, end, ('restaurant_id',))
+    names = dict(db.session.execute(select(Restaurant.id, Restaurant.name)).all())
+    restaurant_ids = sorted(set(by_restaurant) | {restaurant_id for (restaurant_id,) in sold})
+    return [
+        {
+            'restaurant_id': restaurant_id,
+            'name': names.get(restaurant_id),
+            **figures(by_restaurant.get(restaurant_id, {}), sold.get((restaurant_id,)))
+        }
+        for restaurant_id in restaurant_ids
+    ]
+
+
+def figures(spend_by_type, sold, include_spend=True):
+    """Report figures from {ingredient_type: spend totals} and SALES_FIELDS totals."""
+    sold = sold or dict.fromkeys(SALES_FIELDS, 0)
+    revenue = sold['revenue']
+    costed_revenue = sold['costed_revenue']
+    actual = sold['actual_cost']
+    theoretical = sold['theoretical_cost']
+    result = {}
+    if include_spend:
+        bought = sum(values['spend'] for type_, values in spend_by_type.items() if type_ != 'Processed')
+        result['spend'] = round(bought, 2)
+        result['produced'] = round(spend_by_type.get('Processed', {}).get('spend', 0.0), 2)
+        result['spend_pct'] = _pct(bought, revenue)
+    result.update({
+        'sales': sold['sales'],
+        'quantity': sold['quantity'],
+        'revenue': round(revenue, 2),
+        'actual_food_cost': round(float(actual), 2),
+        'theoretical_food_cost': round(float(theoretical), 2),
+        'variance': round(float(actual - theoretical), 2),
+        'actual_food_cost_pct': _pct(actual, costed_revenue),
+        'theoretical_food_cost_pct': _pct(theoretical, costed_revenue)
+    })
+    return result
+
+
+def date_before(day):
+    return day.fromordinal(day.toordinal() - 1)
+
+
+def _rolled(model, fields, start, end, by, restaurant_id):
+    columns = [getattr(model, name) for name in by]
+    query = select(*columns, *[func.sum(getattr(model, name)) for name in fields]).where(
+        model.day >= start, model.day < end
+    )
+    if restaurant_id is not None:
+        query = query.where(model.restaurant_id == restaurant_id)
+    totals = {}
+    for row in db.session.execute(query.group_by(*columns)):
+        if row[len(by)] is None:
+            continue  # no rows at all
+        _add(totals, tuple(row[:len(by)]), dict(zip(fields, row[len(by):])))
+    return totals
+
+
+def _rolled_id(source):
+    return db.session.execute(
+        select(BudgetRollupState.rolled_id).where(BudgetRollupState.source == source)
+    ).scalar() or 0
+
+
+def _project(key, names, by):
+    values = dict(zip(names, key))
+    return tuple(values[name] for name in by)
+
+
+def _add(totals, key, values):
+    entry = totals.setdefault(key, dict.fromkeys(values, 0))
+    for name, value in values.items():
+        entry[name] = entry.get(name, 0) + (value or 0)
+
+
+def _pct(part, whole):
+    return round(part / whole * 100, 1) if whole else None
+
+
+def _midnight(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def _as_date(value):
+    # SQLite returns date() as text
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
@@ -0,0 +1,68 @@
+# app/cache.py
+
+"""
+Small in-process caches for derived read data.
+
+Entries are keyed by tuples that include a version of the data they were
+computed from, e.g. (restaurant_id, recipe_graph_version, ingredient_id).
+A write bumps that version, so stale entries are never hit again and age
+out of the LRU. Invalidation therefore works across gunicorn workers
+without any messaging. `max_entries` bounds memory and the optional `ttl`
+bounds staleness for data whose version cannot be tracked.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class Cache:
+    def __init__(self, name, max_entries=1024, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, compute):
+        """Cached value for `key`, computing and storing it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            # Computed outside the lock; concurrent misses may both compute
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {'name': self.name, 'entries': size, 'hits': self.hits, 'misses': self.misses}
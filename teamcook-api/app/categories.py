@@ -0,0 +1,64 @@
+# app/categories.py
+
+"""
+Ingredient categories, stored once per restaurant and linked to ingredients
+through `ingredient_category`. Clients keep sending and receiving plain
+lists of names (a comma-separated string is still accepted).
+"""
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Category
+
+MAX_NAME_LENGTH = 64
+
+
+class CategoryError(ValueError):
+    """Submitted categories are malformed."""
+
+
+def parse_categories(value):
+    """Category names from a list or comma-separated string, stripped and de-duplicated."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise CategoryError('Categories must be a list of names')
+    names = []
+    for name in value:
+        if not isinstance(name, str):
+            raise CategoryError('Categories must be a list of names')
+        name = name.strip()
+        if len(name) > MAX_NAME_LENGTH:
+            raise CategoryError(f'Category names are limited to {MAX_NAME_LENGTH} characters')
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def resolve_categories(restaurant_id, names):
+    """The restaurant's Category rows for `names`, creating the missing ones."""
+    if not names:
+        return []
+    found = _existing(restaurant_id, names)
+    missing = [name for name in names if name not in found]
+    if missing:
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(Category(restaurant_id=restaurant_id, name=name) for name in missing)
+        except IntegrityError:
+            # Another request created some of them first
+            pass
+        found = _existing(restaurant_id, names)
+    return [found[name] for name in names]
+
+
+def _existing(restaurant_id, names):
+    return {
+        category.name: category for category in db.session.scalars(
+            select(Category).where(Category.restaurant_id == restaurant_id, Category.name.in_(names))
+        )
+    }
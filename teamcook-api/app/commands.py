@@ -0,0 +1,89 @@
+# app/commands.py
+
+import sys
+
+import click
+from flask import current_app
+
+from app import db, search, archive, budget
+from app.export import TABLES, export_tables, formats
+from app.stock_import import import_stock, detect_format, FORMATS
+
+
+@click.command('import-stock')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--restaurant', 'restaurant_id', type=int, default=1, show_default=True,
+              help='Restaurant the deliveries belong to.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+def import_stock_command(path, restaurant_id, fmt):
+    """Bulk import stock deliveries from a CSV or NDJSON file ('-' for stdin)."""
+    fmt = fmt or detect_format(filename=path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format')
+
+    if path == '-':
+        result = import_stock(sys.stdin.buffer, fmt, restaurant_id)
+    else:
+        with open(path, 'rb') as stream:
+            result = import_stock(stream, fmt, restaurant_id)
+
+    for error in result.to_dict()['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    if result.error_count > len(result.errors):
+        click.echo(f'... {result.error_count - len(result.errors)} more errors', err=True)
+    click.echo(f'Imported {result.inserted} of {result.rows} rows ({result.error_count} errors)')
+
+
+@click.command('export-data')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--restaurant', 'restaurant_id', type=int, default=1, show_default=True)
+@click.option('--table', 'tables', multiple=True, type=click.Choice(list(TABLES)),
+              help='Repeat for several tables. Defaults to all of them, as a zip archive.')
+@click.option('--format', 'fmt', type=click.Choice(formats()), default='csv', show_default=True)
+@click.option('--snapshot', is_flag=True, help='Read every table at one point in time.')
+@click.option('--no-compress', 'compress', flag_value=False, default=True)
+def export_data_command(path, restaurant_id, tables, fmt, snapshot, compress):
+    """Export inventory, sales and recipe tables to PATH ('-' for stdout)."""
+    body = export_tables(list(tables or TABLES), fmt, restaurant_id, snapshot=snapshot, compress=compress)
+    with click.open_file(path, 'wb') as out:
+        for chunk in body:
+            out.write(chunk)
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recreate the search index and refill it from the source tables."""
+    with db.engine.begin() as connection:
+        search.uninstall(connection)
+        search.install(connection)
+    click.echo('Search index rebuilt')
+
+
+@click.command('archive-history')
+@click.option('--days', type=int, help='Archive rows older than this (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, help='Rows per transaction (default: ARCHIVE_BATCH_SIZE).')
+def archive_history_command(days, batch_size):
+    """Move old sales, waste and events to the archive tables now."""
+    config = current_app.config
+    counts = archive.run(days if days is not None else config['ARCHIVE_AFTER_DAYS'],
+                         batch_size or config['ARCHIVE_BATCH_SIZE'])
+    click.echo(', '.join(f'{name}: {count}' for name, count in counts.items()))
+
+
+@click.command('roll-up-budget')
+@click.option('--batch-size', type=int, help='Rows per transaction (default: BUDGET_ROLLUP_BATCH_SIZE).')
+@click.option('--all', 'everything', is_flag=True,
+              help='Also roll up rows written since the last run; use only while nothing else writes.')
+def roll_up_budget_command(batch_size, everything):
+    """Add new stock and sales to the budget rollups now."""
+    counts = budget.roll_up(batch_size or current_app.config['BUDGET_ROLLUP_BATCH_SIZE'], settle=not everything)
+    click.echo(', '.join(f'{name}: {count}' for name, count in counts.items()))
+
+
+def register_commands(app):
+    """Attach the maintenance commands to `flask`."""
+    app.cli.add_command(import_stock_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(archive_history_command)
+    app.cli.add_command(roll_up_budget_command)
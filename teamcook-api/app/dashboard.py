@@ -0,0 +1,244 @@
+# app/dashboard.py
+
+"""
+Dashboard KPIs for a period of whole days (UTC).
+
+`summary` returns stock value and counts by ingredient type, purchases,
+sales revenue, cost of goods sold (COGS), waste value and the top
+consumers, totalled and bucketed by day, week or month. The number of
+queries is fixed whatever the period or data size: one over current
+stock (`stock_by_type`), one over purchases, two each over sales and
+waste (live rows and the daily totals of archived rows, see app.archive)
+and one for the top recipes' names. COGS and waste value are the costs
+recorded on each sale and waste row when it was written.
+
+Results are cached per worker, keyed on restaurant, period and
+`stats_state.version`. A session listener notes the restaurant of every
+stock, sales, waste, ingredient and recipe row a transaction flushes and
+bumps those versions once it commits. Writes through Core statements call
+`touch` instead. CACHE_TTL bounds staleness from anything that bypasses
+both, such as the inventory engine's deferred amount updates.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, update, insert, func
+
+from app import db
+from app.archive import sales_totals, waste_totals
+from app.cache import Cache
+from app.database import RoutingSession
+from app.models import Stock, Sales, Waste, Ingredient, Recipe, StatsState
+
+BUCKETS = ('day', 'week', 'month')
+DEFAULT_DAYS = 7
+MAX_PERIOD_DAYS = 366
+DEFAULT_TOP = 5
+MAX_TOP = 50
+CACHE_TTL = 300
+
+TRACKED = (Stock, Sales, Waste, Ingredient, Recipe)
+
+logger = logging.getLogger(__name__)
+
+summary_cache = Cache('dashboard', max_entries=1024, ttl=CACHE_TTL)
+
+
+def init_app(app):
+    if not event.contains(RoutingSession, 'after_flush', _collect_writes):
+        event.listen(RoutingSession, 'after_flush', _collect_writes)
+        event.listen(RoutingSession, 'after_commit', _bump_versions)
+        event.listen(RoutingSession, 'after_rollback', _discard_writes)
+
+
+def touch(restaurant_id):
+    """Invalidate the restaurant's cached KPIs once the current transaction commits."""
+    db.session.info.setdefault('stats_touched', set()).add(restaurant_id)
+
+
+def version(restaurant_id):
+    return db.session.execute(
+        select(StatsState.version).where(StatsState.restaurant_id == restaurant_id)
+    ).scalar()
+
+
+def summary(restaurant_id, start, end, bucket='day', top=DEFAULT_TOP):
+    """KPIs for the days in [start, end); cached until the restaurant's next write."""
+    return summary_cache.get_or_set(
+        (restaurant_id, version(restaurant_id), start, end, bucket, top),
+        lambda: _summary(restaurant_id, start, end, bucket, top)
+    )
+
+
+def _summary(restaurant_id, start, end, bucket, top):
+    since = datetime.combine(start, datetime.min.time())
+    until = datetime.combine(end, datetime.min.time())
+    buckets = defaultdict(lambda: {
+        **dict.fromkeys(('purchases', 'revenue', 'cogs', 'waste_value'), 0.0), 'purchases_by_type': {}
+    })
+
+    stock = stock_by_type(restaurant_id)
+
+    day = func.date(Stock.purchase_date)
+    rows = db.session.execute(
+        select(day, Ingredient.type, func.sum(Stock.cost))
+        .join(Ingredient, Ingredient.id == Stock.ingredient_id)
+        .where(Stock.restaurant_id == restaurant_id, Stock.purchase_date >= since, Stock.purchase_date < until)
+        .group_by(day, Ingredient.type)
+    )
+    for purchased, type_, cost in rows:
+        entry = buckets[bucket_start(_as_date(purchased), bucket)]
+        entry['purchases'] += cost or 0.0
+        entry['purchases_by_type'][type_] = entry['purchases_by_type'].get(type_, 0.0) + (cost or 0.0)
+
+    consumers = defaultdict(lambda: dict.fromkeys(('sales', 'quantity', 'revenue', 'cost'), 0))
+    for (sold, recipe_id), totals in sales_totals(restaurant_id, since, until, by_day=True).items():
+        entry = buckets[bucket_start(sold, bucket)]
+        entry['revenue'] += totals['revenue']
+        entry['cogs'] += totals['cost']
+        for name, value in totals.items():
+            consumers[recipe_id][name] += value
+
+    for (wasted, _, _), totals in waste_totals(restaurant_id, since, until, by_day=True).items():
+        buckets[bucket_start(wasted, bucket)]['waste_value'] += totals['cost']
+
+    ranked = sorted(consumers.items(), key=lambda item: (-item[1]['cost'], -item[1]['revenue'], item[0]))[:top]
+    names = dict(db.session.execute(
+        select(Recipe.id, Recipe.name).where(Recipe.id.in_([recipe_id for recipe_id, _ in ranked]))
+    ).all()) if ranked else {}
+
+    series = [
+        {
+            'start': key.isoformat(),
+            **{name: round(buckets[key][name], 2) for name in ('purchases', 'revenue', 'cogs', 'waste_value')},
+            'purchases_by_type': {type_: round(cost, 2) for type_, cost in buckets[key]['purchases_by_type'].items()}
+        }
+        for key in bucket_starts(start, end, bucket)
+    ]
+    totals = {name: round(sum(entry[name] for entry in buckets.values()), 2)
+              for name in ('purchases', 'revenue', 'cogs', 'waste_value')}
+    totals['sales'] = sum(entry['sales'] for entry in consumers.values())
+    totals['gross_margin'] = round(totals['revenue'] - totals['cogs'], 2)
+
+    return {
+        'from': start.isoformat(),
+        'to': (end - timedelta(days=1)).isoformat(),
+        'bucket': bucket,
+        'stock': {
+            'value': round(sum(entry['value'] for entry in stock.values()), 2),
+            'raw_count': stock.get('Raw', {}).get('ingredients', 0),
+            'processed_count': stock.get('Processed', {}).get('ingredients', 0),
+            'by_type': {type_: {**entry, 'value': round(entry['value'], 2)} for type_, entry in stock.items()},
+        },
+        'totals': totals,
+        'series': series,
+        'top_consumers': [
+            {
+                'recipe_id': recipe_id,
+                'name': names.get(recipe_id),
+                'sales': entry['sales'],
+                'quantity': entry['quantity'],
+                'revenue': round(entry['revenue'], 2),
+                'cost': round(entry['cost'], 2)
+            }
+            for recipe_id, entry in ranked
+        ]
+    }
+
+
+def stock_by_type(restaurant_id):
+    """{ingredient type: ingredients, lots and value of the stock on hand}, in one query."""
+    # Totalled per ingredient first, so only one row per ingredient is joined.
+    # A lot is worth the share of its purchase cost that is left.
+    remaining = Stock.cost * Stock.amount / func.coalesce(func.nullif(Stock.initial_amount, 0), Stock.amount)
+    lots = (
+        select(Stock.ingredient_id, func.count(Stock.id).label('lots'), func.sum(remaining).label('value'))
+        .where(Stock.restaurant_id == restaurant_id, Stock.amount > 0)
+        .group_by(Stock.ingredient_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Ingredient.type, func.count(lots.c.ingredient_id), func.sum(lots.c.lots), func.sum(lots.c.value))
+        .join(Ingredient, Ingredient.id == lots.c.ingredient_id)
+        .group_by(Ingredient.type)
+    )
+    return {
+        type_: {'ingredients': ingredients, 'lots': lot_count, 'value': value or 0.0}
+        for type_, ingredients, lot_count, value in rows
+    }
+
+
+def purchased_amounts(restaurant_id, start, end):
+    """{(day, ingredient type): amount left of the lots bought that day} for the days in [start, end)."""
+    since = datetime.combine(start, datetime.min.time())
+    until = datetime.combine(end, datetime.min.time())
+    day = func.date(Stock.purchase_date)
+    rows = db.session.execute(
+        select(day, Ingredient.type, func.sum(Stock.amount))
+        .join(Ingredient, Ingredient.id == Stock.ingredient_id)
+        .where(Stock.restaurant_id == restaurant_id, Stock.purchase_date >= since, Stock.purchase_date < until)
+        .group_by(day, Ingredient.type)
+    )
+    return {(_as_date(purchased), type_): amount or 0.0 for purchased, type_, amount in rows}
+
+
+def _as_date(value):
+    # SQLite returns date() as text
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+
+
+def bucket_start(day, bucket):
+    """First day of the day, week (from Monday) or month holding `day`."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start, end, bucket):
+    """Every bucket overlapping [start, end), so empty ones are reported as zeros."""
+    keys, day = [], bucket_start(start, bucket)
+    while day < end:
+        keys.append(day)
+        if bucket == 'week':
+            day += timedelta(days=7)
+        elif bucket == 'month':
+            day = (day + timedelta(days=32)).replace(day=1)
+        else:
+            day += timedelta(days=1)
+    return keys
+
+
+def _collect_writes(session, flush_context):
+    touched = session.info.setdefault('stats_touched', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TRACKED) and obj.restaurant_id is not None:
+            touched.add(obj.restaurant_id)
+
+
+def _bump_versions(session):
+    touched = session.info.pop('stats_touched', None)
+    if not touched:
+        return
+    table = StatsState.__table__
+    try:
+        with db.engine.begin() as conn:
+            for restaurant_id in sorted(touched):
+                bumped = conn.execute(
+                    update(table)
+                    .where(table.c.restaurant_id == restaurant_id)
+                    .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+                )
+                if not bumped.rowcount:
+                    conn.execute(insert(table).values(restaurant_id=restaurant_id, version=1,
+                                                      updated_at=datetime.utcnow()))
+    except Exception:
+        # The write itself is committed; cached KPIs expire after CACHE_TTL
+        logger.exception('Could not bump stats versions for restaurants %s', sorted(touched))
+
+
+def _discard_writes(session):
+    session.info.pop('stats_touched', None)
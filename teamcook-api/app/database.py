@@ -0,0 +1,115 @@
+# app/database.py
+
+import time
+
+from flask import g, has_request_context, request, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+LAST_WRITE_COOKIE = 'tc_last_write'
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind when the request allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica():
+    return has_request_context() and g.get('use_replica', False)
+
+
+def configure_binds(app):
+    """Register the replica bind before the extension creates engines."""
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_uri, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_app(app, db):
+    """Tune engines once they exist and route read-only requests."""
+    app.config.setdefault('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                _configure_sqlite(engine, app.config)
+
+    if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        app.before_request(_route_read_only_requests)
+        app.after_request(_remember_writes)
+
+
+def read_only(view):
+    """Mark a view as safe to serve from the replica, whatever its method."""
+    view.db_route = REPLICA_BIND
+    return view
+
+
+def use_primary(view):
+    """Mark a GET view that must always see the primary."""
+    view.db_route = None
+    return view
+
+
+def read_only_blueprint(blueprint):
+    """Mark every view of a blueprint as safe to serve from the replica."""
+    blueprint.read_only = True
+    return blueprint
+
+
+def _configure_sqlite(engine, config):
+    journal_mode = config.get('SQLITE_JOURNAL_MODE')
+    synchronous = config.get('SQLITE_SYNCHRONOUS')
+    busy_timeout = config.get('SQLITE_BUSY_TIMEOUT_MS')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if busy_timeout is not None:
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        if journal_mode and engine.url.database not in (None, '', ':memory:'):
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        if synchronous:
+            cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.close()
+
+
+def _route_read_only_requests():
+    g.use_replica = _wants_replica() and not _recently_wrote()
+
+
+def _wants_replica():
+    view = current_app.view_functions.get(request.endpoint)
+    if view is not None and hasattr(view, 'db_route'):
+        return view.db_route == REPLICA_BIND
+    blueprint = current_app.blueprints.get(request.blueprint)
+    if blueprint is not None and getattr(blueprint, 'read_only', False):
+        return True
+    return request.method in READ_ONLY_METHODS
+
+
+def _recently_wrote():
+    """Read-your-writes: stay on the primary shortly after this client wrote."""
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() - last_write < current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+
+
+def _remember_writes(response):
+    if request.method not in READ_ONLY_METHODS and response.status_code < 400:
+        window = current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+        response.set_cookie(LAST_WRITE_COOKIE, f'{time.time():.3f}', max_age=max(int(window), 1),
+                            httponly=True, samesite='Lax')
+    return response
@@ -0,0 +1,243 @@
+# app/export.py
+
+"""
+Streaming export of a restaurant's inventory, sales and recipe tables.
+
+Rows are fetched through a server-side cursor in batches of
+EXPORT_BATCH_SIZE and encoded batch by batch, so memory use does not grow
+with the size of the tables. One table is exported as a single CSV or NDJSON
+stream (gzip-compressed by default) or Parquet file; several tables are
+written as members of a zip archive. With `snapshot`, every table is read
+inside one read-only transaction so the archive reflects a single point in
+time.
+"""
+
+import csv
+import io
+import json
+import zipfile
+import zlib
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import (
+    Stock, Waste, Sales, Ingredient, Category, IngredientCategory, Recipe, RecipeIngredient, RecipeStep,
+    SalesArchive, WasteArchive, SalesDaily, WasteDaily
+)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+EXPORT_BATCH_SIZE = 1000
+
+TABLES = {
+    'stock': Stock,
+    'waste': Waste,
+    'sales': Sales,
+    'ingredient': Ingredient,
+    'category': Category,
+    'ingredient_category': IngredientCategory,
+    'recipe': Recipe,
+    'recipe_ingredient': RecipeIngredient,
+    'recipe_step': RecipeStep,
+    'sales_archive': SalesArchive,
+    'waste_archive': WasteArchive,
+    'sales_daily': SalesDaily,
+    'waste_daily': WasteDaily,
+}
+
+
+def formats():
+    return ('csv', 'ndjson', 'parquet') if pyarrow is not None else ('csv', 'ndjson')
+
+
+def file_name(table, fmt, compress):
+    if fmt == 'parquet':
+        return f'{table}.parquet'
+    return f'{table}.{fmt}.gz' if compress else f'{table}.{fmt}'
+
+
+def export_tables(tables, fmt, restaurant_id, snapshot=False, compress=True):
+    """
+    Yield the export as bytes. A single table is streamed as is; several
+    tables are streamed as a zip archive with one member per table.
+    """
+    # Read the primary: a replica may not have the caller's latest writes yet
+    inventory_engine = current_app.extensions.get('inventory_engine')
+    if inventory_engine is not None and 'stock' in tables:
+        try:
+            inventory_engine.flush()
+        except Exception:
+            # The export shows amounts as of the last successful flush
+            current_app.logger.exception('Inventory flush before export failed')
+    with db.engine.connect() as conn:
+        conn = _begin(conn, snapshot)
+        try:
+            if len(tables) == 1:
+                yield from _encode(conn, tables[0], fmt, restaurant_id, compress)
+            else:
+                yield from _zip(conn, tables, fmt, restaurant_id, compress)
+        finally:
+            _end(conn, snapshot)
+
+
+def _begin(conn, snapshot):
+    if not snapshot:
+        return conn
+    if conn.dialect.name == 'sqlite':
+        # pysqlite only opens transactions for writes; take the read
+        # transaction by hand so every table sees the same WAL snapshot
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        conn.exec_driver_sql('BEGIN')
+        return conn
+    conn = conn.execution_options(isolation_level='REPEATABLE READ', postgresql_readonly=True)
+    conn.begin()
+    return conn
+
+
+def _end(conn, snapshot):
+    if not snapshot:
+        return
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql('COMMIT')
+    else:
+        conn.rollback()
+
+
+def _query(table, restaurant_id):
+    model = TABLES[table]
+    statement = select(model.__table__)
+    if hasattr(model, 'restaurant_id'):
+        statement = statement.where(model.restaurant_id == restaurant_id)
+    elif hasattr(model, 'recipe_id'):
+        # Recipe children are scoped through their recipe
+        statement = statement.where(
+            model.recipe_id.in_(select(Recipe.id).where(Recipe.restaurant_id == restaurant_id))
+        )
+    else:
+        # Category links are scoped through their ingredient
+        statement = statement.where(
+            model.ingredient_id.in_(select(Ingredient.id).where(Ingredient.restaurant_id == restaurant_id))
+        )
+    return statement.order_by(model.__table__.primary_key.columns.values()[0])
+
+
+def _batches(conn, table, restaurant_id):
+    result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(
+        _query(table, restaurant_id)
+    )
+    return list(result.keys()), result.partitions()
+
+
+def _encode(conn, table, fmt, restaurant_id, compress):
+    columns, batches = _batches(conn, table, restaurant_id)
+    if fmt == 'parquet':
+        yield from _parquet(TABLES[table].__table__, columns, batches)
+        return
+    chunks = _csv(columns, batches) if fmt == 'csv' else _ndjson(columns, batches)
+    yield from _gzip(chunks) if compress else chunks
+
+
+def _csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson(columns, batches):
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=_json_default) + '\n' for row in batch
+        ).encode('utf-8')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only stream whose contents are drained by the generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_type(column):
+    python_type = column.type.python_type
+    if python_type is int:
+        return pyarrow.int64()
+    if python_type is float:
+        return pyarrow.float64()
+    if python_type is bool:
+        return pyarrow.bool_()
+    if python_type is datetime:
+        return pyarrow.timestamp('us')
+    return pyarrow.string()
+
+
+def _parquet(table, columns, batches):
+    schema = pyarrow.schema([(name, _arrow_type(table.columns[name])) for name in columns])
+    sink = _Sink()
+    with pyarrow.parquet.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in batches:
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array([row[i] for row in batch], type=field.type)
+                 for i, field in enumerate(schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _zip(conn, tables, fmt, restaurant_id, compress):
+    sink = _Sink()
+    # The archive does the compressing; Parquet members already are compressed
+    compression = zipfile.ZIP_DEFLATED if compress and fmt != 'parquet' else zipfile.ZIP_STORED
+    with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+        for table in tables:
+            with archive.open(file_name(table, fmt, False), 'w', force_zip64=True) as member:
+                for chunk in _encode(conn, table, fmt, restaurant_id, False):
+                    member.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()
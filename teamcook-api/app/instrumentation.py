@@ -0,0 +1,228 @@
+# app/instrumentation.py
+
+"""
+Per-request performance instrumentation.
+
+Every request collects the number of SQL statements it ran, the time spent
+in the database, its slowest statement, the time spent serialising JSON and
+the response size. The numbers are sent back in a `Server-Timing` header and
+folded into per-endpoint histograms that GET /metrics exposes in the
+Prometheus text format. Histograms are per process; under gunicorn each
+worker reports its own.
+
+In debug mode (or with N_PLUS_ONE_DETECTION) a request that runs the same
+SELECT N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, has_request_context, current_app
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'slowest_time', 'slowest_sql', 'serialize_time', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.serialize_time = 0.0
+        self.statements = Counter()
+
+
+def current_stats():
+    """Stats of the request being handled, or None outside a request."""
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with one series per label value."""
+
+    def __init__(self, name, help_text, buckets, label='endpoint'):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(snapshot.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram(
+    'teamcook_request_duration_seconds', 'Request latency by endpoint.', DURATION_BUCKETS)
+request_db_time = Histogram(
+    'teamcook_request_db_seconds', 'Time spent in SQL per request.', DURATION_BUCKETS)
+request_queries = Histogram(
+    'teamcook_request_queries', 'SQL statements per request.', QUERY_COUNT_BUCKETS)
+request_serialize_time = Histogram(
+    'teamcook_request_serialize_seconds', 'Time spent serialising JSON per request.', DURATION_BUCKETS)
+response_size = Histogram(
+    'teamcook_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+HISTOGRAMS = (request_duration, request_db_time, request_queries, request_serialize_time, response_size)
+
+
+def render_metrics():
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that charges encoding time to the current request."""
+
+    def dumps(self, obj, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats.serialize_time += time.perf_counter() - started
+
+
+def init_app(app):
+    """Collect request stats. Register before other before_request hooks."""
+    app.config.setdefault('INSTRUMENTATION_ENABLED', True)
+    app.config.setdefault('N_PLUS_ONE_DETECTION', None)  # None: follow app.debug
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', 10)
+    if not app.config['INSTRUMENTATION_ENABLED']:
+        return
+
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is None:
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats.queries += 1
+    stats.db_time += elapsed
+    if elapsed > stats.slowest_time:
+        stats.slowest_time = elapsed
+        stats.slowest_sql = statement
+    stats.statements[statement] += 1
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so later statements on this pooled connection are timed right
+    connection = exception_context.connection
+    if connection is None or exception_context.execution_context is None:
+        return
+    started = connection.info.get('query_started')
+    if started:
+        started.pop()
+
+
+def _finish_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    total = time.perf_counter() - stats.started
+    endpoint = request.endpoint or 'unmatched'
+    size = None if response.is_streamed else response.calculate_content_length()
+
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"',
+        f'serialize;dur={stats.serialize_time * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ])
+
+    request_duration.observe(endpoint, total)
+    request_db_time.observe(endpoint, stats.db_time)
+    request_queries.observe(endpoint, stats.queries)
+    request_serialize_time.observe(endpoint, stats.serialize_time)
+    if size is not None:
+        response_size.observe(endpoint, size)
+
+    detect = current_app.config['N_PLUS_ONE_DETECTION']
+    if detect or (detect is None and current_app.debug):
+        _flag_n_plus_one(endpoint, stats)
+
+    # Left on g for loggers that run after this hook
+    g.request_summary = {
+        'latency_ms': round(total * 1000, 2),
+        'sql_count': stats.queries,
+        'db_ms': round(stats.db_time * 1000, 2),
+        'slowest_sql_ms': round(stats.slowest_time * 1000, 2),
+        'serialize_ms': round(stats.serialize_time * 1000, 2),
+        'response_bytes': size,
+    }
+    return response
+
+
+def _flag_n_plus_one(endpoint, stats):
+    threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+    for statement, count in stats.statements.most_common(3):
+        if count < threshold:
+            break
+        if statement.lstrip()[:6].upper() == 'SELECT':
+            shape = _LITERALS.sub('?', ' '.join(statement.split()))
+            current_app.logger.warning(
+                f'Possible N+1 in {endpoint}: {count} executions of {shape[:300]}'
+            )
@@ -0,0 +1,466 @@
+# app/inventory_engine.py
+
+"""
+In-memory inventory engine with write-behind persistence.
+
+For single-site deployments the active inventory is small, so this engine
+keeps each ingredient's unexpired lots in memory as parallel arrays and
+serves allocations and availability from there. An allocation only reserves
+its lots until the session that made it commits; the deductions are then
+appended to a journal file, or handed back if the transaction ends any other
+way. A background thread periodically folds the accumulated deductions into
+the `stock` table in one transaction and records the last journal sequence
+number applied in `inventory_checkpoint`. On start the journal entries past
+that checkpoint are replayed, so a crash loses nothing that was journaled.
+
+The journal belongs to one process: enable the engine only where a single
+process serves the database (e.g. EdgeConfig with `flask run` or one worker).
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, update, insert, case, bindparam
+
+from app import db
+from app.database import RoutingSession
+from app.models import Stock, Ingredient, InventoryCheckpoint
+from app.units import ingredient_units, UnitConversionError
+from app.utils import Allocation, lot_unit_cost
+
+NEVER = float('inf')
+
+logger = logging.getLogger(__name__)
+
+
+class _Lots:
+    """One ingredient's unexpired lots, oldest purchase first."""
+
+    __slots__ = ('ingredient_id', 'restaurant_id', 'units', 'unit', 'ids', 'amounts',
+                 'factors', 'unit_costs', 'expiries', 'head', 'available', 'next_expiry')
+
+    def __init__(self, ingredient, rows, pending, reserved):
+        self.ingredient_id = ingredient.id
+        self.restaurant_id = ingredient.restaurant_id
+        self.units = ingredient_units(ingredient)
+        self.unit = ingredient.unit
+        self.ids = array('q')
+        self.amounts = array('d')  # lot unit
+        self.factors = array('d')  # lot unit -> ingredient unit
+        self.unit_costs = array('d')  # per lot unit
+        self.expiries = array('d')  # POSIX timestamps
+        self.head = 0
+        self.available = 0.0
+        self.next_expiry = NEVER
+        for row in rows:
+            try:
+                factor = self.units.factor(row.unit)
+            except UnitConversionError as e:
+                # Lot recorded in a unit we cannot relate to the ingredient;
+                # left out, so allocations may report a shortage
+                logger.warning('Skipping stock lot %s of ingredient %s: %s', row.id, ingredient.id, e)
+                continue
+            amount = max(row.amount - pending.get(row.id, 0.0) - reserved.get(row.id, 0.0), 0.0)
+            # Dates are stored as naive UTC
+            expiry = row.expiry_date.replace(tzinfo=timezone.utc).timestamp()
+            self.ids.append(row.id)
+            self.amounts.append(amount)
+            self.factors.append(factor)
+            self.unit_costs.append(lot_unit_cost(row.cost, row.initial_amount, row.amount))
+            self.expiries.append(expiry)
+            self.available += amount * factor
+            self.next_expiry = min(self.next_expiry, expiry)
+
+    def expire(self, now):
+        """Drop lots that expired since they were loaded."""
+        if now < self.next_expiry:
+            return
+        self.next_expiry = NEVER
+        for i in range(self.head, len(self.ids)):
+            if self.amounts[i] <= 0:
+                continue
+            if self.expiries[i] <= now:
+                self.available -= self.amounts[i] * self.factors[i]
+                self.amounts[i] = 0.0
+            else:
+                self.next_expiry = min(self.next_expiry, self.expiries[i])
+        self.available = max(self.available, 0.0)
+
+    def take(self, amount):
+        """
+        Deduct `amount` (ingredient unit) oldest lot first and return the
+        Allocations. The caller has already checked `available`.
+        """
+        allocated = []
+        remaining = amount
+        i = self.head
+        while remaining > 1e-9 and i < len(self.ids):
+            lot_amount = self.amounts[i]
+            if lot_amount <= 0:
+                i += 1
+                continue
+            stock_id, factor = self.ids[i], self.factors[i]
+            unit_cost = self.unit_costs[i]
+            if lot_amount * factor > remaining:
+                deducted = remaining / factor
+                self.amounts[i] = lot_amount - deducted
+                remaining = 0
+            else:
+                deducted = lot_amount
+                self.amounts[i] = 0.0
+                remaining -= lot_amount * factor
+                i += 1
+            allocated.append(Allocation(stock_id, deducted, unit_cost))
+        while self.head < len(self.ids) and self.amounts[self.head] <= 0:
+            self.head += 1
+        self.available = max(self.available - amount, 0.0)
+        return allocated
+
+
+class InventoryEngine:
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        # Serialises flushes and lot loads, so a load never sees a batch
+        # that is half applied to the database
+        self._flush_lock = threading.Lock()
+        self._lots = {}
+        self._pending = {}    # stock id -> amount deducted since the last flush
+        self._reserved = {}   # stock id -> amount held by uncommitted transactions
+        self._in_flight = {}  # the batch being written by the current flush
+        self._seq = 0
+        self._entries = 0
+        self._journal = None
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._pid = None
+
+    def init_app(self, app):
+        """Replay the journal and start serving. Needs the tables to exist."""
+        app.config.setdefault('INVENTORY_ENGINE_ENABLED', False)
+        app.config.setdefault('INVENTORY_JOURNAL_PATH', None)
+        app.config.setdefault('INVENTORY_JOURNAL_FSYNC', True)
+        app.config.setdefault('INVENTORY_FLUSH_SECONDS', 2.0)
+        app.config.setdefault('INVENTORY_FLUSH_MAX_ENTRIES', 1000)
+        if not app.config['INVENTORY_ENGINE_ENABLED']:
+            return
+
+        self.app = app
+        path = app.config['INVENTORY_JOURNAL_PATH']
+        if path is None:
+            os.makedirs(app.instance_path, exist_ok=True)
+            path = os.path.join(app.instance_path, 'inventory.journal')
+        self.path = path
+        self.name = os.path.basename(path)
+        self._recover()
+        self._journal = open(self.path, 'a', encoding='utf-8')
+        app.extensions['inventory_engine'] = self
+
+        if not event.contains(RoutingSession, 'after_commit', _commit_inventory):
+            event.listen(RoutingSession, 'after_flush', _collect_stock_writes)
+            event.listen(RoutingSession, 'after_commit', _commit_inventory)
+            event.listen(RoutingSession, 'after_transaction_end', _end_inventory_transaction)
+        atexit.register(self._flush_at_exit)
+
+    # Allocation
+
+    def allocate(self, ingredient_id, amount, unit=None, session=None):
+        """
+        Same contract as app.utils.allocate_stock: a list of Allocation, or
+        None if there is not enough. Raises UnitConversionError.
+        """
+        result = self.allocate_all([(ingredient_id, amount, unit)], session)
+        return None if result is None else result[0]
+
+    def allocate_all(self, requests, session=None):
+        """
+        Allocate several (ingredient_id, amount, unit) requests all or nothing.
+        Returns one list of Allocation per request, or None if any ingredient
+        is missing or short. The lots stay reserved for `session` (the
+        request's db.session by default) and are only deducted for good when
+        it commits.
+        """
+        session = session or db.session()
+        self._ensure_flusher()
+        ingredient_ids = {ingredient_id for ingredient_id, _, _ in requests}
+        lots = self._load(ingredient_ids)
+        now = time.time()
+        with self._lock:
+            needs = []
+            totals = {}
+            for ingredient_id, amount, unit in requests:
+                queue = lots.get(ingredient_id)
+                if queue is None:
+                    return None
+                base = queue.units.to_ingredient_unit(amount, unit or queue.unit)
+                needs.append((queue, base))
+                totals[ingredient_id] = totals.get(ingredient_id, 0.0) + base
+            for ingredient_id, total in totals.items():
+                queue = lots[ingredient_id]
+                queue.expire(now)
+                if total > queue.available + 1e-9:
+                    return None
+
+            results = [queue.take(base) for queue, base in needs]
+            reserved = [
+                (queue.ingredient_id, a.stock_id, a.amount)
+                for (queue, _), result in zip(needs, results) for a in result
+            ]
+            for _, stock_id, amount in reserved:
+                self._reserved[stock_id] = self._reserved.get(stock_id, 0.0) + amount
+        if reserved:
+            if not session.in_transaction():
+                # Make sure the session reports how this transaction ends
+                session.begin()
+            session.info.setdefault('inventory_reserved', []).extend(reserved)
+        return results
+
+    def confirm(self, reserved):
+        """Journal reserved deductions once the transaction holding them committed."""
+        deducted = {}
+        with self._lock:
+            for _, stock_id, amount in reserved:
+                self._unreserve(stock_id, amount)
+                self._pending[stock_id] = self._pending.get(stock_id, 0.0) + amount
+                deducted[stock_id] = deducted.get(stock_id, 0.0) + amount
+            self._append(list(deducted.items()))
+        if self._entries >= self.app.config['INVENTORY_FLUSH_MAX_ENTRIES']:
+            self._wakeup.set()
+
+    def release(self, reserved):
+        """Hand back reserved deductions whose transaction did not commit."""
+        with self._lock:
+            for ingredient_id, stock_id, amount in reserved:
+                self._unreserve(stock_id, amount)
+                # Reloaded on next use without the released amounts
+                self._lots.pop(ingredient_id, None)
+
+    def _unreserve(self, stock_id, amount):
+        left = self._reserved.get(stock_id, 0.0) - amount
+        if left > 1e-9:
+            self._reserved[stock_id] = left
+        else:
+            self._reserved.pop(stock_id, None)
+
+    def available(self, ingredient_id):
+        """Unexpired amount on hand in the ingredient's unit, or None."""
+        queue = self._load({ingredient_id}).get(ingredient_id)
+        if queue is None:
+            return None
+        with self._lock:
+            queue.expire(time.time())
+            return queue.available
+
+    def invalidate(self, ingredient_ids):
+        """Forget cached lots after another writer changed them."""
+        with self._lock:
+            for ingredient_id in ingredient_ids:
+                self._lots.pop(ingredient_id, None)
+
+    def _load(self, ingredient_ids):
+        with self._lock:
+            lots = {i: self._lots[i] for i in ingredient_ids if i in self._lots}
+        missing = ingredient_ids - lots.keys()
+        if not missing:
+            return lots
+
+        with self._flush_lock:
+            ingredients = Ingredient.query.filter(Ingredient.id.in_(missing)).all()
+            stock = Stock.__table__
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(stock.c.id, stock.c.ingredient_id, stock.c.amount, stock.c.unit,
+                           stock.c.cost, stock.c.initial_amount, stock.c.expiry_date)
+                    .where(stock.c.ingredient_id.in_(missing), stock.c.expiry_date > datetime.utcnow())
+                    .order_by(stock.c.purchase_date)
+                ).all()
+            with self._lock:
+                for ingredient in ingredients:
+                    if ingredient.id not in self._lots:
+                        ingredient_rows = [row for row in rows if row.ingredient_id == ingredient.id]
+                        self._lots[ingredient.id] = _Lots(ingredient, ingredient_rows, self._pending, self._reserved)
+                    lots[ingredient.id] = self._lots[ingredient.id]
+        return lots
+
+    # Persistence
+
+    def _append(self, deducted):
+        self._seq += 1
+        self._entries += 1
+        self._journal.write(json.dumps({'seq': self._seq, 'lots': deducted}, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if self.app.config['INVENTORY_JOURNAL_FSYNC']:
+            os.fsync(self._journal.fileno())
+
+    def flush(self):
+        """Write pending deductions to the stock table. Returns the lot count."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, seq = self._pending, self._seq
+                self._pending, self._in_flight = {}, batch
+                # Later entries go to a fresh segment; this one is removed
+                # once the batch is safely in the database
+                self._journal.close()
+                os.replace(self.path, f'{self.path}.{seq}')
+                self._journal = open(self.path, 'a', encoding='utf-8')
+                self._entries = 0
+            try:
+                self._write(batch, seq)
+            except Exception:
+                with self._lock:
+                    for stock_id, amount in batch.items():
+                        self._pending[stock_id] = self._pending.get(stock_id, 0.0) + amount
+                    self._in_flight = {}
+                raise
+            with self._lock:
+                self._in_flight = {}
+            for segment, last_seq in self._segments():
+                if last_seq <= seq:
+                    os.remove(segment)
+            return len(batch)
+
+    def _write(self, deltas, seq):
+        stock = Stock.__table__
+        delta = bindparam('delta')
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(stock)
+                .where(stock.c.id == bindparam('stock_id'))
+                .values(
+                    amount=case((stock.c.amount > delta, stock.c.amount - delta), else_=0.0),
+                    # Bump the version so ORM sessions holding these rows conflict
+                    version=stock.c.version + 1
+                ),
+                [{'stock_id': stock_id, 'delta': amount} for stock_id, amount in deltas.items()]
+            )
+            checkpoint = InventoryCheckpoint.__table__
+            updated = conn.execute(
+                update(checkpoint).where(checkpoint.c.journal == self.name).values(seq=seq)
+            )
+            if not updated.rowcount:
+                conn.execute(insert(checkpoint).values(journal=self.name, seq=seq))
+
+    def _segments(self):
+        segments = []
+        for segment in glob.glob(glob.escape(self.path) + '.*'):
+            suffix = segment.rsplit('.', 1)[1]
+            if suffix.isdigit():
+                segments.append((segment, int(suffix)))
+        return sorted(segments, key=lambda item: item[1])
+
+    def _recover(self):
+        """Apply journal entries the last flush did not reach."""
+        checkpoint = db.session.get(InventoryCheckpoint, self.name)
+        applied = checkpoint.seq if checkpoint else 0
+        db.session.rollback()
+
+        deltas = {}
+        replayed = 0
+        last_seq = applied
+        files = [segment for segment, _ in self._segments()]
+        if os.path.exists(self.path):
+            files.append(self.path)
+        for path in files:
+            with open(path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash; nothing after it was acknowledged
+                        break
+                    last_seq = max(last_seq, entry['seq'])
+                    if entry['seq'] <= applied:
+                        continue
+                    for stock_id, amount in entry['lots']:
+                        deltas[stock_id] = deltas.get(stock_id, 0.0) + amount
+                    replayed += 1
+
+        if deltas:
+            self._write(deltas, last_seq)
+            self.app.logger.info(f'Inventory journal: replayed {replayed} allocations')
+        for path in files:
+            os.remove(path)
+        self._seq = last_seq
+
+    def _ensure_flusher(self):
+        if self._pid == os.getpid() and self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._flusher is not None and self._flusher.is_alive():
+                return
+            self._pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run, name='inventory-flush', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        interval = self.app.config['INVENTORY_FLUSH_SECONDS']
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Inventory flush failed; will retry')
+
+    def _flush_at_exit(self):
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            # The journal still holds everything; the next start replays it
+            pass
+
+
+def _engine():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('inventory_engine')
+
+
+def _collect_stock_writes(session, flush_context):
+    touched = session.info.setdefault('inventory_touched', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Stock):
+            touched.add(obj.ingredient_id)
+        elif isinstance(obj, Ingredient):
+            touched.add(obj.id)
+
+
+def _commit_inventory(session):
+    if session.in_nested_transaction():
+        # A savepoint; the outer transaction can still roll back
+        return
+    reserved = session.info.pop('inventory_reserved', None)
+    touched = session.info.pop('inventory_touched', None)
+    engine = _engine()
+    if engine is None:
+        return
+    if reserved:
+        engine.confirm(reserved)
+    if touched:
+        engine.invalidate(touched)
+
+
+def _end_inventory_transaction(session, transaction):
+    if transaction.parent is not None:
+        return
+    # Still here only if the transaction rolled back or was closed uncommitted
+    session.info.pop('inventory_touched', None)
+    reserved = session.info.pop('inventory_reserved', None)
+    engine = _engine()
+    if reserved and engine is not None:
+        engine.release(reserved)
+
+
+inventory_engine = InventoryEngine()
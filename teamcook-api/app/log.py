@@ -0,0 +1,255 @@
+# app/log.py
+
+"""
+Structured, non-blocking logging.
+
+Records are put on a bounded queue by a QueueHandler on the root logger and
+written by a QueueListener thread, so request threads never wait on stdout.
+Each record becomes one JSON line carrying the request id, route and
+restaurant of the request that logged it. Every request also ends with one
+`request` line holding its status, latency and SQL count (from
+app.instrumentation).
+
+Records at or below LOG_SAMPLE_LEVEL are kept for a LOG_SAMPLE_RATE share of
+requests; the decision is made once per request so a sampled request keeps
+all of its lines. Higher levels are always kept. When the queue is full,
+records are dropped and counted rather than blocking the caller; the count
+is logged once the queue has room again and served on GET /metrics.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request, has_request_context, current_app
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; `extra` fields are included as keys."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single lines for local development."""
+
+    def __init__(self):
+        super().__init__('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, 'request_id', None)
+        return f'{line} [{request_id}]' if request_id else line
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Adds request context and applies sampling on the caller's thread, then
+    enqueues without blocking. `dropped` counts records lost to a full queue.
+    """
+
+    def __init__(self, log_queue, sample_level=logging.INFO, sample_rate=1.0):
+        super().__init__(log_queue)
+        self.sample_level = sample_level
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._reported = 0
+
+    def handle(self, record):
+        if record.levelno <= self.sample_level and not _sampled(self.sample_rate):
+            return False
+        if has_request_context():
+            context = g.get('log_context')
+            if context:
+                for key, value in context.items():
+                    if not hasattr(record, key):
+                        setattr(record, key, value)
+                record.restaurant_id = g.get('restaurant_id')
+        return super().handle(record)
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, where the objects are still
+        # alive; the JSON encoding itself happens on the listener thread
+        return _detach(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self._reported:
+            self._report_dropped()
+
+    def _report_dropped(self):
+        dropped = self.dropped
+        record = logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': 'Log queue was full; dropped %s records', 'args': (dropped - self._reported,),
+            'event': 'log_dropped', 'dropped_total': dropped,
+        })
+        try:
+            self.queue.put_nowait(_detach(record))
+        except queue.Full:
+            return
+        self._reported = dropped
+
+
+def _detach(record):
+    record.message = record.getMessage()
+    if record.exc_info and not record.exc_text:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+    copy = logging.makeLogRecord(vars(record))
+    copy.msg = record.message
+    copy.args = None
+    copy.exc_info = None
+    return copy
+
+
+def _sampled(rate):
+    if rate >= 1.0:
+        return True
+    if has_request_context():
+        sampled = g.get('log_sampled')
+        if sampled is None:
+            sampled = g.log_sampled = random.random() < rate
+        return sampled
+    return random.random() < rate
+
+
+class LogPipeline:
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self.outputs = ()
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        """Install the queue handler on the root logger once per process."""
+        config = app.config
+        level = _level(config['LOG_LEVEL'] or ('DEBUG' if app.debug else 'INFO'))
+        formatter = TextFormatter() if config['LOG_FORMAT'] == 'text' else JSONFormatter()
+
+        with self._lock:
+            if self.handler is None:
+                output = logging.StreamHandler(sys.stdout)
+                self.outputs = (output,)
+                self.handler = ContextQueueHandler(queue.Queue(config['LOG_QUEUE_SIZE']))
+                self._start()
+                logging.getLogger().addHandler(self.handler)
+                atexit.register(self.stop)
+                if hasattr(os, 'register_at_fork'):
+                    os.register_at_fork(after_in_child=self._after_fork)
+            for output in self.outputs:
+                output.setFormatter(formatter)
+            self.handler.sample_level = _level(config['LOG_SAMPLE_LEVEL'])
+            self.handler.sample_rate = config['LOG_SAMPLE_RATE']
+
+        logging.getLogger().setLevel(level)
+        # Flask's own stderr handler would print every app.logger line twice
+        app.logger.removeHandler(default_handler)
+        app.logger.setLevel(level)
+
+    def stop(self):
+        """Flush queued records; registered with atexit."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _start(self):
+        self.listener = QueueListener(self.handler.queue, *self.outputs, respect_handler_level=True)
+        self.listener.start()
+
+    def _after_fork(self):
+        # Preloaded gunicorn workers inherit the queue but not the listener thread
+        if self.handler is not None:
+            self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+            self._start()
+
+
+def _level(name):
+    return name if isinstance(name, int) else logging.getLevelName(str(name).upper())
+
+
+pipeline = LogPipeline()
+
+
+def render_metrics():
+    """Records this process dropped, as a Prometheus counter."""
+    dropped = pipeline.handler.dropped if pipeline.handler is not None else 0
+    return (
+        '# HELP teamcook_log_records_dropped_total Log records dropped because the queue was full.\n'
+        '# TYPE teamcook_log_records_dropped_total counter\n'
+        f'teamcook_log_records_dropped_total {dropped}\n'
+    )
+
+
+def init_app(app):
+    app.config.setdefault('LOG_LEVEL', None)  # None: DEBUG in debug mode, else INFO
+    app.config.setdefault('LOG_FORMAT', 'json')
+    app.config.setdefault('LOG_SAMPLE_LEVEL', 'INFO')
+    app.config.setdefault('LOG_SAMPLE_RATE', 1.0)
+    app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+    app.config.setdefault('LOG_REQUESTS', True)
+    pipeline.configure(app)
+
+    app.before_request(_start_request)
+    # Registered before app.instrumentation, so this runs after its summary is ready
+    app.after_request(_log_request)
+
+
+def _start_request():
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.log_started = time.perf_counter()
+    g.log_context = {
+        'request_id': request_id[:64],
+        'method': request.method,
+        'route': request.url_rule.rule if request.url_rule else None,
+        'path': request.path,
+    }
+
+
+def _log_request(response):
+    context = g.get('log_context')
+    if context is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = context['request_id']
+    if not current_app.config['LOG_REQUESTS']:
+        return response
+    summary = g.get('request_summary') or {
+        'latency_ms': round((time.perf_counter() - g.log_started) * 1000, 2)
+    }
+    level = logging.ERROR if response.status_code >= 500 else logging.INFO
+    current_app.logger.log(
+        level, '%s %s %s', request.method, request.path, response.status_code,
+        extra={'event': 'request', 'status': response.status_code, **summary}
+    )
+    return response
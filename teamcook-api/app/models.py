@@ -30,21 +30,61 @@ class Restaurant(db.Model):
     recipes = db.relationship('Recipe', backref='restaurant', lazy='dynamic')
     events = db.relationship('Event', backref='restaurant', lazy='dynamic')
     sales = db.relationship('Sales', backref='restaurant', lazy='dynamic')
+    ingredients = db.relationship('Ingredient', backref='restaurant', lazy='dynamic')
+    stocks = db.relationship('Stock', backref='restaurant', lazy='dynamic')
+    wastes = db.relationship('Waste', backref='restaurant', lazy='dynamic')
 
 class Ingredient(db.Model):
     __tablename__ = 'ingredient'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'name', name='uq_ingredient_restaurant_name'),
+        db.Index('ix_ingredient_restaurant_type', 'restaurant_id', 'type'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), unique=True, nullable=False)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    name = db.Column(db.String(128), nullable=False)
     unit = db.Column(db.String(64), nullable=False)
-    categories = db.Column(db.String(256))
     type = db.Column(db.String(64), nullable=False)  # 'Raw' or 'Processed'
+    density = db.Column(db.Float)  # grams per millilitre, for mass <-> volume
+    piece_weight = db.Column(db.Float)  # grams per piece, for count <-> mass
 
     stocks = db.relationship('Stock', backref='ingredient', lazy='dynamic')
-    recipe_ingredients = db.relationship('RecipeIngredient', backref='ingredient', lazy='dynamic')
+    recipe_ingredients = db.relationship('RecipeIngredient', back_populates='ingredient', lazy='select')
+    # Routes that list categories for many ingredients use selectinload
+    categories = db.relationship(
+        'Category', secondary='ingredient_category', lazy='select', order_by='Category.name'
+    )
+
+class Category(db.Model):
+    __tablename__ = 'category'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'name', name='uq_category_restaurant_name'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+
+class IngredientCategory(db.Model):
+    __tablename__ = 'ingredient_category'
+    __table_args__ = (
+        # Category filters go from category to ingredient
+        db.Index('ix_ingredient_category_category', 'category_id', 'ingredient_id'),
+    )
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+
+def _amount_as_purchased(context):
+    return context.get_current_parameters().get('amount')
 
 class Stock(db.Model):
     __tablename__ = 'stock'
+    __table_args__ = (
+        db.Index('ix_stock_restaurant_ingredient_purchase', 'restaurant_id', 'ingredient_id', 'purchase_date'),
+        db.Index('ix_stock_restaurant_purchase', 'restaurant_id', 'purchase_date'),
+        db.Index('ix_stock_restaurant_expiry', 'restaurant_id', 'expiry_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
     ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), nullable=False)
     name = db.Column(db.String(128), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -52,29 +92,54 @@ class Stock(db.Model):
     purchase_date = db.Column(db.DateTime, default=datetime.utcnow)
     expiry_date = db.Column(db.DateTime, nullable=False)
     cost = db.Column(db.Float, nullable=False)
+    # `amount` when the lot was bought; `cost` is for this amount
+    initial_amount = db.Column(db.Float, default=_amount_as_purchased)
+    # Optimistic concurrency: concurrent allocations of the same lot conflict
+    # on flush instead of silently overwriting each other's amount
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     wastes = db.relationship('Waste', backref='stock', lazy='dynamic')
 
+    __mapper_args__ = {'version_id_col': version}
+
 class Recipe(db.Model):
     __tablename__ = 'recipe'
+    __table_args__ = (
+        db.Index('ix_recipe_restaurant_name', 'restaurant_id', 'name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     type = db.Column(db.String(64), nullable=False)  # 'Processed' or 'Full Recipe'
     creation_time = db.Column(db.DateTime, default=datetime.utcnow)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'))
 
-    recipe_ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy='dynamic')
-    recipe_steps = db.relationship('RecipeStep', backref='recipe', lazy='dynamic')
+    # Plain collections so recipe reads can selectinload them; history stays dynamic
+    recipe_ingredients = db.relationship(
+        'RecipeIngredient', back_populates='recipe', lazy='select',
+        order_by='RecipeIngredient.id', cascade='all, delete-orphan'
+    )
+    recipe_steps = db.relationship(
+        'RecipeStep', back_populates='recipe', lazy='select',
+        order_by='RecipeStep.step_number', cascade='all, delete-orphan'
+    )
     sales = db.relationship('Sales', backref='recipe', lazy='dynamic')
 
 class RecipeIngredient(db.Model):
     __tablename__ = 'recipe_ingredient'
+    __table_args__ = (
+        # Where-used lookups go from ingredient to recipe
+        db.Index('ix_recipe_ingredient_ingredient', 'ingredient_id', 'recipe_id'),
+        db.Index('ix_recipe_ingredient_recipe', 'recipe_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
     ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), nullable=False)
     required_amount = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(64), nullable=False)
 
+    recipe = db.relationship('Recipe', back_populates='recipe_ingredients')
+    ingredient = db.relationship('Ingredient', back_populates='recipe_ingredients')
+
 class RecipeStep(db.Model):
     __tablename__ = 'recipe_step'
     id = db.Column(db.Integer, primary_key=True)
@@ -82,29 +147,279 @@ class RecipeStep(db.Model):
     step_number = db.Column(db.Integer, nullable=False)
     instruction = db.Column(db.Text, nullable=False)
 
+    recipe = db.relationship('Recipe', back_populates='recipe_steps')
+
 class Event(db.Model):
     __tablename__ = 'event'
+    __table_args__ = (
+        db.Index('ix_event_restaurant_time', 'restaurant_id', 'time'),
+        # Range queries look up the few recurring series separately
+        db.Index('ix_event_recurring', 'restaurant_id', 'recurrence_end',
+                 sqlite_where=db.text('recurrence IS NOT NULL'),
+                 postgresql_where=db.text('recurrence IS NOT NULL')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
-    time = db.Column(db.DateTime, nullable=False)
+    time = db.Column(db.DateTime, nullable=False)  # first occurrence of a recurring event
     created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'))
+    recurrence = db.Column(db.String(256))  # RRULE, see app.recurrence
+    recurrence_end = db.Column(db.DateTime)  # last occurrence; NULL if endless
 
 class Waste(db.Model):
     __tablename__ = 'waste'
+    __table_args__ = (
+        db.Index('ix_waste_restaurant_date', 'restaurant_id', 'waste_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
     stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), nullable=False)
     waste_amount = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(64), nullable=False)
     waste_date = db.Column(db.DateTime, default=datetime.utcnow)
     reason = db.Column(db.String(256))
     notes = db.Column(db.Text)
+    # Value of the wasted stock, recorded when the waste is
+    cost = db.Column(db.Float)
 
 class Sales(db.Model):
     __tablename__ = 'sales'
+    __table_args__ = (
+        db.Index('ix_sales_restaurant_date', 'restaurant_id', 'sale_date'),
+        db.Index('ix_sales_restaurant_recipe', 'restaurant_id', 'recipe_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
     sale_price = db.Column(db.Float, nullable=False)
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
-    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
\ No newline at end of file
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    # Cost of the stock the sale consumed (COGS), recorded at execution
+    cost = db.Column(db.Float)
+
+class RecipeJob(db.Model):
+    __tablename__ = 'recipe_job'
+    __table_args__ = (
+        db.Index('ix_recipe_job_status_created', 'status', 'created_at'),
+    )
+    id = db.Column(db.String(36), primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    sale_price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # 'queued', 'running', 'done' or 'failed'
+    message = db.Column(db.String(256))
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'))
+    claimed_by = db.Column(db.String(64))
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    # Bumped when a job is claimed or reclaimed, so a worker that lost its claim cannot finish it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+class InventoryCheckpoint(db.Model):
+    """Last journal entry the in-memory inventory engine wrote to `stock`."""
+    __tablename__ = 'inventory_checkpoint'
+    journal = db.Column(db.String(255), primary_key=True)
+    seq = db.Column(db.Integer, nullable=False, default=0)
+
+class RecipeEdge(db.Model):
+    """`recipe_id` uses `ingredient_id`, which the processed recipe `sub_recipe_id` produces."""
+    __tablename__ = 'recipe_edge'
+    __table_args__ = (
+        db.UniqueConstraint('recipe_id', 'sub_recipe_id', 'ingredient_id', name='uq_recipe_edge'),
+        db.Index('ix_recipe_edge_restaurant_sub_recipe', 'restaurant_id', 'sub_recipe_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
+    sub_recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), nullable=False)
+
+class RecipeGraphState(db.Model):
+    """Bumped on every recipe or ingredient save; workers reload cached recipe data on mismatch."""
+    __tablename__ = 'recipe_graph_state'
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StatsState(db.Model):
+    """Bumped after every committed stock, sales or waste write; see app.dashboard."""
+    __tablename__ = 'stats_state'
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AuditLog(db.Model):
+    """Append-only record of a system action; see app.audit."""
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_log_subject', 'restaurant_id', 'action', 'subject_id', 'occurred_at'),
+        db.Index('ix_audit_log_restaurant_time', 'restaurant_id', 'occurred_at'),
+        db.Index('ix_audit_log_month', 'month', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    month = db.Column(db.Integer, nullable=False)  # YYYYMM, the retention partition
+    action = db.Column(db.String(64), nullable=False)  # e.g. 'recipe.processed'
+    subject_type = db.Column(db.String(32))
+    subject_id = db.Column(db.Integer)  # no foreign key: entries outlive their subject
+    quantity = db.Column(db.Float)
+    unit = db.Column(db.String(64))
+    details = db.Column(db.JSON)
+
+class AuditSummary(db.Model):
+    """Monthly totals of audit entries that compaction removed."""
+    __tablename__ = 'audit_summary'
+    __table_args__ = (
+        db.Index('ix_audit_summary_subject', 'restaurant_id', 'action', 'subject_id', 'month'),
+        # The compaction merge key; NULL subjects and units count as equal on Postgres
+        db.UniqueConstraint('restaurant_id', 'month', 'action', 'subject_type', 'subject_id', 'unit',
+                            name='uq_audit_summary_key', postgresql_nulls_not_distinct=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(64), nullable=False)
+    subject_type = db.Column(db.String(32))
+    subject_id = db.Column(db.Integer)
+    unit = db.Column(db.String(64))
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    first_at = db.Column(db.DateTime)
+    last_at = db.Column(db.DateTime)
+
+class SalesArchive(db.Model):
+    """Sales moved out of `sales` by app.archive, ids and values unchanged."""
+    __tablename__ = 'sales_archive'
+    __table_args__ = (
+        db.Index('ix_sales_archive_restaurant_date', 'restaurant_id', 'sale_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recipe_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    sale_price = db.Column(db.Float, nullable=False)
+    sale_date = db.Column(db.DateTime)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    cost = db.Column(db.Float)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class WasteArchive(db.Model):
+    """Waste moved out of `waste` by app.archive, with the ingredient of its stock."""
+    __tablename__ = 'waste_archive'
+    __table_args__ = (
+        db.Index('ix_waste_archive_restaurant_date', 'restaurant_id', 'waste_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    stock_id = db.Column(db.Integer, nullable=False)
+    ingredient_id = db.Column(db.Integer)
+    waste_amount = db.Column(db.Float, nullable=False)
+    unit = db.Column(db.String(64), nullable=False)
+    waste_date = db.Column(db.DateTime)
+    reason = db.Column(db.String(256))
+    notes = db.Column(db.Text)
+    cost = db.Column(db.Float)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class EventArchive(db.Model):
+    """Past calendar events moved out of `event` by app.archive."""
+    __tablename__ = 'event_archive'
+    __table_args__ = (
+        db.Index('ix_event_archive_restaurant_time', 'restaurant_id', 'time'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(128), nullable=False)
+    time = db.Column(db.DateTime, nullable=False)
+    created_by_id = db.Column(db.Integer)
+    restaurant_id = db.Column(db.Integer)
+    recurrence = db.Column(db.String(256))
+    recurrence_end = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class SalesDaily(db.Model):
+    """Per-day totals of archived sales, one row per restaurant, day and recipe."""
+    __tablename__ = 'sales_daily'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'day', 'recipe_id', name='uq_sales_daily'),
+        db.Index('ix_sales_daily_restaurant_recipe', 'restaurant_id', 'recipe_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    recipe_id = db.Column(db.Integer, nullable=False)
+    sales = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cost = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+
+class WasteDaily(db.Model):
+    """Per-day totals of archived waste by ingredient, unit and reason."""
+    __tablename__ = 'waste_daily'
+    __table_args__ = (
+        db.Index('ix_waste_daily_restaurant_day', 'restaurant_id', 'day'),
+        db.Index('ix_waste_daily_restaurant_ingredient', 'restaurant_id', 'ingredient_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    ingredient_id = db.Column(db.Integer)
+    unit = db.Column(db.String(64), nullable=False)
+    reason = db.Column(db.String(256))
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    cost = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+
+class BudgetSpendDaily(db.Model):
+    """Cost of the stock bought (Raw) or produced (Processed) per day; see app.budget."""
+    __tablename__ = 'budget_spend_daily'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'day', 'ingredient_type', name='uq_budget_spend_daily'),
+        db.Index('ix_budget_spend_daily_day', 'day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    ingredient_type = db.Column(db.String(64), nullable=False)
+    lots = db.Column(db.Integer, nullable=False, default=0)
+    spend = db.Column(db.Float, nullable=False, default=0.0)
+
+class BudgetRecipeDaily(db.Model):
+    """Sales per day and recipe with their actual and theoretical food cost; see app.budget."""
+    __tablename__ = 'budget_recipe_daily'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'day', 'recipe_id', name='uq_budget_recipe_daily'),
+        db.Index('ix_budget_recipe_daily_day', 'day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    recipe_id = db.Column(db.Integer, nullable=False)
+    sales = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    # Revenue of the sales that recorded their cost; food-cost ratios divide by this
+    costed_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    actual_cost = db.Column(db.Float, nullable=False, default=0.0)
+    theoretical_cost = db.Column(db.Float, nullable=False, default=0.0)
+
+class IngredientPrice(db.Model):
+    """Latest purchase price of an ingredient, per unit of the ingredient; see app.budget."""
+    __tablename__ = 'ingredient_price'
+    ingredient_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    priced_on = db.Column(db.Date, nullable=False)
+
+class BudgetRollupState(db.Model):
+    """How far app.budget has rolled up one source table."""
+    __tablename__ = 'budget_rollup_state'
+    source = db.Column(db.String(32), primary_key=True)
+    # Rows with ids up to here are in the rollups
+    rolled_id = db.Column(db.Integer, nullable=False, default=0)
+    # Highest id at the previous run; the next run rolls up to it
+    horizon = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
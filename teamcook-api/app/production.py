@@ -0,0 +1,216 @@
+# app/production.py
+
+"""
+Produce a Full Recipe, making missing prep first.
+
+The plan walks the recipe's sub-recipes (app.recipe_graph) consumers first,
+adding up how much of every ingredient is needed. For each processed
+ingredient it produces only the shortfall against the stock on hand, which
+in turn adds demand for that sub-recipe's own ingredients. Execution then
+runs the sub-recipes dependencies first and sells the Full Recipe last.
+Everything goes through one set of FIFO lot queues in the caller's
+transaction, so the whole production commits or rolls back as a unit.
+With INVENTORY_ENGINE_ENABLED the lots the engine tracks are reserved
+through it, and only lots produced here are drawn from directly.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db, audit
+from app.models import Recipe, RecipeIngredient, Stock, Sales
+from app.recipe_graph import recipe_graph
+from app.units import UnitConversionError
+from app.utils import LotQueue
+
+DEFAULT_EXPIRY_DAYS = 60
+MAX_EXPIRY_DAYS = 3650
+EPSILON = 1e-9
+
+
+class ProductionError(Exception):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details
+
+    def to_dict(self):
+        return {'message': self.message, **self.details}
+
+
+def produce_full_recipe(recipe, quantity, sale_price, make_missing=True,
+                        expiry_days=DEFAULT_EXPIRY_DAYS, dry_run=False):
+    """
+    Plan and (unless dry_run) execute the production; the caller commits.
+    Returns a dict with the production order and, when executed, the ids
+    of the produced stock and of the sale.
+    """
+    graph = recipe_graph.graph_for(recipe.restaurant_id)
+    order = graph.dependencies(recipe.id)  # dependencies first
+
+    lines = defaultdict(list)
+    for ri in (RecipeIngredient.query
+               .options(joinedload(RecipeIngredient.ingredient))
+               .filter(RecipeIngredient.recipe_id.in_([recipe.id] + order))
+               .order_by(RecipeIngredient.id)):
+        lines[ri.recipe_id].append(ri)
+    recipes = {r.id: r for r in Recipe.query.filter(Recipe.id.in_(order))} if order else {}
+    ingredients = {ri.ingredient_id: ri.ingredient for recipe_lines in lines.values() for ri in recipe_lines}
+    engine = current_app.extensions.get('inventory_engine')
+    # One FIFO scan per ingredient for the whole production
+    queues = {ingredient_id: _lots(engine, ingredient) for ingredient_id, ingredient in ingredients.items()}
+
+    demand = defaultdict(float)
+
+    def add_demand(recipe_id, times):
+        for ri in lines[recipe_id]:
+            try:
+                demand[ri.ingredient_id] += queues[ri.ingredient_id].to_base(ri.required_amount * times, ri.unit)
+            except UnitConversionError as e:
+                raise ProductionError(str(e))
+
+    add_demand(recipe.id, quantity)
+    to_make = {}
+    for sub_recipe_id in reversed(order):  # consumers before what they consume
+        product_id = graph.products[sub_recipe_id]
+        shortfall = demand[product_id] - queues[product_id].available
+        if make_missing and shortfall > EPSILON:
+            to_make[sub_recipe_id] = shortfall
+            add_demand(sub_recipe_id, shortfall)
+
+    made = {graph.products[sub_recipe_id]: amount for sub_recipe_id, amount in to_make.items()}
+    shortages = [
+        {
+            'ingredient_id': ingredient_id,
+            'name': ingredients[ingredient_id].name,
+            'required': amount,
+            'available': queues[ingredient_id].available,
+            'unit': ingredients[ingredient_id].unit
+        }
+        for ingredient_id, amount in demand.items()
+        if amount > queues[ingredient_id].available + made.get(ingredient_id, 0.0) + EPSILON
+    ]
+    if shortages:
+        raise ProductionError('Insufficient stock', shortages=shortages)
+
+    plan = [
+        {
+            'recipe_id': sub_recipe_id,
+            'name': recipes[sub_recipe_id].name,
+            'quantity': to_make[sub_recipe_id],
+            'unit': ingredients[graph.products[sub_recipe_id]].unit
+        }
+        for sub_recipe_id in order if sub_recipe_id in to_make
+    ]
+    if dry_run:
+        return {'plan': plan}
+
+    now = datetime.utcnow()
+    for step in plan:
+        product = ingredients[graph.products[step['recipe_id']]]
+        cost = _consume(lines[step['recipe_id']], step['quantity'], queues)
+        stock = Stock(
+            restaurant_id=recipe.restaurant_id,
+            ingredient_id=product.id,
+            name=product.name,
+            amount=step['quantity'],
+            unit=product.unit,
+            purchase_date=now,
+            expiry_date=now + timedelta(days=expiry_days),
+            cost=cost
+        )
+        db.session.add(stock)
+        db.session.flush()
+        queues[product.id].add(stock)
+        step['stock_id'] = stock.id
+        audit.record(
+            recipe.restaurant_id, 'recipe.processed', 'recipe', step['recipe_id'],
+            quantity=step['quantity'], unit=product.unit, at=now,
+            details={'name': step['name'], 'stock_id': stock.id, 'cost': cost, 'for_recipe_id': recipe.id}
+        )
+        audit.record_consumption(
+            recipe.restaurant_id, 'ingredient.processed', lines[step['recipe_id']], step['quantity'],
+            {'recipe_id': step['recipe_id'], 'recipe': step['name'], 'stock_id': stock.id}, at=now
+        )
+
+    cost = _consume(lines[recipe.id], quantity, queues)
+    sale = Sales(
+        recipe_id=recipe.id,
+        quantity=quantity,
+        sale_price=sale_price,
+        restaurant_id=recipe.restaurant_id,
+        cost=cost
+    )
+    db.session.add(sale)
+    db.session.flush()
+    audit.record_consumption(
+        recipe.restaurant_id, 'ingredient.sold', lines[recipe.id], quantity,
+        {'recipe_id': recipe.id, 'recipe': recipe.name, 'sale_id': sale.id}, at=now
+    )
+    return {'plan': plan, 'sale_id': sale.id}
+
+
+def _lots(engine, ingredient):
+    if engine is None:
+        return LotQueue.load(ingredient)
+    return _EngineLots(engine, ingredient)
+
+
+class _EngineLots:
+    """
+    LotQueue stand-in for the inventory engine: what the engine holds is
+    taken first, through it, then lots produced in this transaction, which
+    the engine does not know about until it commits.
+    """
+
+    def __init__(self, engine, ingredient):
+        self.engine = engine
+        self.ingredient = ingredient
+        self.held = engine.available(ingredient.id) or 0.0
+        self.produced = LotQueue(ingredient, [])
+
+    @property
+    def available(self):
+        return self.held + self.produced.available
+
+    def add(self, stock):
+        self.produced.add(stock)
+
+    def to_base(self, amount, unit=None):
+        return self.produced.to_base(amount, unit)
+
+    def take(self, amount):
+        if amount > self.available + EPSILON:
+            return None
+        allocated = []
+        from_engine = min(amount, self.held)
+        if from_engine > EPSILON:
+            allocated = self.engine.allocate(self.ingredient.id, from_engine)
+            if allocated is None:
+                # Another allocation got there after planning; plan again
+                raise StaleDataError(f'Stock of ingredient ID {self.ingredient.id} changed during production')
+            self.held -= from_engine
+        if amount - from_engine > EPSILON:
+            produced = self.produced.take(amount - from_engine)
+            if produced is None:
+                return None
+            allocated = allocated + produced
+        return allocated
+
+
+def _consume(recipe_lines, times, queues):
+    """Take every line `times` over from the lot queues; returns the cost."""
+    cost = 0.0
+    for ri in recipe_lines:
+        queue = queues[ri.ingredient_id]
+        allocated = queue.take(queue.to_base(ri.required_amount * times, ri.unit))
+        if allocated is None:
+            # The plan checked totals, so only rounding can get here
+            raise ProductionError(f'Insufficient stock for ingredient ID {ri.ingredient_id}')
+        cost += sum(allocation.amount * allocation.unit_cost for allocation in allocated)
+    return cost
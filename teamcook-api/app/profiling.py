@@ -0,0 +1,162 @@
+# app/profiling.py
+
+"""
+Opt-in profiling for live workers (PROFILING_ENABLED, admin token required).
+
+- `?__profile=1` on any request runs it under cProfile and returns the
+  pstats dump (`.prof`, readable with pstats or snakeviz) instead of the
+  normal response. `?__profile=text` returns the top functions by
+  cumulative time and `?__profile=collapsed` samples the request thread
+  and returns collapsed stacks for flamegraph.pl or speedscope.
+- GET /admin/profile?seconds=10 samples the stacks of every thread in the
+  worker for that long and returns collapsed stacks.
+
+Nothing is registered while PROFILING_ENABLED is off, so there is no
+per-request cost.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, request, jsonify
+
+from app.admin import admin_error
+
+PROFILE_ARG = '__profile'
+DEFAULT_INTERVAL = 0.005
+MAX_SAMPLE_SECONDS = 60
+TEXT_LINES = 60
+
+
+class StackSampler:
+    """Wall-clock sampler that counts collapsed stacks of running threads."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def run_for(self, seconds):
+        self.start()
+        self._stop.wait(seconds)
+        return self.stop()
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format: `frame;frame;frame count` per line."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((t.ident, t.name) for t in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.thread_ids is not None and ident not in self.thread_ids):
+                    continue
+                self.stacks[_collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+
+
+def _collapse(thread_name, frame):
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    frames.append(thread_name)
+    return ';'.join(reversed(frames))
+
+
+def init_app(app):
+    app.config.setdefault('PROFILING_ENABLED', False)
+    if not app.config['PROFILING_ENABLED']:
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+
+
+def _start_profile():
+    mode = request.args.get(PROFILE_ARG)
+    if not mode:
+        return None
+    error = admin_error()
+    if error:
+        return jsonify({'message': error}), 403
+    if mode == 'collapsed':
+        g.profiler = StackSampler(thread_ids={threading.get_ident()}).start()
+    else:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+    g.profile_mode = mode
+    g.profile_started = time.perf_counter()
+    return None
+
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    mode = g.pop('profile_mode')
+    elapsed = time.perf_counter() - g.pop('profile_started')
+    if response.is_streamed or response.direct_passthrough:
+        # Buffering would break the stream, and its work happens after this
+        # hook anyway; send it unprofiled
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+        response.headers['X-Profile-Skipped'] = 'streamed response'
+        return response
+    # The profile replaces the body, so consume it while still profiling
+    response.get_data()
+
+    if isinstance(profiler, StackSampler):
+        body = profiler.stop().collapsed()
+        return _attachment(body, 'text/plain', f'{request.endpoint}.collapsed.txt', response, elapsed)
+
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+    if mode == 'text':
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(TEXT_LINES)
+        return _attachment(out.getvalue(), 'text/plain', None, response, elapsed)
+    # Same layout pstats.Stats.dump_stats writes
+    return _attachment(marshal.dumps(stats.stats), 'application/octet-stream',
+                       f'{request.endpoint}.prof', response, elapsed)
+
+
+def _attachment(body, mimetype, filename, original, elapsed):
+    profiled = Response(body, mimetype=mimetype)
+    if filename:
+        profiled.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    profiled.headers['X-Profiled-Status'] = str(original.status_code)
+    profiled.headers['X-Profiled-Seconds'] = f'{elapsed:.4f}'
+    return profiled
+
+
+def sample_threads(seconds, interval=DEFAULT_INTERVAL):
+    """Sample every thread of this process for `seconds`; returns the sampler."""
+    seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+    return StackSampler(interval=interval).run_for(seconds)
@@ -0,0 +1,293 @@
+# app/recipe_graph.py
+
+"""
+Dependency graph between recipes.
+
+Executing a processed recipe stocks an ingredient of the same name, so a
+recipe that uses a processed ingredient depends on the processed recipe that
+makes it. Those links are kept in `recipe_edge`, one row per
+(recipe, sub-recipe, ingredient). They are re-derived with `sync` inside
+every write that can change them: recipe create/update/delete and
+ingredient rename/delete. A write that would close a cycle raises
+RecipeCycleError before anything is committed.
+
+Each worker caches the graph per restaurant. Every sync bumps
+`recipe_graph_state.version`, and a cached graph is reused while its version
+matches, so checking it costs one primary-key lookup. Other caches of recipe
+data (e.g. where-used) key their entries on the same version.
+"""
+
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+
+from sqlalchemy import select, insert, delete, update, and_, or_
+
+from app import db
+from app.cache import Cache
+from app.models import Recipe, RecipeIngredient, Ingredient, RecipeEdge, RecipeGraphState
+
+edge_table = RecipeEdge.__table__
+_UNSET = object()
+
+
+class RecipeCycleError(ValueError):
+    def __init__(self, names):
+        self.names = names
+        super().__init__('Recipes would depend on themselves: ' + ' -> '.join(names))
+
+
+class Graph:
+    """Immutable snapshot of one restaurant's recipe edges."""
+
+    def __init__(self, version, edges):
+        self.version = version
+        self.deps = defaultdict(list)   # recipe -> [(sub-recipe, ingredient)]
+        self.users = defaultdict(set)   # sub-recipe -> recipes using its product
+        self.products = {}              # processed recipe -> ingredient it makes
+        for recipe_id, sub_recipe_id, ingredient_id in sorted(edges):
+            self.deps[recipe_id].append((sub_recipe_id, ingredient_id))
+            self.users[sub_recipe_id].add(recipe_id)
+            self.products[sub_recipe_id] = ingredient_id
+
+    def dependencies(self, recipe_id):
+        """Every sub-recipe `recipe_id` needs, directly or not, dependencies first."""
+        order, seen = [], {recipe_id}
+        stack = [(recipe_id, iter(self.deps.get(recipe_id, ())))]
+        while stack:
+            node, children = stack[-1]
+            for sub_recipe_id, _ in children:
+                if sub_recipe_id not in seen:
+                    seen.add(sub_recipe_id)
+                    stack.append((sub_recipe_id, iter(self.deps.get(sub_recipe_id, ()))))
+                    break
+            else:
+                stack.pop()
+                if node != recipe_id:
+                    order.append(node)
+        return order
+
+    def consumers(self, recipe_ids):
+        """Recipes that use any of `recipe_ids`' products, directly or not."""
+        found, stack = set(), list(recipe_ids)
+        while stack:
+            for user in self.users.get(stack.pop(), ()):
+                if user not in found:
+                    found.add(user)
+                    stack.append(user)
+        return found
+
+
+def find_cycle(edges):
+    """One cycle in (recipe, sub-recipe, ...) edges as a list of recipe ids, or None."""
+    deps = defaultdict(set)
+    for recipe_id, sub_recipe_id, *_ in edges:
+        deps[recipe_id].add(sub_recipe_id)
+    state = {}  # 1: on the current path, 2: done
+    for start in list(deps):
+        if start in state:
+            continue
+        path = [start]
+        stack = [iter(deps[start])]
+        state[start] = 1
+        while stack:
+            for child in stack[-1]:
+                if state.get(child) == 1:
+                    return path[path.index(child):] + [child]
+                if child not in state:
+                    state[child] = 1
+                    path.append(child)
+                    stack.append(iter(deps.get(child, ())))
+                    break
+            else:
+                state[path.pop()] = 2
+                stack.pop()
+    return None
+
+
+def derive_edges(restaurant_id):
+    """Edges implied by the current recipe lines and ingredient names."""
+    producer = Recipe.__table__.alias('producer')
+    rows = db.session.execute(
+        select(RecipeIngredient.recipe_id, producer.c.id, RecipeIngredient.ingredient_id)
+        .join(Ingredient, Ingredient.id == RecipeIngredient.ingredient_id)
+        .join(producer, and_(
+            producer.c.restaurant_id == Ingredient.restaurant_id,
+            producer.c.name == Ingredient.name,
+            producer.c.type == 'Processed'
+        ))
+        .where(Ingredient.restaurant_id == restaurant_id, Ingredient.type == 'Processed')
+    )
+    # Duplicate recipe names: the oldest processed recipe makes the ingredient
+    makers = {}
+    for recipe_id, sub_recipe_id, ingredient_id in rows:
+        key = (recipe_id, ingredient_id)
+        makers[key] = min(makers.get(key, sub_recipe_id), sub_recipe_id)
+    return {(recipe_id, sub_recipe_id, ingredient_id) for (recipe_id, ingredient_id), sub_recipe_id in makers.items()}
+
+
+class RecipeGraph:
+    def __init__(self):
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['recipe_graph'] = self
+
+    def sync(self, restaurant_id):
+        """
+        Bring `recipe_edge` in line with the restaurant's recipes in the
+        current transaction and bump the version. Raises RecipeCycleError,
+        leaving the session for the caller to roll back, if the recipes now
+        form a cycle. Returns the number of edges added and removed.
+        """
+        db.session.flush()
+        desired = derive_edges(restaurant_id)
+        cycle = find_cycle(desired)
+        if cycle:
+            names = dict(db.session.execute(select(Recipe.id, Recipe.name).where(Recipe.id.in_(cycle))).all())
+            raise RecipeCycleError([names.get(recipe_id, str(recipe_id)) for recipe_id in cycle])
+
+        existing = {
+            (row.recipe_id, row.sub_recipe_id, row.ingredient_id): row.id
+            for row in db.session.execute(
+                select(edge_table.c.id, edge_table.c.recipe_id, edge_table.c.sub_recipe_id, edge_table.c.ingredient_id)
+                .where(edge_table.c.restaurant_id == restaurant_id)
+            )
+        }
+        removed = [edge_id for edge, edge_id in existing.items() if edge not in desired]
+        added = [
+            {'restaurant_id': restaurant_id, 'recipe_id': r, 'sub_recipe_id': s, 'ingredient_id': i}
+            for r, s, i in desired if (r, s, i) not in existing
+        ]
+        if removed:
+            db.session.execute(delete(edge_table).where(edge_table.c.id.in_(removed)))
+        if added:
+            db.session.execute(insert(edge_table), added)
+
+        state = db.session.get(RecipeGraphState, restaurant_id)
+        if state is None:
+            db.session.add(RecipeGraphState(restaurant_id=restaurant_id, version=1))
+        else:
+            # Increment in SQL so concurrent writers serialise on the row
+            db.session.execute(
+                update(RecipeGraphState)
+                .where(RecipeGraphState.restaurant_id == restaurant_id)
+                .values(version=RecipeGraphState.version + 1, updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+        return len(added) + len(removed)
+
+    def forget_recipe(self, recipe_id):
+        """Drop the edges touching a recipe about to be deleted; call sync afterwards."""
+        db.session.execute(delete(edge_table).where(
+            or_(edge_table.c.recipe_id == recipe_id, edge_table.c.sub_recipe_id == recipe_id)
+        ))
+
+    def version(self, restaurant_id):
+        """Current recipe-data version of a restaurant; None until its first sync."""
+        return db.session.execute(
+            select(RecipeGraphState.version).where(RecipeGraphState.restaurant_id == restaurant_id)
+        ).scalar()
+
+    def graph_for(self, restaurant_id, version=_UNSET):
+        """The restaurant's graph, reloaded if another write changed it since it was cached."""
+        if version is _UNSET:
+            version = self.version(restaurant_id)
+        with self._lock:
+            cached = self._graphs.get(restaurant_id)
+        if cached is not None and cached.version == version:
+            return cached
+
+        if version is None:
+            # Never synced (e.g. data loaded in bulk): derive without writing
+            edges = derive_edges(restaurant_id)
+        else:
+            edges = db.session.execute(
+                select(edge_table.c.recipe_id, edge_table.c.sub_recipe_id, edge_table.c.ingredient_id)
+                .where(edge_table.c.restaurant_id == restaurant_id)
+            ).all()
+        graph = Graph(version, edges)
+        with self._lock:
+            self._graphs[restaurant_id] = graph
+        return graph
+
+
+recipe_graph = RecipeGraph()
+where_used_cache = Cache('where_used', max_entries=4096)
+
+
+def direct_uses(ingredient_id):
+    """{recipe_id: (required_amount, unit)} for the recipes listing the ingredient."""
+    rows = db.session.execute(
+        select(RecipeIngredient.recipe_id, RecipeIngredient.required_amount, RecipeIngredient.unit)
+        .where(RecipeIngredient.ingredient_id == ingredient_id)
+    )
+    return {recipe_id: (amount, unit) for recipe_id, amount, unit in rows}
+
+
+def where_used(ingredient):
+    """
+    Recipes that use `ingredient` directly, and those that use it through
+    processed sub-recipes, each with the chain of sub-recipes in between.
+    Cached per recipe-data version.
+    """
+    version = recipe_graph.version(ingredient.restaurant_id)
+    return where_used_cache.get_or_set(
+        (ingredient.restaurant_id, version, ingredient.id),
+        lambda: _where_used(ingredient, version)
+    )
+
+
+def _where_used(ingredient, version):
+    direct = direct_uses(ingredient.id)
+    graph = recipe_graph.graph_for(ingredient.restaurant_id, version)
+
+    # Breadth first, so each indirect user is reported through its shortest chain
+    parent = {}
+    seen = set(direct)
+    queue = deque(direct)
+    while queue:
+        recipe_id = queue.popleft()
+        for user in graph.users.get(recipe_id, ()):
+            if user not in seen:
+                seen.add(user)
+                parent[user] = recipe_id
+                queue.append(user)
+
+    recipes = {
+        row.id: row for row in db.session.execute(
+            select(Recipe.id, Recipe.name, Recipe.type).where(Recipe.id.in_(seen))
+        )
+    } if seen else {}
+
+    def via(recipe_id):
+        chain = []
+        while recipe_id in parent:
+            recipe_id = parent[recipe_id]
+            chain.append(recipes[recipe_id].name)
+        return chain[::-1]
+
+    return {
+        'ingredient_id': ingredient.id,
+        'name': ingredient.name,
+        'direct': sorted((
+            {
+                'recipe_id': recipe_id,
+                'name': recipes[recipe_id].name,
+                'type': recipes[recipe_id].type,
+                'required_amount': amount,
+                'unit': unit
+            }
+            for recipe_id, (amount, unit) in direct.items()
+        ), key=lambda entry: entry['name']),
+        'indirect': sorted((
+            {
+                'recipe_id': recipe_id,
+                'name': recipes[recipe_id].name,
+                'type': recipes[recipe_id].type,
+                'via': via(recipe_id)
+            }
+            for recipe_id in parent
+        ), key=lambda entry: entry['name']),
+    }
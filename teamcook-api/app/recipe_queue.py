@@ -0,0 +1,291 @@
+# app/recipe_queue.py
+
+"""
+Queued execution of full recipes.
+
+Requests are validated in the request thread, stored as RecipeJob rows and
+handed to a small worker pool. Each worker claims a batch of queued jobs,
+loads the lots of every ingredient the batch touches once, allocates job by
+job from those in-memory FIFO queues, and commits stock, sales and job
+status in a single transaction.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db, audit
+from app.models import RecipeJob, RecipeIngredient, Ingredient, Recipe, Sales
+from app.units import UnitConversionError
+from app.utils import LotQueue, ALLOCATION_RETRIES
+
+ACTIVE = ('queued', 'running')
+FINISHED = ('done', 'failed')
+
+
+class RecipeQueue:
+    def __init__(self):
+        self.app = None
+        self._wakeup = threading.Event()
+        self._finished = threading.Condition()
+        self._workers = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('RECIPE_QUEUE_ENABLED', False)
+        app.config.setdefault('RECIPE_QUEUE_WORKERS', 2)
+        app.config.setdefault('RECIPE_QUEUE_BATCH_SIZE', 50)
+        app.config.setdefault('RECIPE_QUEUE_POLL_SECONDS', 1.0)
+        app.config.setdefault('RECIPE_QUEUE_CLAIM_TIMEOUT_SECONDS', 300)
+        self.app = app
+        app.extensions['recipe_queue'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['RECIPE_QUEUE_ENABLED']
+
+    def enqueue(self, restaurant_id, recipe_id, quantity, sale_price):
+        """Persist a job and wake a worker. Returns the job."""
+        job = RecipeJob(
+            id=str(uuid.uuid4()),
+            restaurant_id=restaurant_id,
+            recipe_id=recipe_id,
+            quantity=quantity,
+            sale_price=sale_price,
+            status='queued'
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._ensure_workers()
+        self._wakeup.set()
+        return job
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes or `timeout` seconds pass."""
+        deadline = time.monotonic() + timeout
+        while True:
+            db.session.expire_all()
+            job = db.session.get(RecipeJob, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in FINISHED or remaining <= 0:
+                return job
+            with self._finished:
+                # Jobs finished by another process only show up on the next poll
+                self._finished.wait(min(remaining, 0.25))
+
+    def resume(self):
+        """Requeue abandoned claims and start workers if jobs are waiting. Returns the requeued count."""
+        if not self.enabled:
+            return 0
+        requeued = self._requeue_stale()
+        db.session.commit()
+        if db.session.query(RecipeJob.id).filter(RecipeJob.status == 'queued').first() is not None:
+            self._ensure_workers()
+            self._wakeup.set()
+        return requeued
+
+    def _ensure_workers(self):
+        # Threads do not survive fork, so start them lazily in each process
+        with self._lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._workers):
+                return
+            self._pid = os.getpid()
+            self._workers = []
+            for index in range(self.app.config['RECIPE_QUEUE_WORKERS']):
+                worker = threading.Thread(
+                    target=self._run, name=f'recipe-queue-{index}', daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        token = f'{os.getpid()}-{threading.get_ident()}'
+        poll = self.app.config['RECIPE_QUEUE_POLL_SECONDS']
+        while True:
+            self._wakeup.wait(poll)
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    while self._drain_batch(token):
+                        pass
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Recipe queue worker error')
+                finally:
+                    db.session.remove()
+
+    def _drain_batch(self, token):
+        jobs = self._claim(token)
+        if not jobs:
+            return False
+        try:
+            for attempt in range(ALLOCATION_RETRIES):
+                try:
+                    run_batch(jobs)
+                    db.session.commit()
+                    break
+                except StaleDataError:
+                    # A concurrent allocation touched the same lots; replay the batch
+                    db.session.rollback()
+                    jobs = self._claimed(token)
+            else:
+                raise StaleDataError('Stock kept changing during batch')
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception('Recipe batch failed')
+            for job in self._claimed(token):
+                _finish(job, 'failed', f'Internal error: {e}')
+            db.session.commit()
+        with self._finished:
+            self._finished.notify_all()
+        return True
+
+    def _requeue_stale(self):
+        timeout = timedelta(seconds=self.app.config['RECIPE_QUEUE_CLAIM_TIMEOUT_SECONDS'])
+        requeued = db.session.execute(
+            update(RecipeJob)
+            .where(RecipeJob.status == 'running', RecipeJob.claimed_at < datetime.utcnow() - timeout)
+            .values(status='queued', claimed_by=None, claimed_at=None, version=RecipeJob.version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if requeued:
+            self.app.logger.warning('Requeued %s recipe jobs from workers that stopped', requeued)
+        return requeued
+
+    def _claim(self, token):
+        """Atomically mark up to a batch of queued jobs as ours."""
+        self._requeue_stale()
+        batch_size = self.app.config['RECIPE_QUEUE_BATCH_SIZE']
+        queued = (
+            db.session.query(RecipeJob.id)
+            .filter(RecipeJob.status == 'queued')
+            .order_by(RecipeJob.created_at)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        db.session.execute(
+            update(RecipeJob)
+            .where(RecipeJob.id.in_(queued), RecipeJob.status == 'queued')
+            .values(status='running', claimed_by=token, claimed_at=datetime.utcnow(), version=RecipeJob.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return self._claimed(token)
+
+    def _claimed(self, token):
+        return (
+            RecipeJob.query
+            .filter_by(status='running', claimed_by=token)
+            .order_by(RecipeJob.created_at)
+            .all()
+        )
+
+
+def run_batch(jobs):
+    """
+    Execute a batch of claimed jobs against shared per-ingredient lot queues.
+    Jobs are served in arrival order; a job that cannot be fully served fails
+    without consuming anything.
+    """
+    recipe_ids = {job.recipe_id for job in jobs}
+    lines_by_recipe = defaultdict(list)
+    for ri in RecipeIngredient.query.filter(RecipeIngredient.recipe_id.in_(recipe_ids)).all():
+        lines_by_recipe[ri.recipe_id].append(ri)
+    names = dict(db.session.query(Recipe.id, Recipe.name).filter(Recipe.id.in_(recipe_ids)).all())
+
+    ingredient_ids = {ri.ingredient_id for lines in lines_by_recipe.values() for ri in lines}
+    ingredients = Ingredient.query.filter(Ingredient.id.in_(ingredient_ids)).all() if ingredient_ids else []
+    engine = current_app.extensions.get('inventory_engine')
+    if engine is None:
+        # One FIFO scan per ingredient for the whole batch
+        queues = {ingredient.id: LotQueue.load(ingredient) for ingredient in ingredients}
+    restaurants = {ingredient.id: ingredient.restaurant_id for ingredient in ingredients}
+
+    sold = []
+    for job in jobs:
+        lines = lines_by_recipe[job.recipe_id]
+        missing = [ri.ingredient_id for ri in lines if restaurants.get(ri.ingredient_id) != job.restaurant_id]
+        if missing:
+            _finish(job, 'failed', f'Ingredient ID {missing[0]} not found')
+            continue
+
+        if engine is not None:
+            try:
+                taken = engine.allocate_all(
+                    [(ri.ingredient_id, ri.required_amount * job.quantity, ri.unit) for ri in lines]
+                )
+            except UnitConversionError as e:
+                _finish(job, 'failed', str(e))
+                continue
+            if taken is None:
+                _finish(job, 'failed', f'Insufficient stock for recipe ID {job.recipe_id}')
+                continue
+            allocated = [allocation for allocations in taken for allocation in allocations]
+        else:
+            needs = {}
+            try:
+                for ri in lines:
+                    needs[ri.ingredient_id] = needs.get(ri.ingredient_id, 0) + queues[ri.ingredient_id].to_base(
+                        ri.required_amount * job.quantity, ri.unit
+                    )
+            except UnitConversionError as e:
+                _finish(job, 'failed', str(e))
+                continue
+
+            short = [i for i, amount in needs.items() if amount > queues[i].available + 1e-9]
+            if short:
+                _finish(job, 'failed', f'Insufficient stock for ingredient ID {short[0]}')
+                continue
+
+            allocated = []
+            for ingredient_id, amount in needs.items():
+                allocated.extend(queues[ingredient_id].take(amount))
+
+        sale = Sales(
+            recipe_id=job.recipe_id,
+            quantity=job.quantity,
+            sale_price=job.sale_price,
+            restaurant_id=job.restaurant_id,
+            cost=sum(allocation.amount * allocation.unit_cost for allocation in allocated)
+        )
+        db.session.add(sale)
+        sold.append((job, sale))
+        _finish(job, 'done', f'Full recipe executed and {job.quantity:g} units sold')
+
+    db.session.flush()
+    for job, sale in sold:
+        job.sale_id = sale.id
+        audit.record_consumption(
+            job.restaurant_id, 'ingredient.sold', lines_by_recipe[job.recipe_id], job.quantity,
+            {'recipe_id': job.recipe_id, 'recipe': names.get(job.recipe_id), 'sale_id': sale.id}
+        )
+
+
+def _finish(job, status, message):
+    job.status = status
+    job.message = message[:256]
+    job.finished_at = datetime.utcnow()
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'recipe_id': job.recipe_id,
+        'quantity': job.quantity,
+        'message': job.message,
+        'sale_id': job.sale_id,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+recipe_queue = RecipeQueue()
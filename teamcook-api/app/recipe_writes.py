@@ -0,0 +1,117 @@
+# app/recipe_writes.py
+
+"""
+Batched writes of a recipe's ingredient lines and steps.
+
+Creating a recipe inserts its children with one executemany INSERT per
+table. Saving a recipe diffs the submitted lines against the stored ones and
+only touches what changed: new lines are inserted, changed lines are updated
+in place (keeping their ids) and missing lines are deleted, each as a single
+batched statement. Ingredient lines are matched by ingredient, steps by step
+number. Every function returns row counts so callers can report them.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import insert, update, delete, select, bindparam
+
+from app import db
+from app.models import RecipeIngredient, RecipeStep
+
+ingredient_table = RecipeIngredient.__table__
+step_table = RecipeStep.__table__
+
+
+class RecipeDataError(ValueError):
+    """Submitted ingredient lines or steps are malformed."""
+
+
+def parse_ingredients(items):
+    """Validate submitted ingredient lines into (ingredient_id, {fields})."""
+    parsed = []
+    for i, item in enumerate(items or []):
+        try:
+            parsed.append((int(item['id']), {
+                'required_amount': float(item['required_amount']),
+                'unit': str(item['unit'])
+            }))
+        except (KeyError, TypeError, ValueError):
+            raise RecipeDataError(f'Ingredient {i + 1} needs id, required_amount and unit')
+    return parsed
+
+
+def parse_steps(items):
+    """Validate submitted steps into (step_number, {fields})."""
+    parsed = []
+    for i, item in enumerate(items or []):
+        try:
+            parsed.append((int(item['step_number']), {'instruction': str(item['instruction'])}))
+        except (KeyError, TypeError, ValueError):
+            raise RecipeDataError(f'Step {i + 1} needs step_number and instruction')
+    return parsed
+
+
+def insert_children(recipe_id, ingredients, steps):
+    """Bulk-insert the parsed lines of a new recipe."""
+    _insert(ingredient_table, 'ingredient_id', recipe_id, ingredients)
+    _insert(step_table, 'step_number', recipe_id, steps)
+    return {'ingredients': len(ingredients), 'steps': len(steps)}
+
+
+def sync_children(recipe_id, ingredients, steps):
+    """Make the stored lines match the submitted ones, touching only what changed."""
+    return {
+        'ingredients': _sync(ingredient_table, 'ingredient_id', ('required_amount', 'unit'), recipe_id, ingredients),
+        'steps': _sync(step_table, 'step_number', ('instruction',), recipe_id, steps),
+    }
+
+
+def delete_children(recipe_id):
+    """Delete every ingredient line and step of a recipe."""
+    return {
+        'ingredients': db.session.execute(
+            delete(ingredient_table).where(ingredient_table.c.recipe_id == recipe_id)).rowcount,
+        'steps': db.session.execute(
+            delete(step_table).where(step_table.c.recipe_id == recipe_id)).rowcount,
+    }
+
+
+def _insert(table, key, recipe_id, items):
+    if items:
+        db.session.execute(insert(table), [{'recipe_id': recipe_id, key: k, **fields} for k, fields in items])
+
+
+def _sync(table, key, fields, recipe_id, submitted):
+    columns = [table.c.id, table.c[key]] + [table.c[field] for field in fields]
+    stored = defaultdict(list)
+    rows = db.session.execute(select(*columns).where(table.c.recipe_id == recipe_id).order_by(table.c.id))
+    for row in rows:
+        stored[row[1]].append(row)
+
+    inserts, updates = [], []
+    for k, values in submitted:
+        # Duplicated keys are paired up with stored duplicates in order
+        existing = stored.get(k)
+        if not existing:
+            inserts.append({'recipe_id': recipe_id, key: k, **values})
+            continue
+        row = existing.pop(0)
+        if any(getattr(row, field) != values[field] for field in fields):
+            updates.append({'_id': row.id, **{f'_{field}': values[field] for field in fields}})
+    deletes = [row.id for rows in stored.values() for row in rows]
+
+    if deletes:
+        db.session.execute(delete(table).where(table.c.id.in_(deletes)))
+    if updates:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('_id')).values({field: bindparam(f'_{field}') for field in fields}),
+            updates
+        )
+    if inserts:
+        db.session.execute(insert(table), inserts)
+    return {
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'deleted': len(deletes),
+        'unchanged': len(submitted) - len(inserts) - len(updates)
+    }
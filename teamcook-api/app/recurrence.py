@@ -0,0 +1,124 @@
+# app/recurrence.py
+
+"""
+Recurring calendar events.
+
+An event with a `recurrence` rule (an iCalendar RRULE such as
+`FREQ=WEEKLY;BYDAY=MO,WE,FR`) repeats from its `time`, at most daily.
+Occurrences are never stored. A range query moves the rule's start forward
+by whole periods (days, weeks, months or years times INTERVAL) to just
+before the window, so a series that began years ago costs no more than a
+new one, and expands it only up to the end of the window. Rules with COUNT
+are expanded from their first occurrence, which COUNT bounds. Parsed rules
+are cached per worker, keyed by (event id, rule, start). `recurrence_end`
+holds the last possible occurrence, or None for endless rules, so range
+queries can skip series that ended before the window.
+"""
+
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrule, rrulestr, YEARLY, MONTHLY, WEEKLY, DAILY
+
+from app.cache import Cache
+
+MAX_RULE_LENGTH = 256
+MAX_COUNT = 5000
+MAX_OCCURRENCES = 5000  # per range query, over all events
+
+_rules = Cache('event_rules', max_entries=2048)
+
+
+class RecurrenceError(ValueError):
+    """A recurrence rule cannot be parsed or is not supported."""
+
+
+class OccurrenceLimitError(RecurrenceError):
+    """A range query would expand more than its share of MAX_OCCURRENCES."""
+
+
+def parse_rule(text, start):
+    """Parse a single RRULE starting at `start` (naive UTC)."""
+    text = (text or '').strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    if not text or len(text) > MAX_RULE_LENGTH or '\n' in text:
+        raise RecurrenceError(f'Recurrence must be a single RRULE of at most {MAX_RULE_LENGTH} characters')
+    try:
+        rule = rrulestr(text, dtstart=start, ignoretz=True)
+    except (ValueError, TypeError) as e:
+        raise RecurrenceError(f'Invalid recurrence rule: {e}')
+    if not isinstance(rule, rrule):
+        raise RecurrenceError('Recurrence must be a single RRULE')
+    # dateutil exposes FREQ, COUNT and UNTIL only as private attributes
+    if rule._freq > DAILY:
+        raise RecurrenceError('Recurrence FREQ must be DAILY, WEEKLY, MONTHLY or YEARLY')
+    if rule._count and rule._count > MAX_COUNT:
+        raise RecurrenceError(f'COUNT is limited to {MAX_COUNT}')
+    return rule
+
+
+def normalize(text, start):
+    """The rule as stored, and its last occurrence (None if it never ends)."""
+    rule = parse_rule(text, start)
+    text = text.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    if rule._until is not None:
+        return text, rule._until
+    if rule._count:
+        last = start
+        for last in rule:
+            pass
+        return text, last
+    return text, None
+
+
+def occurrences(event, start, end, limit=MAX_OCCURRENCES):
+    """
+    Start times of `event` in [start, end). Raises OccurrenceLimitError if
+    there are more than `limit`, and RecurrenceError for a stored rule that
+    is no longer supported.
+    """
+    if not event.recurrence:
+        return [event.time] if start <= event.time < end else []
+    rule = _rules.get_or_set(
+        (event.id, event.recurrence, event.time),
+        lambda: parse_rule(event.recurrence, event.time)
+    )
+    found = []
+    for time in _near(rule, start).xafter(start, inc=True):
+        if time >= end:
+            break
+        if len(found) >= limit:
+            raise OccurrenceLimitError(f'The window holds more than {MAX_OCCURRENCES} occurrences')
+        found.append(time)
+    return found
+
+
+def _near(rule, start):
+    """
+    `rule` with its start moved forward by whole periods to at most `start`.
+    Whole periods keep every occurrence from there on; starts where months
+    or years cannot be added exactly (the 29th to 31st, 29 February) and
+    COUNT rules are left where they are.
+    """
+    first = rule._dtstart
+    if rule._count or start <= first:
+        return rule
+    interval = rule._interval
+    if rule._freq in (DAILY, WEEKLY):
+        days = interval * (7 if rule._freq == WEEKLY else 1)
+        moved = first + timedelta(days=(start - first).days // days * days)
+    elif rule._freq == MONTHLY and first.day <= 28:
+        months = (start.year - first.year) * 12 + start.month - first.month
+        moved = first + relativedelta(months=months // interval * interval)
+        if moved > start:
+            moved -= relativedelta(months=interval)
+    elif rule._freq == YEARLY and (first.month, first.day) != (2, 29):
+        moved = first + relativedelta(years=(start.year - first.year) // interval * interval)
+        if moved > start:
+            moved -= relativedelta(years=interval)
+    else:
+        return rule
+    return rule.replace(dtstart=moved) if moved > first else rule
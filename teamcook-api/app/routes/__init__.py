@@ -9,6 +9,12 @@ from app.routes.recipe_execution_routes import recipe_execution_bp
 from app.routes.event_routes import event_bp
 from app.routes.waste_routes import waste_bp
 from app.routes.stats_routes import stats_bp
+from app.routes.job_routes import job_bp
+from app.routes.export_routes import export_bp
+from app.routes.metrics_routes import metrics_bp
+from app.routes.admin_routes import admin_bp
+from app.routes.search_routes import search_bp
+from app.routes.audit_routes import audit_bp
 
 blueprints = [
     stock_bp,
@@ -19,5 +25,11 @@ blueprints = [
     recipe_execution_bp,
     event_bp,
     waste_bp,
-    stats_bp
+    stats_bp,
+    job_bp,
+    export_bp,
+    metrics_bp,
+    admin_bp,
+    search_bp,
+    audit_bp
 ]
\ No newline at end of file
@@ -0,0 +1,43 @@
+# app/routes/admin_routes.py
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from flask_cors import cross_origin
+
+from app import profiling
+from app.admin import admin_required
+from app.slow_queries import slow_query_log
+from app.tenancy import unscoped
+
+admin_bp = unscoped(Blueprint('admin_bp', __name__, url_prefix='/admin'))
+
+@admin_bp.route('/slow_queries', methods=['GET'])
+@cross_origin(supports_credentials=True)
+@admin_required
+def get_slow_queries():
+    """Recent statements over SLOW_QUERY_THRESHOLD_MS in this worker, newest first."""
+    limit = request.args.get('limit', 50, type=int)
+    route = request.args.get('route')
+    entries = slow_query_log.recent()
+    if route:
+        entries = [entry for entry in entries if route in entry['route']]
+    return jsonify({
+        'threshold_ms': None if slow_query_log.threshold is None else slow_query_log.threshold * 1000,
+        'entries': entries[:limit]
+    }), 200
+
+@admin_bp.route('/profile', methods=['GET'])
+@cross_origin(supports_credentials=True)
+@admin_required
+def sample_profile():
+    """Sample the stacks of every thread in this worker; returns collapsed stacks."""
+    if not current_app.config.get('PROFILING_ENABLED'):
+        return jsonify({'message': 'Profiling is disabled; set PROFILING_ENABLED'}), 404
+    seconds = request.args.get('seconds', 10, type=float)
+    interval_ms = request.args.get('interval_ms', profiling.DEFAULT_INTERVAL * 1000, type=float)
+    if seconds <= 0 or interval_ms <= 0:
+        return jsonify({'message': 'seconds and interval_ms must be positive'}), 400
+    sampler = profiling.sample_threads(seconds, interval=interval_ms / 1000)
+    response = Response(sampler.collapsed(), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename="worker.collapsed.txt"'
+    response.headers['X-Profile-Samples'] = str(sampler.samples)
+    return response
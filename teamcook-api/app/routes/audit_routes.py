@@ -0,0 +1,83 @@
+# app/routes/audit_routes.py
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from app import audit
+from app.tenancy import current_restaurant_id
+from app.database import read_only_blueprint
+from app.utils import parse_utc_time
+
+audit_bp = read_only_blueprint(Blueprint('audit_bp', __name__, url_prefix='/audit'))
+
+@audit_bp.route('/', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_audit_entries():
+    """
+    Newest audit entries first, filtered by action, subject_type,
+    subject_id and a from/to time window. Pass the returned `next` as
+    ?before= for the following page.
+    """
+    try:
+        subject_id = request.args.get('subject_id', type=int)
+        start = _time_arg('from')
+        end = _time_arg('to')
+        before = request.args.get('before', type=int)
+        limit = max(1, min(int(request.args.get('limit', audit.DEFAULT_LIMIT)), audit.MAX_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'Invalid filter; times use ISO format and ids are integers'}), 400
+
+    rows = audit.entries(
+        current_restaurant_id(),
+        action=request.args.get('action'),
+        subject_type=request.args.get('subject_type'),
+        subject_ids=[subject_id] if subject_id is not None else None,
+        start=start,
+        end=end,
+        before=before,
+        limit=limit
+    )
+    return jsonify({
+        'entries': [
+            {
+                'id': entry.id,
+                'occurred_at': entry.occurred_at.isoformat(),
+                'action': entry.action,
+                'subject_type': entry.subject_type,
+                'subject_id': entry.subject_id,
+                'quantity': entry.quantity,
+                'unit': entry.unit,
+                'details': entry.details
+            }
+            for entry in rows
+        ],
+        'next': rows[-1].id if len(rows) == limit else None
+    }), 200
+
+@audit_bp.route('/summary', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_audit_summary():
+    """Monthly totals of entries that are past retention and were compacted."""
+    subject_id = request.args.get('subject_id', type=int)
+    rows = audit.summaries(
+        current_restaurant_id(),
+        action=request.args.get('action'),
+        subject_ids=[subject_id] if subject_id is not None else None
+    )
+    return jsonify([
+        {
+            'month': summary.month,
+            'action': summary.action,
+            'subject_type': summary.subject_type,
+            'subject_id': summary.subject_id,
+            'unit': summary.unit,
+            'entries': summary.entries,
+            'quantity': summary.quantity,
+            'first_at': summary.first_at.isoformat() if summary.first_at else None,
+            'last_at': summary.last_at.isoformat() if summary.last_at else None
+        }
+        for summary in rows
+    ]), 200
+
+def _time_arg(name):
+    value = request.args.get(name)
+    return parse_utc_time(value) if value else None
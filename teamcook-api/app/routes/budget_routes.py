@@ -0,0 +1,76 @@
+# app/routes/budget_routes.py
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from app import budget, dashboard
+from app.admin import admin_required
+from app.tenancy import current_restaurant_id, unscoped
+from app.database import read_only_blueprint
+from datetime import datetime, timedelta
+
+budget_bp = read_only_blueprint(Blueprint('budget_bp', __name__, url_prefix='/budget'))
+
+@budget_bp.route('/', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_budget():
+    """
+    Spend against revenue and actual against theoretical food cost for the
+    days ?from= to ?to= (both included), or the last ?days= (30 by default),
+    with a ?bucket=day|week|month series.
+    """
+    period, error = _period()
+    if error:
+        return error
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in dashboard.BUCKETS:
+        return jsonify({'message': f"bucket must be one of {', '.join(dashboard.BUCKETS)}"}), 400
+    return jsonify(budget.summary(current_restaurant_id(), *period, bucket)), 200
+
+@budget_bp.route('/recipes', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_recipe_costs():
+    """Food cost per recipe over the period, sorted by ?sort= (variance by default)."""
+    period, error = _period()
+    if error:
+        return error
+    sort = request.args.get('sort', 'variance')
+    if sort not in budget.SORTS:
+        return jsonify({'message': f"sort must be one of {', '.join(budget.SORTS)}"}), 400
+    return jsonify({
+        'from': period[0].isoformat(),
+        'to': budget.date_before(period[1]).isoformat(),
+        'recipes': budget.recipes(current_restaurant_id(), *period, sort)
+    }), 200
+
+@budget_bp.route('/restaurants', methods=['GET'])
+@unscoped
+@cross_origin(supports_credentials=True)
+@admin_required
+def get_restaurant_budgets():
+    """The period's figures for every restaurant side by side."""
+    period, error = _period()
+    if error:
+        return error
+    return jsonify({
+        'from': period[0].isoformat(),
+        'to': budget.date_before(period[1]).isoformat(),
+        'restaurants': budget.restaurants(*period)
+    }), 200
+
+def _period():
+    """((start, end) with `end` exclusive, None) or (None, error response)."""
+    try:
+        today = datetime.utcnow().date()
+        end = _date_arg('to') or today
+        start = _date_arg('from') or end - timedelta(days=int(request.args.get('days', budget.DEFAULT_DAYS)) - 1)
+    except ValueError:
+        return None, (jsonify({'message': 'Invalid period; dates use YYYY-MM-DD and days is an integer'}), 400)
+    if start > end:
+        return None, (jsonify({'message': 'from must not be after to'}), 400)
+    if (end - start).days >= budget.MAX_PERIOD_DAYS:
+        return None, (jsonify({'message': f'The period can span at most {budget.MAX_PERIOD_DAYS} days'}), 400)
+    return (start, end + timedelta(days=1)), None
+
+def _date_arg(name):
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
@@ -1,42 +1,76 @@
 # app/routes/event_routes.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_cors import cross_origin
 
+from sqlalchemy import or_
+
 from app import db
-from app.models import Event, User, Restaurant
-from datetime import datetime
+from app.models import Event, User
+from app.tenancy import scoped, get_scoped_or_404, current_restaurant_id
+from app.utils import parse_utc_time
+from app.recurrence import RecurrenceError, OccurrenceLimitError, normalize, occurrences, MAX_OCCURRENCES
+from datetime import timedelta
 
 event_bp = Blueprint('event_bp', __name__, url_prefix='/events')
 
+MAX_WINDOW_DAYS = 366
+
 @event_bp.route('/', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_events():
-    events = Event.query.all()
-    result = []
-    for event in events:
-        event_data = {
-            'id': event.id,
-            'name': event.name,
-            'time': event.time.isoformat(),
-            'created_by_id': event.created_by_id,
-            'restaurant_id': event.restaurant_id
-        }
-        result.append(event_data)
+    """
+    Events, or with ?from=&to= (or the calendar's start_date/end_date, end
+    day inclusive) the occurrences in that window, recurring events expanded.
+    """
+    start = request.args.get('from') or request.args.get('start_date')
+    end = request.args.get('to')
+    end_day = request.args.get('end_date')
+    if not (start or end or end_day):
+        return jsonify([_event_data(event) for event in scoped(Event).all()]), 200
+
+    try:
+        start = parse_utc_time(start) if start else None
+        if end:
+            end = parse_utc_time(end)
+        elif end_day:
+            end = parse_utc_time(end_day).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    except ValueError:
+        return jsonify({'message': 'Invalid time format. Use ISO format.'}), 400
+    if start is None:
+        start = end - timedelta(days=MAX_WINDOW_DAYS)
+    if end is None:
+        end = start + timedelta(days=MAX_WINDOW_DAYS)
+    if end <= start or end - start > timedelta(days=MAX_WINDOW_DAYS):
+        return jsonify({'message': f'The window must be positive and at most {MAX_WINDOW_DAYS} days'}), 400
+
+    single = scoped(Event).filter(Event.recurrence.is_(None), Event.time >= start, Event.time < end)
+    recurring = scoped(Event).filter(
+        Event.recurrence.isnot(None),
+        Event.time < end,
+        or_(Event.recurrence_end.is_(None), Event.recurrence_end >= start)
+    )
+    result = [_event_data(event) for event in single]
+    left = MAX_OCCURRENCES
+    for event in recurring:
+        try:
+            times = occurrences(event, start, end, left)
+        except OccurrenceLimitError as e:
+            return jsonify({'message': f'{e}; ask for a shorter window'}), 400
+        except RecurrenceError as e:
+            # Stored before the current limits; left out rather than failing the calendar
+            current_app.logger.warning('Skipping recurring event %s: %s', event.id, e)
+            continue
+        left -= len(times)
+        result.extend(_event_data(event, time) for time in times)
+    result.sort(key=lambda entry: (entry['time'], entry['id']))
     return jsonify(result), 200
 
 @event_bp.route('/<int:id>', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_event(id):
-    event = Event.query.get_or_404(id)
-    event_data = {
-        'id': event.id,
-        'name': event.name,
-        'time': event.time.isoformat(),
-        'created_by_id': event.created_by_id,
-        'restaurant_id': event.restaurant_id
-    }
-    return jsonify(event_data), 200
+    event = get_scoped_or_404(Event, id)
+    return jsonify(_event_data(event)), 200
 
 @event_bp.route('/', methods=['POST'])
 @cross_origin(supports_credentials=True)
@@ -48,31 +82,32 @@ def create_event():
     name = data.get('name')
     time = data.get('time')
     created_by_id = data.get('created_by_id')
-    restaurant_id = data.get('restaurant_id')
 
     if not all([name, time]):
         return jsonify({'message': 'Missing required fields'}), 400
 
     try:
-        time_parsed = datetime.fromisoformat(time)
+        time_parsed = parse_utc_time(time)
     except ValueError:
         return jsonify({'message': 'Invalid time format. Use ISO format.'}), 400
 
+    try:
+        recurrence, recurrence_end = _recurrence(data.get('recurrence'), time_parsed)
+    except RecurrenceError as e:
+        return jsonify({'message': str(e)}), 400
+
     if created_by_id:
         user = User.query.get(created_by_id)
         if not user:
             return jsonify({'message': 'User (created_by_id) not found'}), 404
 
-    if restaurant_id:
-        restaurant = Restaurant.query.get(restaurant_id)
-        if not restaurant:
-            return jsonify({'message': 'Restaurant not found'}), 404
-
     event = Event(
         name=name,
         time=time_parsed,
         created_by_id=created_by_id,
-        restaurant_id=restaurant_id
+        restaurant_id=current_restaurant_id(),
+        recurrence=recurrence,
+        recurrence_end=recurrence_end
     )
     db.session.add(event)
     db.session.commit()
@@ -81,7 +116,7 @@ def create_event():
 @event_bp.route('/<int:id>', methods=['PUT'])
 @cross_origin(supports_credentials=True)
 def update_event(id):
-    event = Event.query.get_or_404(id)
+    event = get_scoped_or_404(Event, id)
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No input data provided'}), 400
@@ -89,27 +124,25 @@ def update_event(id):
     name = data.get('name', event.name)
     time = data.get('time')
     created_by_id = data.get('created_by_id', event.created_by_id)
-    restaurant_id = data.get('restaurant_id', event.restaurant_id)
 
     if time:
         try:
-            time_parsed = datetime.fromisoformat(time)
+            time_parsed = parse_utc_time(time)
         except ValueError:
             return jsonify({'message': 'Invalid time format. Use ISO format.'}), 400
         event.time = time_parsed
 
+    try:
+        event.recurrence, event.recurrence_end = _recurrence(data.get('recurrence', event.recurrence), event.time)
+    except RecurrenceError as e:
+        return jsonify({'message': str(e)}), 400
+
     if created_by_id != event.created_by_id:
         user = User.query.get(created_by_id)
         if not user:
             return jsonify({'message': 'User (created_by_id) not found'}), 404
         event.created_by_id = created_by_id
 
-    if restaurant_id != event.restaurant_id:
-        restaurant = Restaurant.query.get(restaurant_id)
-        if not restaurant:
-            return jsonify({'message': 'Restaurant not found'}), 404
-        event.restaurant_id = restaurant_id
-
     event.name = name
 
     db.session.commit()
@@ -118,7 +151,23 @@ def update_event(id):
 @event_bp.route('/<int:id>', methods=['DELETE'])
 @cross_origin(supports_credentials=True)
 def delete_event(id):
-    event = Event.query.get_or_404(id)
+    event = get_scoped_or_404(Event, id)
     db.session.delete(event)
     db.session.commit()
-    return jsonify({'message': 'Event deleted'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Event deleted'}), 200
+
+def _event_data(event, time=None):
+    return {
+        'id': event.id,
+        'name': event.name,
+        'time': (time or event.time).isoformat(),
+        'created_by_id': event.created_by_id,
+        'restaurant_id': event.restaurant_id,
+        'recurrence': event.recurrence,
+        'recurrence_end': event.recurrence_end.isoformat() if event.recurrence_end else None
+    }
+
+def _recurrence(rule, start):
+    if not rule:
+        return None, None
+    return normalize(rule, start)
@@ -0,0 +1,49 @@
+# app/routes/export_routes.py
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_cors import cross_origin
+
+from app.export import TABLES, export_tables, file_name, formats
+from app.tenancy import current_restaurant_id
+
+export_bp = Blueprint('export_bp', __name__, url_prefix='/export')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+@export_bp.route('/', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def export():
+    """
+    Stream the caller's tables. ?tables=stock,sales (default: all) picks the
+    tables, ?format=csv|ndjson|parquet the encoding, ?snapshot=1 reads all
+    of them at one point in time and ?compress=0 turns compression off.
+    """
+    tables = [t for t in request.args.get('tables', ','.join(TABLES)).split(',') if t]
+    unknown = [t for t in tables if t not in TABLES]
+    if not tables or unknown:
+        return jsonify({'message': 'Unknown tables', 'tables': unknown, 'available': list(TABLES)}), 400
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in formats():
+        return jsonify({'message': f'Unsupported format; use one of {", ".join(formats())}'}), 400
+
+    snapshot = request.args.get('snapshot', '0').lower() in ('1', 'true', 'yes')
+    compress = request.args.get('compress', '1').lower() in ('1', 'true', 'yes')
+
+    if len(tables) == 1:
+        name = file_name(tables[0], fmt, compress)
+        mimetype = 'application/gzip' if name.endswith('.gz') else MIMETYPES[fmt]
+    else:
+        name = f'teamcook-export-{current_restaurant_id()}.zip'
+        mimetype = 'application/zip'
+
+    body = export_tables(tables, fmt, current_restaurant_id(), snapshot=snapshot, compress=compress)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{name}"'}
+    )
@@ -2,8 +2,14 @@
 
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models import Ingredient
+from app.models import Ingredient, RecipeIngredient, Category, IngredientCategory
 from flask_cors import cross_origin
+from sqlalchemy.orm import selectinload
+from app.tenancy import scoped, get_scoped_or_404, current_restaurant_id
+from app.utils import available_stock
+from app.recipe_graph import recipe_graph, RecipeCycleError, where_used
+from app.categories import parse_categories, resolve_categories, CategoryError
+from app.units import registry
 
 
 ingredient_bp = Blueprint('ingredient_bp', __name__, url_prefix='/ingredients')
@@ -11,31 +17,37 @@ ingredient_bp = Blueprint('ingredient_bp', __name__, url_prefix='/ingredients')
 @ingredient_bp.route('/', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_ingredients():
-    ingredients = Ingredient.query.all()
-    result = []
-    for ingredient in ingredients:
-        ingredient_data = {
-            'id': ingredient.id,
-            'name': ingredient.name,
-            'unit': ingredient.unit,
-            'categories': ingredient.categories.split(',') if ingredient.categories else [],
-            'type': ingredient.type
-        }
-        result.append(ingredient_data)
-    return jsonify(result), 200
+    query = scoped(Ingredient).options(selectinload(Ingredient.categories))
+    category = request.args.get('category')
+    if category:
+        query = (query
+                 .join(IngredientCategory, IngredientCategory.ingredient_id == Ingredient.id)
+                 .join(Category, Category.id == IngredientCategory.category_id)
+                 .filter(Category.name == category.strip()))
+    return jsonify([_ingredient_data(ingredient) for ingredient in query.all()]), 200
 
 @ingredient_bp.route('/<int:id>', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_ingredient(id):
-    ingredient = Ingredient.query.get_or_404(id)
-    ingredient_data = {
-        'id': ingredient.id,
-        'name': ingredient.name,
-        'unit': ingredient.unit,
-        'categories': ingredient.categories.split(',') if ingredient.categories else [],
-        'type': ingredient.type
-    }
-    return jsonify(ingredient_data), 200
+    ingredient = get_scoped_or_404(Ingredient, id)
+    return jsonify(_ingredient_data(ingredient)), 200
+
+@ingredient_bp.route('/<int:id>/available', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_ingredient_available(id):
+    ingredient = get_scoped_or_404(Ingredient, id)
+    return jsonify({
+        'ingredient_id': ingredient.id,
+        'available': available_stock(ingredient),
+        'unit': ingredient.unit
+    }), 200
+
+@ingredient_bp.route('/<int:id>/where-used', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_ingredient_where_used(id):
+    """Recipes using the ingredient, directly or through processed sub-recipes."""
+    ingredient = get_scoped_or_404(Ingredient, id)
+    return jsonify(where_used(ingredient)), 200
 
 @ingredient_bp.route('/', methods=['POST'])
 @cross_origin(supports_credentials=True)
@@ -46,8 +58,9 @@ def create_ingredient():
 
     name = data.get('name')
     unit = data.get('unit')
-    categories = data.get('categories', '')
     type_ = data.get('type', 'Raw')  # Default to 'Raw'
+    density = data.get('density')
+    piece_weight = data.get('piece_weight')
 
     if not all([name, unit, type_]):
         return jsonify({'message': 'Missing required fields'}), 400
@@ -55,14 +68,25 @@ def create_ingredient():
     if type_ not in ['Raw', 'Processed']:
         return jsonify({'message': "Type must be 'Raw' or 'Processed'"}), 400
 
-    if Ingredient.query.filter_by(name=name).first():
+    if not registry.is_known(unit):
+        return jsonify({'message': f"Unknown unit '{unit}'"}), 400
+
+    try:
+        categories = parse_categories(data.get('categories'))
+    except CategoryError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if scoped(Ingredient).filter_by(name=name).first():
         return jsonify({'message': 'Ingredient with this name already exists'}), 400
 
     ingredient = Ingredient(
+        restaurant_id=current_restaurant_id(),
         name=name,
         unit=unit,
-        categories=','.join(categories) if isinstance(categories, list) else categories,
-        type=type_
+        categories=resolve_categories(current_restaurant_id(), categories),
+        type=type_,
+        density=density,
+        piece_weight=piece_weight
     )
     db.session.add(ingredient)
     db.session.commit()
@@ -71,26 +95,45 @@ def create_ingredient():
 @ingredient_bp.route('/<int:id>', methods=['PUT'])
 @cross_origin(supports_credentials=True)
 def update_ingredient(id):
-    ingredient = Ingredient.query.get_or_404(id)
+    ingredient = get_scoped_or_404(Ingredient, id)
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No input data provided'}), 400
 
     name = data.get('name', ingredient.name)
     unit = data.get('unit', ingredient.unit)
-    categories = data.get('categories', ingredient.categories)
     type_ = data.get('type', ingredient.type)
+    density = data.get('density', ingredient.density)
+    piece_weight = data.get('piece_weight', ingredient.piece_weight)
 
     if type_ not in ['Raw', 'Processed']:
         return jsonify({'message': "Type must be 'Raw' or 'Processed'"}), 400
 
-    if name != ingredient.name and Ingredient.query.filter_by(name=name).first():
+    if unit != ingredient.unit and not registry.is_known(unit):
+        return jsonify({'message': f"Unknown unit '{unit}'"}), 400
+
+    try:
+        categories = parse_categories(data['categories']) if 'categories' in data else None
+    except CategoryError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if name != ingredient.name and scoped(Ingredient).filter_by(name=name).first():
         return jsonify({'message': 'Ingredient with this name already exists'}), 400
 
     ingredient.name = name
     ingredient.unit = unit
-    ingredient.categories = ','.join(categories) if isinstance(categories, list) else categories
+    if categories is not None:
+        ingredient.categories = resolve_categories(ingredient.restaurant_id, categories)
     ingredient.type = type_
+    ingredient.density = density
+    ingredient.piece_weight = piece_weight
+
+    # A processed ingredient's name decides which recipe makes it
+    try:
+        recipe_graph.sync(ingredient.restaurant_id)
+    except RecipeCycleError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), 'cycle': e.names}), 400
 
     db.session.commit()
     return jsonify({'message': 'Ingredient updated'}), 200
@@ -98,7 +141,20 @@ def update_ingredient(id):
 @ingredient_bp.route('/<int:id>', methods=['DELETE'])
 @cross_origin(supports_credentials=True)
 def delete_ingredient(id):
-    ingredient = Ingredient.query.get_or_404(id)
+    ingredient = get_scoped_or_404(Ingredient, id)
+    if RecipeIngredient.query.filter_by(ingredient_id=id).first():
+        return jsonify({'message': 'Ingredient is used by recipes and cannot be deleted'}), 409
     db.session.delete(ingredient)
     db.session.commit()
-    return jsonify({'message': 'Ingredient deleted'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Ingredient deleted'}), 200
+
+def _ingredient_data(ingredient):
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'unit': ingredient.unit,
+        'categories': [category.name for category in ingredient.categories],
+        'type': ingredient.type,
+        'density': ingredient.density,
+        'piece_weight': ingredient.piece_weight
+    }
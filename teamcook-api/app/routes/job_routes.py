@@ -0,0 +1,24 @@
+# app/routes/job_routes.py
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+
+from app.models import RecipeJob
+from app.recipe_queue import recipe_queue, job_to_dict
+from app.tenancy import get_scoped_or_404
+from app.database import use_primary
+
+job_bp = Blueprint('job_bp', __name__, url_prefix='/jobs')
+
+MAX_WAIT_SECONDS = 30
+
+@job_bp.route('/<string:id>', methods=['GET'])
+@cross_origin(supports_credentials=True)
+@use_primary
+def get_job(id):
+    """Job status; pass ?wait=<seconds> to long-poll until it finishes."""
+    job = get_scoped_or_404(RecipeJob, id)
+    wait = request.args.get('wait', type=float)
+    if wait and job.status not in ('done', 'failed'):
+        job = recipe_queue.wait(job.id, min(wait, MAX_WAIT_SECONDS))
+    return jsonify(job_to_dict(job)), 200
@@ -0,0 +1,14 @@
+# app/routes/metrics_routes.py
+
+from flask import Blueprint, Response
+
+from app import log
+from app.instrumentation import render_metrics
+from app.tenancy import unscoped
+
+metrics_bp = unscoped(Blueprint('metrics_bp', __name__))
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Per-endpoint request histograms and log drops in the Prometheus text format."""
+    return Response(render_metrics() + log.render_metrics(), mimetype='text/plain; version=0.0.4')
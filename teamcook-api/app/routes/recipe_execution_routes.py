@@ -1,15 +1,50 @@
 # app/routes/recipe_execution_routes.py
 
 from flask import Blueprint, request, jsonify
-from app import db
+from app import db, audit
 from app.models import Recipe, RecipeIngredient, Stock, Ingredient, Sales
-from app.utils import allocate_stock
+from app.utils import allocate_stock, ALLOCATION_RETRIES
+from app.units import UnitConversionError
+from app.tenancy import scoped, current_restaurant_id
+from app.recipe_queue import recipe_queue
+from app.production import produce_full_recipe, ProductionError, DEFAULT_EXPIRY_DAYS, MAX_EXPIRY_DAYS
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime, timedelta
 from flask_cors import cross_origin
 
 
 recipe_execution_bp = Blueprint('recipe_execution_bp', __name__)
 
+def _wants_async(data):
+    """Clients opt into queued execution with `Prefer: respond-async` or `"async": true`."""
+    return data.get('async') is True or 'respond-async' in request.headers.get('Prefer', '')
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _sale_error(data):
+    """Error message for an invalid quantity or sale_price, or None."""
+    if not _is_number(data['quantity']) or data['quantity'] <= 0:
+        return 'quantity must be a positive number'
+    if not _is_number(data['sale_price']) or data['sale_price'] < 0:
+        return 'sale_price must be a non-negative number'
+    return None
+
+def _production_options(data):
+    """(options, None) for produce_full_recipe, or (None, error message)."""
+    error = _sale_error(data)
+    if error:
+        return None, error
+    expiry_days = data.get('expiry_days', DEFAULT_EXPIRY_DAYS)
+    if not _is_number(expiry_days) or not 0 <= expiry_days <= MAX_EXPIRY_DAYS:
+        return None, f'expiry_days must be a number from 0 to {MAX_EXPIRY_DAYS}'
+    options = {'expiry_days': expiry_days}
+    for name, default in (('make_missing', True), ('dry_run', False)):
+        options[name] = data.get(name, default)
+        if not isinstance(options[name], bool):
+            return None, f'{name} must be true or false'
+    return options, None
+
 @recipe_execution_bp.route('/execute_processed_recipe', methods=['POST'])
 @cross_origin(supports_credentials=True)
 def execute_processed_recipe():
@@ -23,7 +58,7 @@ def execute_processed_recipe():
     if not all([recipe_id, quantity_to_produce]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    recipe = Recipe.query.get(recipe_id)
+    recipe = scoped(Recipe).filter_by(id=recipe_id).first()
     if not recipe:
         return jsonify({'message': 'Recipe not found'}), 404
 
@@ -32,35 +67,42 @@ def execute_processed_recipe():
 
     # Gather required ingredients
     recipe_ingredients = RecipeIngredient.query.filter_by(recipe_id=recipe_id).all()
+    if not recipe_ingredients:
+        # The processed ingredient takes its unit from the recipe's ingredients
+        return jsonify({'message': 'Recipe has no ingredients'}), 400
 
     allocations = []
 
     # Allocate ingredients
     for ri in recipe_ingredients:
         total_required = ri.required_amount * quantity_to_produce
-        allocated = allocate_stock(ri.ingredient_id, total_required)
+        try:
+            allocated = allocate_stock(ri.ingredient_id, total_required, ri.unit)
+        except UnitConversionError as e:
+            return jsonify({'message': str(e)}), 400
+        except StaleDataError:
+            return jsonify({'message': 'Stock kept changing; try again'}), 409
         if not allocated:
             return jsonify({'message': f'Insufficient stock for ingredient ID {ri.ingredient_id}'}), 400
         allocations.extend(allocated)
 
     # Calculate total cost
     total_cost = 0
-    for stock, amount in allocations:
-        cost_per_unit = stock.cost / (stock.amount + amount) if (stock.amount + amount) > 0 else 0
-        total_cost += cost_per_unit * amount
+    for allocation in allocations:
+        total_cost += allocation.unit_cost * allocation.amount
 
     # Add processing cost if any
     processing_cost = data.get('processing_cost', 0)
     total_cost += processing_cost
 
     # Check if processed ingredient exists
-    processed_ingredient = Ingredient.query.filter_by(name=recipe.name, type='Processed').first()
+    processed_ingredient = scoped(Ingredient).filter_by(name=recipe.name, type='Processed').first()
     if not processed_ingredient:
         # Create processed ingredient
         processed_ingredient = Ingredient(
+            restaurant_id=recipe.restaurant_id,
             name=recipe.name,
             unit=recipe_ingredients[0].unit,  # Assuming unit same as ingredients
-            categories='',
             type='Processed'
         )
         db.session.add(processed_ingredient)
@@ -71,6 +113,7 @@ def execute_processed_recipe():
     expiry_date = datetime.utcnow() + timedelta(days=expiry_days)
 
     processed_stock = Stock(
+        restaurant_id=recipe.restaurant_id,
         ingredient_id=processed_ingredient.id,
         name=processed_ingredient.name,
         amount=quantity_to_produce,
@@ -80,6 +123,16 @@ def execute_processed_recipe():
         cost=total_cost
     )
     db.session.add(processed_stock)
+    db.session.flush()
+    audit.record(
+        recipe.restaurant_id, 'recipe.processed', 'recipe', recipe.id,
+        quantity=quantity_to_produce, unit=processed_ingredient.unit,
+        details={'name': recipe.name, 'stock_id': processed_stock.id, 'cost': total_cost}
+    )
+    audit.record_consumption(
+        recipe.restaurant_id, 'ingredient.processed', recipe_ingredients, quantity_to_produce,
+        {'recipe_id': recipe.id, 'recipe': recipe.name, 'stock_id': processed_stock.id}
+    )
     db.session.commit()
 
     return jsonify({'message': 'Processed recipe executed', 'processed_stock_id': processed_stock.id}), 200
@@ -98,13 +151,24 @@ def execute_full_recipe():
     if not all([recipe_id, quantity_to_prepare, sale_price]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    recipe = Recipe.query.get(recipe_id)
+    # Checked up front so a queued execution cannot fail on its input later
+    error = _sale_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+
+    recipe = scoped(Recipe).filter_by(id=recipe_id).first()
     if not recipe:
         return jsonify({'message': 'Recipe not found'}), 404
 
     if recipe.type != 'Full Recipe':
         return jsonify({'message': 'Selected recipe is not a full recipe'}), 400
 
+    if recipe_queue.enabled and _wants_async(data):
+        job = recipe_queue.enqueue(current_restaurant_id(), recipe_id, quantity_to_prepare, sale_price)
+        response = jsonify({'message': 'Recipe execution queued', 'job_id': job.id, 'status_url': f'/jobs/{job.id}'})
+        response.headers['Location'] = f'/jobs/{job.id}'
+        return response, 202
+
     # Gather required ingredients
     recipe_ingredients = RecipeIngredient.query.filter_by(recipe_id=recipe_id).all()
 
@@ -113,19 +177,78 @@ def execute_full_recipe():
     # Allocate ingredients
     for ri in recipe_ingredients:
         total_required = ri.required_amount * quantity_to_prepare
-        allocated = allocate_stock(ri.ingredient_id, total_required)
+        try:
+            allocated = allocate_stock(ri.ingredient_id, total_required, ri.unit)
+        except UnitConversionError as e:
+            return jsonify({'message': str(e)}), 400
+        except StaleDataError:
+            return jsonify({'message': 'Stock kept changing; try again'}), 409
         if not allocated:
             return jsonify({'message': f'Insufficient stock for ingredient ID {ri.ingredient_id}'}), 400
         allocations.extend(allocated)
 
-    # Record the sale
+    # Record the sale with the cost of what it consumed
     sale = Sales(
         recipe_id=recipe_id,
         quantity=quantity_to_prepare,
         sale_price=sale_price,
-        restaurant_id=1
+        restaurant_id=current_restaurant_id(),
+        cost=sum(allocation.unit_cost * allocation.amount for allocation in allocations)
     )
     db.session.add(sale)
+    db.session.flush()
+    audit.record_consumption(
+        sale.restaurant_id, 'ingredient.sold', recipe_ingredients, quantity_to_prepare,
+        {'recipe_id': recipe.id, 'recipe': recipe.name, 'sale_id': sale.id}
+    )
     db.session.commit()
 
-    return jsonify({'message': f'Full recipe executed and {quantity_to_prepare} units sold'}), 200
\ No newline at end of file
+    return jsonify({'message': f'Full recipe executed and {quantity_to_prepare} units sold'}), 200
+
+@recipe_execution_bp.route('/produce_full_recipe', methods=['POST'])
+@cross_origin(supports_credentials=True)
+def produce_full_recipe_route():
+    """
+    Sell a Full Recipe, first producing whatever processed ingredients are
+    short, sub-recipes before the recipes that use them, in one transaction.
+    `"dry_run": true` returns the production plan without executing it.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({'message': 'No input data provided'}), 400
+
+    recipe_id = data.get('recipe_id')
+    quantity = data.get('quantity')
+    sale_price = data.get('sale_price')
+
+    if not all([recipe_id, quantity, sale_price]):
+        return jsonify({'message': 'Missing required fields'}), 400
+
+    options, error = _production_options(data)
+    if error:
+        return jsonify({'message': error}), 400
+
+    recipe = scoped(Recipe).filter_by(id=recipe_id).first()
+    if not recipe:
+        return jsonify({'message': 'Recipe not found'}), 404
+
+    if recipe.type != 'Full Recipe':
+        return jsonify({'message': 'Selected recipe is not a full recipe'}), 400
+
+    for attempt in range(ALLOCATION_RETRIES):
+        try:
+            result = produce_full_recipe(recipe, quantity, sale_price, **options)
+            db.session.commit()
+            break
+        except ProductionError as e:
+            db.session.rollback()
+            return jsonify(e.to_dict()), e.status
+        except StaleDataError:
+            # Lots changed under us; plan again from fresh stock
+            db.session.rollback()
+    else:
+        return jsonify({'message': 'Stock kept changing; try again'}), 409
+
+    if options['dry_run']:
+        return jsonify({'message': 'Production plan', **result}), 200
+    return jsonify({'message': f'Full recipe produced and {quantity} units sold', **result}), 200
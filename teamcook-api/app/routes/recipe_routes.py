@@ -2,57 +2,86 @@
 
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models import Recipe, Restaurant, RecipeIngredient, RecipeStep, Ingredient
+from app.models import Recipe, RecipeIngredient, Ingredient, Sales, RecipeJob
 from flask_cors import cross_origin
+from sqlalchemy.orm import selectinload
+from app.tenancy import scoped, get_scoped_or_404, current_restaurant_id
+from app import recipe_writes
+from app.recipe_writes import RecipeDataError
+from app.recipe_graph import recipe_graph, RecipeCycleError
+from app.recipe_queue import ACTIVE
 
 recipe_bp = Blueprint('recipe_bp', __name__, url_prefix='/recipes')
 
+def _ingredients_in_scope(ingredients):
+    """Check that every referenced ingredient belongs to the caller's restaurant."""
+    ids = {ingredient_id for ingredient_id, _ in ingredients}
+    if not ids:
+        return True
+    return scoped(Ingredient).filter(Ingredient.id.in_(ids)).count() == len(ids)
+
+EXPANSIONS = ('ingredients', 'steps')
+MAX_BATCH_IDS = 200
+
+def _with_children(query, expand):
+    """Load the requested children up front: one extra SELECT per collection."""
+    if 'ingredients' in expand:
+        query = query.options(selectinload(Recipe.recipe_ingredients).joinedload(RecipeIngredient.ingredient))
+    if 'steps' in expand:
+        query = query.options(selectinload(Recipe.recipe_steps))
+    return query
+
+def _recipe_data(recipe, expand=()):
+    recipe_data = {
+        'id': recipe.id,
+        'name': recipe.name,
+        'type': recipe.type,
+        'creation_time': recipe.creation_time.isoformat(),
+        'restaurant_id': recipe.restaurant_id
+    }
+    if 'ingredients' in expand:
+        recipe_data['ingredients'] = [{
+            'id': ri.ingredient.id,
+            'name': ri.ingredient.name,
+            'type': ri.ingredient.type,
+            'required_amount': ri.required_amount,
+            'unit': ri.unit
+        } for ri in recipe.recipe_ingredients]
+    if 'steps' in expand:
+        recipe_data['steps'] = [
+            {'step_number': rs.step_number, 'instruction': rs.instruction} for rs in recipe.recipe_steps
+        ]
+    return recipe_data
+
 @recipe_bp.route('/', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_recipes():
-    recipes = Recipe.query.all()
-    result = []
-    for recipe in recipes:
-        recipe_data = {
-            'id': recipe.id,
-            'name': recipe.name,
-            'type': recipe.type,
-            'creation_time': recipe.creation_time.isoformat(),
-            'restaurant_id': recipe.restaurant_id
-        }
-        result.append(recipe_data)
-    return jsonify(result), 200
+    """All recipes, or `?ids=1,2,3`; `?expand=ingredients,steps` includes their children."""
+    expand = {part for part in request.args.get('expand', '').split(',') if part}
+    if not expand <= set(EXPANSIONS):
+        return jsonify({'message': f"expand must be a subset of {','.join(EXPANSIONS)}"}), 400
+
+    query = _with_children(scoped(Recipe), expand)
+    ids = request.args.get('ids')
+    if ids is not None:
+        try:
+            ids = list(dict.fromkeys(int(part) for part in ids.split(',') if part))
+        except ValueError:
+            return jsonify({'message': 'ids must be a comma-separated list of integers'}), 400
+        if len(ids) > MAX_BATCH_IDS:
+            return jsonify({'message': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+        by_id = {recipe.id: recipe for recipe in query.filter(Recipe.id.in_(ids))}
+        # Requested order; ids of other restaurants or deleted recipes are skipped
+        recipes = [by_id[id] for id in ids if id in by_id]
+    else:
+        recipes = query.all()
+    return jsonify([_recipe_data(recipe, expand) for recipe in recipes]), 200
 
 @recipe_bp.route('/<int:id>', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_recipe(id):
-    recipe = Recipe.query.get_or_404(id)
-    recipe_ingredients = RecipeIngredient.query.filter_by(recipe_id=id).all()
-    recipe_steps = RecipeStep.query.filter_by(recipe_id=id).order_by(RecipeStep.step_number).all()
-
-    ingredients_data = []
-    for ri in recipe_ingredients:
-        ingredient = Ingredient.query.get(ri.ingredient_id)
-        ingredients_data.append({
-            'id': ingredient.id,
-            'name': ingredient.name,
-            'type': ingredient.type,
-            'required_amount': ri.required_amount,
-            'unit': ri.unit
-        })
-
-    steps_data = [{'step_number': rs.step_number, 'instruction': rs.instruction} for rs in recipe_steps]
-
-    recipe_data = {
-        'id': recipe.id,
-        'name': recipe.name,
-        'type': recipe.type,
-        'creation_time': recipe.creation_time.isoformat(),
-        'restaurant_id': recipe.restaurant_id,
-        'ingredients': ingredients_data,
-        'steps': steps_data
-    }
-    return jsonify(recipe_data), 200
+    recipe = _with_children(scoped(Recipe), EXPANSIONS).filter(Recipe.id == id).first_or_404()
+    return jsonify(_recipe_data(recipe, EXPANSIONS)), 200
 
 @recipe_bp.route('/', methods=['POST'])
 @cross_origin(supports_credentials=True)
@@ -63,9 +92,6 @@ def create_recipe():
 
     name = data.get('name')
     type_ = data.get('type')  # 'Processed' or 'Full Recipe'
-    restaurant_id = data.get('restaurant_id')
-    ingredients = data.get('ingredients', [])
-    steps = data.get('steps', [])
 
     if not all([name, type_]):
         return jsonify({'message': 'Missing required fields'}), 400
@@ -73,84 +99,84 @@ def create_recipe():
     if type_ not in ['Processed', 'Full Recipe']:
         return jsonify({'message': "Type must be 'Processed' or 'Full Recipe'"}), 400
 
-    if Recipe.query.filter_by(name=name).first():
+    if scoped(Recipe).filter_by(name=name).first():
         return jsonify({'message': 'Recipe with this name already exists'}), 400
 
-    if restaurant_id:
-        restaurant = Restaurant.query.get(restaurant_id)
-        if not restaurant:
-            return jsonify({'message': 'Restaurant not found'}), 404
+    try:
+        ingredients = recipe_writes.parse_ingredients(data.get('ingredients'))
+        steps = recipe_writes.parse_steps(data.get('steps'))
+    except RecipeDataError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if not _ingredients_in_scope(ingredients):
+        return jsonify({'message': 'Ingredient not found'}), 404
 
     recipe = Recipe(
         name=name,
         type=type_,
-        restaurant_id=restaurant_id
+        restaurant_id=current_restaurant_id()
     )
     db.session.add(recipe)
     db.session.flush()  # This assigns an id to the recipe
 
-    # Add ingredients
-    for ingredient_data in ingredients:
-        new_ingredient = RecipeIngredient(
-            recipe_id=recipe.id,
-            ingredient_id=ingredient_data['id'],
-            required_amount=ingredient_data['required_amount'],
-            unit=ingredient_data['unit']
-        )
-        db.session.add(new_ingredient)
-
-    # Add steps
-    for step_data in steps:
-        new_step = RecipeStep(
-            recipe_id=recipe.id,
-            step_number=step_data['step_number'],
-            instruction=step_data['instruction']
-        )
-        db.session.add(new_step)
+    # One batched INSERT per table
+    counts = recipe_writes.insert_children(recipe.id, ingredients, steps)
+
+    try:
+        recipe_graph.sync(recipe.restaurant_id)
+    except RecipeCycleError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), 'cycle': e.names}), 400
 
     db.session.commit()
-    return jsonify({'message': 'Recipe created', 'id': recipe.id}), 201
+    return jsonify({'message': 'Recipe created', 'id': recipe.id, 'inserted': counts}), 201
 
 @recipe_bp.route('/<int:id>', methods=['PUT'])
 @cross_origin(supports_credentials=True)
 def update_recipe(id):
-    recipe = Recipe.query.get_or_404(id)
+    recipe = get_scoped_or_404(Recipe, id)
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No input data provided'}), 400
 
     recipe.name = data.get('name', recipe.name)
     recipe.type = data.get('type', recipe.type)
-    recipe.restaurant_id = data.get('restaurant_id', recipe.restaurant_id)
-
-    # Update ingredients
-    RecipeIngredient.query.filter_by(recipe_id=id).delete()
-    for ingredient_data in data.get('ingredients', []):
-        new_ingredient = RecipeIngredient(
-            recipe_id=id,
-            ingredient_id=ingredient_data['id'],
-            required_amount=ingredient_data['required_amount'],
-            unit=ingredient_data['unit']
-        )
-        db.session.add(new_ingredient)
-
-    # Update steps
-    RecipeStep.query.filter_by(recipe_id=id).delete()
-    for step_data in data.get('steps', []):
-        new_step = RecipeStep(
-            recipe_id=id,
-            step_number=step_data['step_number'],
-            instruction=step_data['instruction']
-        )
-        db.session.add(new_step)
+
+    try:
+        ingredients = recipe_writes.parse_ingredients(data.get('ingredients'))
+        steps = recipe_writes.parse_steps(data.get('steps'))
+    except RecipeDataError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if not _ingredients_in_scope(ingredients):
+        return jsonify({'message': 'Ingredient not found'}), 404
+
+    # Only insert, update or delete the lines that changed
+    changes = recipe_writes.sync_children(id, ingredients, steps)
+
+    # Renames and new lines can link or unlink sub-recipes
+    try:
+        recipe_graph.sync(recipe.restaurant_id)
+    except RecipeCycleError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), 'cycle': e.names}), 400
 
     db.session.commit()
-    return jsonify({'message': 'Recipe updated'}), 200
+    return jsonify({'message': 'Recipe updated', 'changes': changes}), 200
 
 @recipe_bp.route('/<int:id>', methods=['DELETE'])
 @cross_origin(supports_credentials=True)
 def delete_recipe(id):
-    recipe = Recipe.query.get_or_404(id)
+    recipe = get_scoped_or_404(Recipe, id)
+    active_jobs = RecipeJob.query.filter(RecipeJob.recipe_id == id, RecipeJob.status.in_(ACTIVE))
+    if Sales.query.filter_by(recipe_id=id).first() or active_jobs.first():
+        return jsonify({'message': 'Recipe has sales or queued executions and cannot be deleted'}), 409
+    restaurant_id = recipe.restaurant_id
+    counts = recipe_writes.delete_children(id)
+    # Finished jobs only point at the recipe; they go with it
+    counts['jobs'] = RecipeJob.query.filter_by(recipe_id=id).delete(synchronize_session=False)
+    recipe_graph.forget_recipe(id)
     db.session.delete(recipe)
+    recipe_graph.sync(restaurant_id)
     db.session.commit()
-    return jsonify({'message': 'Recipe deleted'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Recipe deleted', 'deleted': counts}), 200
\ No newline at end of file
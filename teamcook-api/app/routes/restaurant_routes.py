@@ -4,9 +4,10 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Restaurant
 from flask_cors import cross_origin
+from app.tenancy import known_restaurants, unscoped
 
 
-restaurant_bp = Blueprint('restaurant_bp', __name__, url_prefix='/restaurants')
+restaurant_bp = unscoped(Blueprint('restaurant_bp', __name__, url_prefix='/restaurants'))
 
 @restaurant_bp.route('/', methods=['GET'])
 @cross_origin(supports_credentials=True)
@@ -89,4 +90,5 @@ def delete_restaurant(id):
     restaurant = Restaurant.query.get_or_404(id)
     db.session.delete(restaurant)
     db.session.commit()
+    known_restaurants.clear()
     return jsonify({'message': 'Restaurant deleted'}), 200
\ No newline at end of file
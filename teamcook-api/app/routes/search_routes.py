@@ -0,0 +1,32 @@
+# app/routes/search_routes.py
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from app.tenancy import current_restaurant_id
+from app.database import read_only_blueprint
+from app import search
+
+search_bp = read_only_blueprint(Blueprint('search_bp', __name__, url_prefix='/search'))
+
+@search_bp.route('/', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def search_everything():
+    """Ranked matches across ingredients, recipes and stock; `q` is matched as you type."""
+    q = request.args.get('q', '')
+    if not search.query_tokens(q):
+        return jsonify({'message': 'q must contain at least one word'}), 400
+
+    types = [t.strip() for t in request.args.get('types', '').split(',') if t.strip()]
+    unknown = [t for t in types if t not in search.KINDS]
+    if unknown:
+        return jsonify({'message': f"Unknown types: {', '.join(unknown)}",
+                        'types': list(search.KINDS)}), 400
+
+    try:
+        limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, search.MAX_LIMIT))
+
+    results = search.search(current_restaurant_id(), q, types, limit)
+    return jsonify({'query': q, 'results': results}), 200
@@ -1,57 +1,63 @@
 # app/routes/stats_routes.py
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from app import db
-from app.models import Stock, Ingredient
+from app import dashboard
+from app.tenancy import current_restaurant_id
+from app.database import read_only_blueprint
 from datetime import datetime, timedelta
 
-stats_bp = Blueprint('stats_bp', __name__, url_prefix='/stats')
+stats_bp = read_only_blueprint(Blueprint('stats_bp', __name__, url_prefix='/stats'))
 
 @stats_bp.route('/stock_counts', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_stock_counts():
-    raw_ingredients = db.session.query(Ingredient.id).filter_by(type='Raw').subquery()
-    processed_ingredients = db.session.query(Ingredient.id).filter_by(type='Processed').subquery()
-
-    raw_count = db.session.query(Stock.ingredient_id).filter(Stock.ingredient_id.in_(raw_ingredients)).distinct().count()
-    processed_count = db.session.query(Stock.ingredient_id).filter(Stock.ingredient_id.in_(processed_ingredients)).distinct().count()
-
+    """Ingredients with stock on hand by type; the same counts as /stats/dashboard."""
+    stock = dashboard.stock_by_type(current_restaurant_id())
     return jsonify({
-        'raw_count': raw_count,
-        'processed_count': processed_count
+        'raw_count': stock.get('Raw', {}).get('ingredients', 0),
+        'processed_count': stock.get('Processed', {}).get('ingredients', 0)
     }), 200
 
 @stats_bp.route('/stock_history', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_stock_history():
+    """Amount left of the Raw and Processed lots bought on each of the last 7 days."""
     today = datetime.utcnow().date()
     dates = [(today - timedelta(days=i)) for i in range(6, -1, -1)]  # Last 7 days
-
-    raw_data = []
-    processed_data = []
-
-    for date in dates:
-        start = datetime.combine(date, datetime.min.time())
-        end = datetime.combine(date, datetime.max.time())
-
-        raw_amount = db.session.query(db.func.sum(Stock.amount)).join(Ingredient).filter(
-            Stock.purchase_date.between(start, end),
-            Ingredient.type == 'Raw'
-        ).scalar() or 0
-
-        processed_amount = db.session.query(db.func.sum(Stock.amount)).join(Ingredient).filter(
-            Stock.purchase_date.between(start, end),
-            Ingredient.type == 'Processed'
-        ).scalar() or 0
-
-        raw_data.append(raw_amount)
-        processed_data.append(processed_amount)
-
-    date_strings = [date.strftime('%Y-%m-%d') for date in dates]
+    amounts = dashboard.purchased_amounts(current_restaurant_id(), dates[0], today + timedelta(days=1))
 
     return jsonify({
-        'dates': date_strings,
-        'raw_data': raw_data,
-        'processed_data': processed_data
-    }), 200
\ No newline at end of file
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'raw_data': [amounts.get((date, 'Raw'), 0) for date in dates],
+        'processed_data': [amounts.get((date, 'Processed'), 0) for date in dates]
+    }), 200
+
+@stats_bp.route('/dashboard', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_dashboard():
+    """
+    Every dashboard KPI for the days ?from= to ?to= (both included), or the
+    last ?days= (7 by default), with ?bucket=day|week|month series and the
+    ?top= recipes that consumed the most stock.
+    """
+    try:
+        today = datetime.utcnow().date()
+        end = _date_arg('to') or today
+        start = _date_arg('from') or end - timedelta(days=int(request.args.get('days', dashboard.DEFAULT_DAYS)) - 1)
+        top = max(0, min(int(request.args.get('top', dashboard.DEFAULT_TOP)), dashboard.MAX_TOP))
+    except ValueError:
+        return jsonify({'message': 'Invalid period; dates use YYYY-MM-DD and days/top are integers'}), 400
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in dashboard.BUCKETS:
+        return jsonify({'message': f"bucket must be one of {', '.join(dashboard.BUCKETS)}"}), 400
+    if start > end:
+        return jsonify({'message': 'from must not be after to'}), 400
+    if (end - start).days >= dashboard.MAX_PERIOD_DAYS:
+        return jsonify({'message': f'The period can span at most {dashboard.MAX_PERIOD_DAYS} days'}), 400
+
+    return jsonify(dashboard.summary(current_restaurant_id(), start, end + timedelta(days=1), bucket, top)), 200
+
+def _date_arg(name):
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
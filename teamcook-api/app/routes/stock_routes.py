@@ -1,22 +1,34 @@
 # app/routes/stock_routes.py
 
-from flask import Blueprint, request, jsonify
-from app import db
-from app.models import Stock, Ingredient, Waste, Sales, Recipe, Event, RecipeIngredient
+from flask import Blueprint, current_app, request, jsonify
+from app import db, audit, archive
+from app.models import Stock, Ingredient, Waste
 from datetime import datetime
 from sqlalchemy import func, desc
+from sqlalchemy.orm import joinedload
 from flask_cors import cross_origin
+from app.units import ingredient_units, UnitConversionError
+from app.tenancy import scoped, get_scoped_or_404, current_restaurant_id
+from app.stock_import import import_stock, detect_format, FORMATS
+from app.utils import flush_inventory
 
 
 stock_bp = Blueprint('stock_bp', __name__, url_prefix='/stocks')
 
+# Audit actions recording what recipe runs used, and their stock log types
+CONSUMPTION_TYPES = {
+    'ingredient.processed': 'Consumed (Processed Recipe)',
+    'ingredient.sold': 'Consumed (Full Recipe)',
+}
+
 @stock_bp.route('/', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_stocks():
-    stocks = Stock.query.all()
+    # Ingredients come in the same query rather than one lookup per lot
+    stocks = scoped(Stock).options(joinedload(Stock.ingredient, innerjoin=True)).all()
     result = []
     for stock in stocks:
-        ingredient = Ingredient.query.get(stock.ingredient_id)
+        ingredient = stock.ingredient
         stock_data = {
             'id': stock.id,
             'name': stock.name,
@@ -24,6 +36,7 @@ def get_stocks():
             'expiry_date': stock.expiry_date.isoformat(),
             'cost': stock.cost,
             'amount': stock.amount,
+            'initial_amount': stock.initial_amount,
             'unit': stock.unit,
             'ingredient_id': stock.ingredient_id,
             'ingredient_name': ingredient.name  # Add ingredient_name
@@ -34,7 +47,7 @@ def get_stocks():
 @stock_bp.route('/<int:id>', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_stock(id):
-    stock = Stock.query.get_or_404(id)
+    stock = get_scoped_or_404(Stock, id)
     stock_data = {
         'id': stock.id,
         'name': stock.name,
@@ -42,6 +55,7 @@ def get_stock(id):
         'expiry_date': stock.expiry_date.isoformat(),
         'cost': stock.cost,
         'amount': stock.amount,
+        'initial_amount': stock.initial_amount,
         'unit': stock.unit,
         'ingredient_id': stock.ingredient_id
     }
@@ -82,10 +96,15 @@ def create_stock():
         return jsonify({'message': 'Missing required fields', 'fields': missing_fields}), 400
 
     # Check if Ingredient exists
-    ingredient = Ingredient.query.get(ingredient_id)
+    ingredient = scoped(Ingredient).filter_by(id=ingredient_id).first()
     if not ingredient:
         return jsonify({'message': 'Ingredient not found'}), 404
 
+    try:
+        ingredient_units(ingredient).factor(unit)
+    except UnitConversionError as e:
+        return jsonify({'message': str(e)}), 400
+
     # Parse dates
     try:
         purchase_date = datetime.fromisoformat(purchase_date) if purchase_date else datetime.utcnow()
@@ -95,6 +114,7 @@ def create_stock():
 
     # Create stock instance
     stock = Stock(
+        restaurant_id=current_restaurant_id(),
         name=name,
         purchase_date=purchase_date,
         expiry_date=expiry_date,
@@ -107,10 +127,38 @@ def create_stock():
     db.session.commit()
     return jsonify({'message': 'Stock created', 'id': stock.id}), 201
 
+@stock_bp.route('/import', methods=['POST'])
+@cross_origin(supports_credentials=True)
+def import_stocks():
+    """
+    Bulk import deliveries. Send the CSV or NDJSON as the request body
+    (Content-Type text/csv or application/x-ndjson) or as a multipart `file`;
+    `?format=` overrides detection.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.args.get('format') or detect_format(upload.mimetype, upload.filename)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or detect_format(request.content_type)
+
+    if fmt not in FORMATS:
+        return jsonify({'message': f'Unsupported format; use one of {", ".join(FORMATS)}'}), 400
+
+    result = import_stock(stream, fmt, current_restaurant_id())
+    return jsonify({'message': f'Imported {result.inserted} of {result.rows} rows', **result.to_dict()}), 200
+
 @stock_bp.route('/<int:id>', methods=['PUT'])
 @cross_origin(supports_credentials=True)
 def update_stock(id):
-    stock = Stock.query.get_or_404(id)
+    try:
+        # The engine's unflushed deductions would otherwise be taken off the new amount too
+        flush_inventory()
+    except Exception:
+        current_app.logger.exception('Inventory flush before stock update failed')
+        return jsonify({'message': 'Stock is being updated; try again'}), 503
+    stock = get_scoped_or_404(Stock, id)
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No input data provided'}), 400
@@ -123,17 +171,25 @@ def update_stock(id):
     unit = data.get('unit', stock.unit)
     ingredient_id = data.get('ingredient_id', stock.ingredient_id)
 
-    if ingredient_id != stock.ingredient_id:
-        # If ingredient_id is being updated, check if the new Ingredient exists
-        ingredient = Ingredient.query.get(ingredient_id)
-        if not ingredient:
-            return jsonify({'message': 'Ingredient not found'}), 404
-        stock.ingredient_id = ingredient_id
+    # The ingredient, new or current, must exist and accept the lot's unit
+    ingredient = scoped(Ingredient).filter_by(id=ingredient_id).first()
+    if not ingredient:
+        return jsonify({'message': 'Ingredient not found'}), 404
+
+    try:
+        ingredient_units(ingredient).factor(unit)
+    except UnitConversionError as e:
+        return jsonify({'message': str(e)}), 400
+
+    stock.ingredient_id = ingredient_id
 
     stock.name = name
     stock.purchase_date = datetime.fromisoformat(purchase_date) if purchase_date else stock.purchase_date
     stock.expiry_date = datetime.fromisoformat(expiry_date) if expiry_date else stock.expiry_date
     stock.cost = cost
+    if stock.initial_amount is None or stock.amount == stock.initial_amount:
+        # Nothing was drawn yet, so this corrects the amount bought
+        stock.initial_amount = amount
     stock.amount = amount
     stock.unit = unit
 
@@ -143,7 +199,7 @@ def update_stock(id):
 @stock_bp.route('/<int:id>', methods=['DELETE'])
 @cross_origin(supports_credentials=True)
 def delete_stock(id):
-    stock = Stock.query.get_or_404(id)
+    stock = get_scoped_or_404(Stock, id)
     db.session.delete(stock)
     db.session.commit()
     return jsonify({'message': 'Stock deleted'}), 200
@@ -154,34 +210,42 @@ def delete_stock(id):
 @cross_origin(supports_credentials=True)
 def get_grouped_stocks():
     try:
-        # Perform a join between Stock and Ingredient to get ingredient details
+        # Sum per (ingredient, unit) in SQL, then fold the handful of unit
+        # groups into the ingredient's unit using the precomputed factors
         grouped_stocks = (
             db.session.query(
-                Ingredient.id.label('ingredient_id'),
-                Ingredient.name.label('ingredient_name'),
+                Ingredient,
                 func.sum(Stock.amount).label('total_amount'),
-                Stock.unit.label('unit')  # Assuming unit is consistent per ingredient
+                Stock.unit.label('unit')
             )
             .join(Ingredient, Stock.ingredient_id == Ingredient.id)
-            .group_by(Ingredient.id, Ingredient.name, Stock.unit)
+            .filter(Stock.restaurant_id == current_restaurant_id())
+            .group_by(Ingredient.id, Stock.unit)
             .all()
         )
 
+        totals = {}
+        for ingredient, total_amount, unit in grouped_stocks:
+            entry = totals.get(ingredient.id)
+            if entry is None:
+                entry = totals[ingredient.id] = {
+                    'ingredient_id': ingredient.id,
+                    'ingredient_name': ingredient.name,
+                    'total_amount': 0.0,
+                    'unit': ingredient.unit
+                }
+            try:
+                entry['total_amount'] += ingredient_units(ingredient).to_ingredient_unit(total_amount, unit)
+            except UnitConversionError:
+                entry.setdefault('unconverted', []).append({'amount': total_amount, 'unit': unit})
+
         # Convert the result to a list of dictionaries
-        result = []
-        for stock in grouped_stocks:
-            result.append({
-                'ingredient_id': stock.ingredient_id,
-                'ingredient_name': stock.ingredient_name,
-                'total_amount': stock.total_amount,
-                'unit': stock.unit
-            })
+        result = list(totals.values())
 
         return jsonify(result), 200
 
-    except Exception as e:
-        # Log the exception if you have a logging system
-        print(f"Error in get_grouped_stocks: {e}")
+    except Exception:
+        current_app.logger.exception('Error in get_grouped_stocks')
         return jsonify({'message': 'Internal Server Error'}), 500
     
 
@@ -190,39 +254,36 @@ def get_grouped_stocks():
 def get_stock_log(ingredient_name):
     try:
         # Get the ingredient
-        ingredient = Ingredient.query.filter_by(name=ingredient_name).first_or_404()
+        restaurant_id = current_restaurant_id()
+        ingredient = scoped(Ingredient).filter_by(name=ingredient_name).first_or_404()
 
         # Fetch stock creations
         stock_creations = (
             Stock.query
-            .filter_by(ingredient_id=ingredient.id)
+            .filter_by(restaurant_id=restaurant_id, ingredient_id=ingredient.id)
             .order_by(desc(Stock.purchase_date))
             .all()
         )
 
-        # Fetch processed recipe executions (consumptions)
-        processed_executions = (
-            Event.query
-            .filter(Event.name.like(f"Processed Recipe:%"))
-            .order_by(desc(Event.time))
-            .all()
-        )
+        # What recipe runs took of it, as recorded with each run, and the
+        # monthly totals of compacted months
+        consumed = {
+            action: (
+                audit.entries(restaurant_id, action=action, subject_type='ingredient',
+                              subject_ids=[ingredient.id], limit=None),
+                audit.summaries(restaurant_id, action=action, subject_ids=[ingredient.id])
+            )
+            for action in CONSUMPTION_TYPES
+        }
 
-        # Fetch full recipe executions (consumptions)
-        full_executions = (
-            Sales.query
-            .join(Recipe, Sales.recipe_id == Recipe.id)
-            .join(RecipeIngredient, RecipeIngredient.recipe_id == Recipe.id)
-            .filter(RecipeIngredient.ingredient_id == ingredient.id)
-            .order_by(desc(Sales.sale_date))
-            .all()
-        )
+        # Waste days moved to the archive, as daily totals
+        archived_waste = archive.archived_waste(restaurant_id, ingredient.id)
 
         # Fetch waste entries
         wastes = (
             Waste.query
             .join(Stock, Waste.stock_id == Stock.id)
-            .filter(Stock.ingredient_id == ingredient.id)
+            .filter(Waste.restaurant_id == restaurant_id, Stock.ingredient_id == ingredient.id)
             .order_by(desc(Waste.waste_date))
             .all()
         )
@@ -234,32 +295,26 @@ def get_stock_log(ingredient_name):
             log_entries.append({
                 'type': 'Stock Added',
                 'date': creation.purchase_date.isoformat(),
-                'amount': creation.amount,
+                'amount': creation.initial_amount if creation.initial_amount is not None else creation.amount,
                 'unit': creation.unit
             })
 
-        for execution in processed_executions:
-            # Parse the event name to get recipe details
-            _, recipe_name, amount, unit = execution.name.split(':')
-            if ingredient_name in recipe_name:
+        for action, (entries, summaries) in consumed.items():
+            for entry in entries:
                 log_entries.append({
-                    'type': 'Consumed (Processed Recipe)',
-                    'date': execution.time.isoformat(),
-                    'amount': float(amount),
-                    'unit': unit.strip(),
-                    'details': f"Used in {recipe_name.strip()}"
+                    'type': CONSUMPTION_TYPES[action],
+                    'date': entry.occurred_at.isoformat(),
+                    'amount': entry.quantity,
+                    'unit': entry.unit,
+                    'details': f"Used in {(entry.details or {}).get('recipe')}"
                 })
-
-        for sale in full_executions:
-            recipe_ingredient = RecipeIngredient.query.filter_by(recipe_id=sale.recipe_id, ingredient_id=ingredient.id).first()
-            if recipe_ingredient:
-                consumed_amount = recipe_ingredient.required_amount * sale.quantity
+            for summary in summaries:
                 log_entries.append({
-                    'type': 'Consumed (Full Recipe)',
-                    'date': sale.sale_date.isoformat(),
-                    'amount': consumed_amount,
-                    'unit': recipe_ingredient.unit,
-                    'details': f"Used in {sale.recipe.name}"
+                    'type': CONSUMPTION_TYPES[action],
+                    'date': summary.last_at.isoformat(),
+                    'amount': summary.quantity,
+                    'unit': summary.unit,
+                    'details': f"{summary.entries} recipe runs in {summary.month}"
                 })
 
         for waste in wastes:
@@ -271,11 +326,21 @@ def get_stock_log(ingredient_name):
                 'reason': waste.reason
             })
 
+        for day in archived_waste:
+            log_entries.append({
+                'type': 'Expired/Wasted',
+                'date': day.day.isoformat(),
+                'amount': day.amount,
+                'unit': day.unit,
+                'reason': day.reason,
+                'details': f"{day.entries} entries, archived"
+            })
+
         # Sort all entries by date, most recent first
         log_entries.sort(key=lambda x: x['date'], reverse=True)
 
         return jsonify(log_entries), 200
 
-    except Exception as e:
-        print(f"Error in get_stock_log: {e}")
+    except Exception:
+        current_app.logger.exception('Error in get_stock_log')
         return jsonify({'message': 'Internal Server Error'}), 500
\ No newline at end of file
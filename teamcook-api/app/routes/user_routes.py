@@ -4,8 +4,9 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import User
 from flask_cors import cross_origin
+from app.tenancy import unscoped
 
-user_bp = Blueprint('user_bp', __name__, url_prefix='/users')
+user_bp = unscoped(Blueprint('user_bp', __name__, url_prefix='/users'))
 
 @user_bp.route('/', methods=['GET'])
 @cross_origin(supports_credentials=True)
@@ -1,30 +1,40 @@
 # app/routes/waste_routes.py
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
 from app import db
 from app.models import Stock, Waste
 from datetime import datetime
 from flask_cors import cross_origin
+from app.tenancy import scoped
+from app.utils import remaining_value, flush_inventory
 
 waste_bp = Blueprint('waste_bp', __name__)
 
 @waste_bp.route('/handle_expired_items', methods=['POST'])
 @cross_origin(supports_credentials=True)
 def handle_expired_items():
+    try:
+        # Book what is really left of each lot, not amounts the engine has yet to deduct
+        flush_inventory()
+    except Exception:
+        current_app.logger.exception('Inventory flush before expiry failed')
+        return jsonify({'message': 'Stock is being updated; try again'}), 503
     current_time = datetime.utcnow()
-    expired_stocks = Stock.query.filter(Stock.expiry_date <= current_time).all()
+    expired_stocks = scoped(Stock).filter(Stock.expiry_date <= current_time).all()
 
     if not expired_stocks:
         return jsonify({'message': 'No expired items found'}), 200
 
     for stock in expired_stocks:
         waste_record = Waste(
+            restaurant_id=stock.restaurant_id,
             stock_id=stock.id,
             waste_amount=stock.amount,
             unit=stock.unit,
             waste_date=current_time,
             reason='Expired',
-            notes=f"Expired on {stock.expiry_date.isoformat()}"
+            notes=f"Expired on {stock.expiry_date.isoformat()}",
+            cost=remaining_value(stock)
         )
         db.session.add(waste_record)
         db.session.delete(stock)  # Remove expired stock
@@ -0,0 +1,273 @@
+# app/search.py
+
+"""
+Full-text and prefix search over ingredients (name and categories), recipes
+(name and step instructions) and stock lots (name).
+
+On SQLite the documents live in the FTS5 table `search_index`, kept current
+by triggers on the source tables. Core bulk inserts (stock import, the data
+generator) are therefore indexed as well. Each document's rowid encodes its
+type and id, so triggers update it by rowid without scanning. The
+restaurant is stored as a `r<id>` token and matched inside the FTS query,
+which keeps tenants apart without a post-filter. On Postgres the source
+tables carry GIN indexes on `to_tsvector('simple', ...)` expressions and are
+queried directly with prefix `tsquery`s, so no separate index table is needed.
+
+The last word of a query is matched as a prefix, which gives autocomplete.
+`install` is run by the migration and after every `create_all`.
+"""
+
+import re
+
+from sqlalchemy import event, text, bindparam
+
+from app import db
+
+KINDS = {'ingredient': 1, 'recipe': 2, 'stock': 3}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_TOKENS = 8
+SEARCH_TABLE = 'search_index'
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Document bodies, as correlated subqueries on the document's id
+_INGREDIENT_BODY = (
+    "(SELECT group_concat(c.name, ' ') FROM ingredient_category ic "
+    "JOIN category c ON c.id = ic.category_id WHERE ic.ingredient_id = {id})"
+)
+_RECIPE_BODY = "(SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = {id})"
+
+
+def _document(kind, row, restaurant, title, body):
+    return (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, restaurant, title, body) "
+        f"VALUES ({row}.id * 4 + {KINDS[kind]}, '{kind}', {row}.id, 'r' || {row}.{restaurant}, {row}.{title}, {body})"
+    )
+
+
+def _delete(kind, key):
+    return f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {key} * 4 + {KINDS[kind]}"
+
+
+def _set_body(kind, key, body):
+    return f"UPDATE {SEARCH_TABLE} SET body = {body} WHERE rowid = {key} * 4 + {KINDS[kind]}"
+
+
+SQLITE_TRIGGERS = {
+    'search_ingredient_insert': (
+        'AFTER INSERT ON ingredient',
+        [_document('ingredient', 'NEW', 'restaurant_id', 'name', _INGREDIENT_BODY.format(id='NEW.id'))]),
+    'search_ingredient_update': (
+        'AFTER UPDATE OF name, restaurant_id ON ingredient',
+        [_delete('ingredient', 'OLD.id'),
+         _document('ingredient', 'NEW', 'restaurant_id', 'name', _INGREDIENT_BODY.format(id='NEW.id'))]),
+    'search_ingredient_delete': (
+        'AFTER DELETE ON ingredient', [_delete('ingredient', 'OLD.id')]),
+    'search_ingredient_category_insert': (
+        'AFTER INSERT ON ingredient_category',
+        [_set_body('ingredient', 'NEW.ingredient_id', _INGREDIENT_BODY.format(id='NEW.ingredient_id'))]),
+    'search_ingredient_category_delete': (
+        'AFTER DELETE ON ingredient_category',
+        [_set_body('ingredient', 'OLD.ingredient_id', _INGREDIENT_BODY.format(id='OLD.ingredient_id'))]),
+    'search_category_update': (
+        'AFTER UPDATE OF name ON category',
+        [f"UPDATE {SEARCH_TABLE} SET body = {_INGREDIENT_BODY.format(id='ingredient_category.ingredient_id')} "
+         f"FROM ingredient_category WHERE ingredient_category.category_id = NEW.id "
+         f"AND {SEARCH_TABLE}.rowid = ingredient_category.ingredient_id * 4 + {KINDS['ingredient']}"]),
+    'search_recipe_insert': (
+        'AFTER INSERT ON recipe',
+        [_document('recipe', 'NEW', 'restaurant_id', 'name', _RECIPE_BODY.format(id='NEW.id'))]),
+    'search_recipe_update': (
+        'AFTER UPDATE OF name, restaurant_id ON recipe',
+        [_delete('recipe', 'OLD.id'),
+         _document('recipe', 'NEW', 'restaurant_id', 'name', _RECIPE_BODY.format(id='NEW.id'))]),
+    'search_recipe_delete': (
+        'AFTER DELETE ON recipe', [_delete('recipe', 'OLD.id')]),
+    'search_recipe_step_insert': (
+        'AFTER INSERT ON recipe_step',
+        [_set_body('recipe', 'NEW.recipe_id', _RECIPE_BODY.format(id='NEW.recipe_id'))]),
+    'search_recipe_step_update': (
+        'AFTER UPDATE OF instruction, recipe_id ON recipe_step',
+        [_set_body('recipe', 'OLD.recipe_id', _RECIPE_BODY.format(id='OLD.recipe_id')),
+         _set_body('recipe', 'NEW.recipe_id', _RECIPE_BODY.format(id='NEW.recipe_id'))]),
+    'search_recipe_step_delete': (
+        'AFTER DELETE ON recipe_step',
+        [_set_body('recipe', 'OLD.recipe_id', _RECIPE_BODY.format(id='OLD.recipe_id'))]),
+    # Allocations update stock.amount constantly; only name changes matter
+    'search_stock_insert': (
+        'AFTER INSERT ON stock', [_document('stock', 'NEW', 'restaurant_id', 'name', 'NULL')]),
+    'search_stock_update': (
+        'AFTER UPDATE OF name, restaurant_id ON stock',
+        [_delete('stock', 'OLD.id'), _document('stock', 'NEW', 'restaurant_id', 'name', 'NULL')]),
+    'search_stock_delete': (
+        'AFTER DELETE ON stock', [_delete('stock', 'OLD.id')]),
+}
+
+SQLITE_REBUILD = [
+    f"DELETE FROM {SEARCH_TABLE}",
+    f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, restaurant, title, body) "
+    f"SELECT i.id * 4 + {KINDS['ingredient']}, 'ingredient', i.id, 'r' || i.restaurant_id, i.name, b.body "
+    "FROM ingredient i LEFT JOIN (SELECT ic.ingredient_id, group_concat(c.name, ' ') AS body "
+    "FROM ingredient_category ic JOIN category c ON c.id = ic.category_id GROUP BY ic.ingredient_id) b "
+    "ON b.ingredient_id = i.id",
+    f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, restaurant, title, body) "
+    f"SELECT r.id * 4 + {KINDS['recipe']}, 'recipe', r.id, 'r' || r.restaurant_id, r.name, b.body "
+    "FROM recipe r LEFT JOIN (SELECT recipe_id, group_concat(instruction, ' ') AS body "
+    "FROM recipe_step GROUP BY recipe_id) b ON b.recipe_id = r.id",
+    f"INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, restaurant, title, body) "
+    f"SELECT id * 4 + {KINDS['stock']}, 'stock', id, 'r' || restaurant_id, name, NULL FROM stock",
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')",
+]
+
+POSTGRES_INDEXES = {
+    'ix_ingredient_name_search': ('ingredient', 'name'),
+    'ix_category_name_search': ('category', 'name'),
+    'ix_recipe_name_search': ('recipe', 'name'),
+    'ix_recipe_step_instruction_search': ('recipe_step', 'instruction'),
+    'ix_stock_name_search': ('stock', 'name'),
+}
+
+
+def install(connection):
+    """Create the search index (and fill it if new) on this connection's database."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': SEARCH_TABLE}
+        ).first()
+        if not exists:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                "kind UNINDEXED, ref_id UNINDEXED, restaurant, title, body, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+            ))
+        for name, (when, statements) in SQLITE_TRIGGERS.items():
+            body = ''.join(f'{statement}; ' for statement in statements)
+            connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {when} BEGIN {body}END"))
+        if not exists:
+            rebuild(connection)
+    elif dialect == 'postgresql':
+        for name, (table, column) in POSTGRES_INDEXES.items():
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (to_tsvector('simple', {column}))"
+            ))
+
+
+def uninstall(connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for name in SQLITE_TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+    elif dialect == 'postgresql':
+        for name in POSTGRES_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def rebuild(connection):
+    """Refill the SQLite index from the source tables; a no-op elsewhere."""
+    if connection.dialect.name == 'sqlite':
+        for statement in SQLITE_REBUILD:
+            connection.execute(text(statement))
+
+
+def init_app(app):
+    metadata = db.metadata
+    if not event.contains(metadata, 'after_create', _after_create):
+        event.listen(metadata, 'after_create', _after_create)
+        event.listen(metadata, 'before_drop', _before_drop)
+
+
+def _after_create(target, connection, **kwargs):
+    install(connection)
+
+
+def _before_drop(target, connection, **kwargs):
+    uninstall(connection)
+
+
+def query_tokens(q):
+    return _WORD.findall((q or '').lower())[:MAX_TOKENS]
+
+
+def search(restaurant_id, q, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Top `limit` matches for every word of `q`, the last one as a prefix.
+    Returns dicts with type, id, name, snippet (SQLite only) and score.
+    """
+    tokens = query_tokens(q)
+    if not tokens:
+        return []
+    kinds = list(kinds or KINDS)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _search_postgres(restaurant_id, tokens, kinds, limit)
+    return _search_sqlite(restaurant_id, tokens, kinds, limit)
+
+
+def _search_sqlite(restaurant_id, tokens, kinds, limit):
+    words = [f'"{token}"' for token in tokens]
+    words[-1] += '*'
+    match = f'restaurant : r{int(restaurant_id)} AND {{title body}} : ({" AND ".join(words)})'
+    statement = text(
+        f"SELECT kind, ref_id, title, snippet({SEARCH_TABLE}, 4, '[', ']', '...', 10) AS snippet, "
+        f"bm25({SEARCH_TABLE}, 0, 0, 0, 10.0, 1.0) AS rank "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match AND kind IN :kinds "
+        "ORDER BY rank LIMIT :limit"
+    ).bindparams(bindparam('kinds', expanding=True))
+    rows = db.session.execute(statement, {'match': match, 'kinds': kinds, 'limit': limit})
+    return [
+        {'type': kind, 'id': ref_id, 'name': title, 'snippet': snippet if '[' in (snippet or '') else None,
+         'score': round(-rank, 4)}
+        for kind, ref_id, title, snippet, rank in rows
+    ]
+
+
+_POSTGRES_SEARCH = """
+WITH q AS (SELECT to_tsquery('simple', :query) AS query),
+hits AS (
+    SELECT 'ingredient' AS kind, i.id, i.name AS title,
+           10 * ts_rank(to_tsvector('simple', i.name), q.query) AS score
+    FROM q, ingredient i
+    WHERE i.restaurant_id = :restaurant_id AND to_tsvector('simple', i.name) @@ q.query
+    UNION ALL
+    SELECT 'ingredient', i.id, i.name, ts_rank(to_tsvector('simple', c.name), q.query)
+    FROM q, category c
+    JOIN ingredient_category ic ON ic.category_id = c.id
+    JOIN ingredient i ON i.id = ic.ingredient_id
+    WHERE c.restaurant_id = :restaurant_id AND to_tsvector('simple', c.name) @@ q.query
+    UNION ALL
+    SELECT 'recipe', r.id, r.name, 10 * ts_rank(to_tsvector('simple', r.name), q.query)
+    FROM q, recipe r
+    WHERE r.restaurant_id = :restaurant_id AND to_tsvector('simple', r.name) @@ q.query
+    UNION ALL
+    SELECT 'recipe', r.id, r.name, max(ts_rank(to_tsvector('simple', s.instruction), q.query))
+    FROM q, recipe_step s
+    JOIN recipe r ON r.id = s.recipe_id
+    WHERE r.restaurant_id = :restaurant_id AND to_tsvector('simple', s.instruction) @@ q.query
+    GROUP BY r.id, r.name
+    UNION ALL
+    SELECT 'stock', s.id, s.name, 10 * ts_rank(to_tsvector('simple', s.name), q.query)
+    FROM q, stock s
+    WHERE s.restaurant_id = :restaurant_id AND to_tsvector('simple', s.name) @@ q.query
+)
+SELECT kind, id, title, sum(score) AS score
+FROM hits
+WHERE kind IN :kinds
+GROUP BY kind, id, title
+ORDER BY score DESC
+LIMIT :limit
+"""
+
+
+def _search_postgres(restaurant_id, tokens, kinds, limit):
+    # Tokens are \w+ only, so they are safe inside a tsquery
+    query = ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+    statement = text(_POSTGRES_SEARCH).bindparams(bindparam('kinds', expanding=True))
+    rows = db.session.execute(
+        statement, {'query': query, 'restaurant_id': restaurant_id, 'kinds': kinds, 'limit': limit}
+    )
+    return [
+        {'type': kind, 'id': id, 'name': title, 'snippet': None, 'score': round(float(score), 4)}
+        for kind, id, title, score in rows
+    ]
@@ -0,0 +1,186 @@
+# app/slow_queries.py
+
+"""
+Slow-query log with query-plan capture.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are recorded with their SQL,
+bound parameters, the route (or background thread) that ran them and the
+query plan: `EXPLAIN QUERY PLAN` on SQLite, `EXPLAIN` on Postgres with
+`EXPLAIN ANALYZE` for a sampled fraction of plain SELECTs. Plans are taken on
+a connection of their own inside a transaction that is always rolled back,
+so a failing plan never touches the caller's transaction. Entries are written as
+JSON lines to a rotating file and the most recent ones are kept in memory
+for GET /admin/slow_queries.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import request, has_request_context
+from sqlalchemy import event, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+MAX_PARAMETER_CHARS = 1000
+EXPLAINABLE = ('SELECT', 'WITH')
+
+logger = logging.getLogger('teamcook.slow_queries')
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.threshold = None
+        self.explain = True
+        self.analyze_sample_rate = 0.0
+        self._recent = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 200)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+        app.config.setdefault('SLOW_QUERY_ANALYZE_SAMPLE_RATE', 0.1)
+        app.config.setdefault('SLOW_QUERY_LOG_FILE', None)
+        app.config.setdefault('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('SLOW_QUERY_LOG_BACKUPS', 5)
+        app.config.setdefault('SLOW_QUERY_RECENT', 200)
+        app.extensions['slow_queries'] = self
+
+        threshold = app.config['SLOW_QUERY_THRESHOLD_MS']
+        if threshold is None or threshold < 0:
+            return
+        self.threshold = threshold / 1000.0
+        self.explain = app.config['SLOW_QUERY_EXPLAIN']
+        self.analyze_sample_rate = app.config['SLOW_QUERY_ANALYZE_SAMPLE_RATE']
+        self._recent = deque(self._recent, maxlen=app.config['SLOW_QUERY_RECENT'])
+
+        path = app.config['SLOW_QUERY_LOG_FILE'] or os.path.join(app.instance_path, 'slow_queries.log')
+        if not logger.handlers:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+
+    def recent(self, limit=None):
+        """Most recent slow statements, newest first."""
+        with self._lock:
+            entries = list(self._recent)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slow_query_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if self.threshold is None or elapsed < self.threshold:
+            return
+        try:
+            self._record(conn, statement, parameters, executemany, elapsed)
+        except Exception:
+            # Never fail the query because logging it failed
+            logger.debug('Could not record slow query', exc_info=True)
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is None or exception_context.execution_context is None:
+            return
+        started = connection.info.get('slow_query_started')
+        if started:
+            started.pop()
+
+    def _record(self, conn, statement, parameters, executemany, elapsed):
+        entry = {
+            'time': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+            'duration_ms': round(elapsed * 1000, 2),
+            'route': _origin(),
+            'sql': statement,
+            'parameters': _truncate(repr(parameters)),
+            'executemany': executemany,
+            'plan': None,
+        }
+        if self.explain and not executemany and statement.lstrip()[:6].upper().startswith(EXPLAINABLE):
+            try:
+                entry['plan'], entry['plan_type'] = _explain(conn, statement, parameters, self.analyze_sample_rate)
+            except Exception as e:
+                entry['plan_error'] = str(e)
+
+        with self._lock:
+            self._recent.append(entry)
+        if logger.handlers:
+            logger.info(json.dumps(entry, default=str))
+
+
+def _origin():
+    if has_request_context():
+        return f'{request.method} {request.endpoint or request.path}'
+    return f'thread:{threading.current_thread().name}'
+
+
+def _truncate(text):
+    return text if len(text) <= MAX_PARAMETER_CHARS else text[:MAX_PARAMETER_CHARS] + '...'
+
+
+_explain_engines = {}
+_explain_engines_lock = threading.Lock()
+
+
+def _explain_engine(engine):
+    """Unpooled engine on the same database, so a plan never waits for the app's pool."""
+    with _explain_engines_lock:
+        explain_engine = _explain_engines.get(engine.url)
+        if explain_engine is None:
+            explain_engine = _explain_engines[engine.url] = create_engine(engine.url, poolclass=NullPool)
+        return explain_engine
+
+
+def _explain(conn, statement, parameters, analyze_sample_rate):
+    """Run the plan query on a separate DBAPI connection, bypassing SQLAlchemy events."""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix, plan_type = 'EXPLAIN QUERY PLAN ', 'query plan'
+    elif dialect == 'postgresql':
+        # ANALYZE executes the statement again, hence sampled and only for
+        # plain SELECTs; a WITH may hide an INSERT, UPDATE or DELETE
+        if statement.lstrip()[:6].upper() == 'SELECT' and random.random() < analyze_sample_rate:
+            prefix, plan_type = 'EXPLAIN (ANALYZE, BUFFERS) ', 'analyze'
+        else:
+            prefix, plan_type = 'EXPLAIN ', 'estimate'
+    else:
+        return None, None
+
+    with _explain_engine(conn.engine).connect() as plan_conn:
+        transaction = plan_conn.begin()
+        cursor = plan_conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            transaction.rollback()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows], plan_type
+    return [row[0] for row in rows], plan_type
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,245 @@
+# app/stock_import.py
+
+"""
+Bulk import of stock deliveries from CSV or NDJSON.
+
+Rows are read as a stream and handled in chunks: every chunk is validated
+column by column against a lookup map of the restaurant's ingredients that is
+built once up front, and its valid rows go to the database as one batched
+INSERT. Invalid rows are reported with their line number and skipped; they
+never abort the rest of the import.
+
+Columns: name, ingredient (name) or ingredient_id, amount, unit, cost,
+expiry_date and optionally purchase_date (ISO 8601; defaults to now).
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import db, audit, dashboard
+from app.models import Stock, Ingredient
+from app.units import ingredient_units, UnitConversionError
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+        self.ingredient_ids = set()
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['line'])
+        }
+
+
+def detect_format(content_type=None, filename=None):
+    """Guess the format from a Content-Type or file name; None if unknown."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines'):
+        return 'ndjson'
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            return 'csv'
+        if extension in ('ndjson', 'jsonl'):
+            return 'ndjson'
+    return None
+
+
+def read_rows(stream, fmt):
+    """Yield (line, dict) from a binary or text stream."""
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as e:
+                yield line, f'Invalid JSON: {e}'
+                continue
+            yield line, row if isinstance(row, dict) else 'Expected a JSON object'
+
+
+def import_stock(stream, fmt, restaurant_id, chunk_size=CHUNK_SIZE):
+    """Import every row of `stream` into the restaurant's stock in one transaction."""
+    ingredients = Ingredient.query.filter_by(restaurant_id=restaurant_id).all()
+    by_name = {ingredient.name.strip().lower(): ingredient for ingredient in ingredients}
+    by_id = {ingredient.id: ingredient for ingredient in ingredients}
+    # (ingredient id, unit) pairs already checked for convertibility
+    checked_units = {}
+
+    result = ImportResult()
+    chunk = []
+    try:
+        for line, row in read_rows(stream, fmt):
+            result.rows += 1
+            if isinstance(row, str):
+                result.error(line, row)
+                continue
+            chunk.append((line, row))
+            if len(chunk) >= chunk_size:
+                _insert_chunk(chunk, restaurant_id, by_name, by_id, checked_units, result)
+                chunk = []
+        if chunk:
+            _insert_chunk(chunk, restaurant_id, by_name, by_id, checked_units, result)
+        audit.record(restaurant_id, 'stock.imported', quantity=result.inserted,
+                     details={'format': fmt, 'rows': result.rows, 'rejected': result.error_count})
+        dashboard.touch(restaurant_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Core inserts bypass the ORM events the inventory engine listens to
+    engine = current_app.extensions.get('inventory_engine')
+    if engine is not None and result.ingredient_ids:
+        engine.invalidate(result.ingredient_ids)
+    return result
+
+
+def _insert_chunk(chunk, restaurant_id, by_name, by_id, checked_units, result):
+    lines = [line for line, _ in chunk]
+    rows = [row for _, row in chunk]
+    now = datetime.utcnow()
+
+    # Validate column by column; each pass records the first error per row
+    errors = [None] * len(rows)
+    names = _column(rows, 'name', errors, _required_text)
+    ingredients = [_resolve_ingredient(row, by_name, by_id) for row in rows]
+    amounts = _column(rows, 'amount', errors, _positive_number)
+    units = _column(rows, 'unit', errors, _required_text)
+    costs = _column(rows, 'cost', errors, _non_negative_number)
+    expiry_dates = _column(rows, 'expiry_date', errors, _required_date)
+    purchase_dates = _column(rows, 'purchase_date', errors, lambda value: _optional_date(value, now))
+
+    values = []
+    for i, ingredient in enumerate(ingredients):
+        if errors[i] is None and isinstance(ingredient, str):
+            errors[i] = ingredient
+        if errors[i] is None:
+            key = (ingredient.id, units[i])
+            if key not in checked_units:
+                try:
+                    ingredient_units(ingredient).factor(units[i])
+                    checked_units[key] = None
+                except UnitConversionError as e:
+                    checked_units[key] = str(e)
+            errors[i] = checked_units[key]
+        if errors[i] is not None:
+            result.error(lines[i], errors[i])
+            continue
+        values.append({
+            'restaurant_id': restaurant_id,
+            'ingredient_id': ingredient.id,
+            'name': names[i],
+            'amount': amounts[i],
+            'unit': units[i],
+            'purchase_date': purchase_dates[i],
+            'expiry_date': expiry_dates[i],
+            'cost': costs[i],
+            'version': 1
+        })
+        result.ingredient_ids.add(ingredient.id)
+
+    if values:
+        # One cached INSERT executed for the whole chunk; SQLAlchemy batches it
+        # into multi-row VALUES without recompiling the statement per chunk
+        db.session.execute(insert(Stock.__table__), values)
+        result.inserted += len(values)
+
+
+def _column(rows, field, errors, parse):
+    parsed = []
+    for i, row in enumerate(rows):
+        try:
+            parsed.append(parse(row.get(field)))
+        except ValueError as e:
+            parsed.append(None)
+            if errors[i] is None:
+                errors[i] = f'{field}: {e}'
+    return parsed
+
+
+def _resolve_ingredient(row, by_name, by_id):
+    ingredient_id = row.get('ingredient_id')
+    if ingredient_id not in (None, ''):
+        try:
+            ingredient = by_id.get(int(ingredient_id))
+        except (TypeError, ValueError):
+            return 'ingredient_id: not an integer'
+        return ingredient or f'Ingredient ID {ingredient_id} not found'
+    name = row.get('ingredient')
+    if not name:
+        return 'ingredient: required'
+    return by_name.get(str(name).strip().lower()) or f'Ingredient {name!r} not found'
+
+
+def _required_text(value):
+    if value is None or str(value).strip() == '':
+        raise ValueError('required')
+    return str(value).strip()
+
+
+def _number(value):
+    if value is None or value == '':
+        raise ValueError('required')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'not a number: {value!r}')
+
+
+def _positive_number(value):
+    number = _number(value)
+    if not number > 0:
+        raise ValueError('must be positive')
+    return number
+
+
+def _non_negative_number(value):
+    number = _number(value)
+    if not number >= 0:
+        raise ValueError('must not be negative')
+    return number
+
+
+def _required_date(value):
+    if value is None or value == '':
+        raise ValueError('required')
+    return datetime.fromisoformat(str(value))
+
+
+def _optional_date(value, default):
+    if value is None or value == '':
+        return default
+    return datetime.fromisoformat(str(value))
@@ -1,28 +1,60 @@
 # app/tasks.py
 
+import logging
+
 from app.models import Stock, Waste
 from datetime import datetime
-from app import db
+from app import db, scheduler, audit, archive, budget
+from app.recipe_queue import recipe_queue
+from app.utils import remaining_value, flush_inventory
+
+logger = logging.getLogger(__name__)
 
 def process_expired_items():
+    # Book what is really left of each lot, not amounts the engine has yet to deduct
+    flush_inventory()
     current_time = datetime.utcnow()
     expired_stocks = Stock.query.filter(Stock.expiry_date <= current_time).all()
 
     if not expired_stocks:
-        print('No expired items found.')
+        logger.info('No expired items found.')
         return
 
     for stock in expired_stocks:
         waste_record = Waste(
+            restaurant_id=stock.restaurant_id,
             stock_id=stock.id,
             waste_amount=stock.amount,
             unit=stock.unit,
             waste_date=current_time,
             reason='Expired',
-            notes=f"Expired on {stock.expiry_date.isoformat()}"
+            notes=f"Expired on {stock.expiry_date.isoformat()}",
+            cost=remaining_value(stock)
         )
         db.session.add(waste_record)
         db.session.delete(stock)  # Remove expired stock
 
     db.session.commit()
-    print(f'Removed {len(expired_stocks)} expired items and recorded waste.')
\ No newline at end of file
+    logger.info('Removed %s expired items and recorded waste.', len(expired_stocks))
+
+def compact_audit_log():
+    """Scheduled: fold audit entries past their retention into monthly totals."""
+    with scheduler.app.app_context():
+        config = scheduler.app.config
+        audit.compact(config['AUDIT_RETENTION_MONTHS'], config['AUDIT_COMPACT_BATCH_SIZE'])
+
+def archive_history():
+    """Scheduled: move old sales, waste and events to the archive tables."""
+    with scheduler.app.app_context():
+        config = scheduler.app.config
+        archive.run(config['ARCHIVE_AFTER_DAYS'], config['ARCHIVE_BATCH_SIZE'])
+
+def roll_up_budget():
+    """Scheduled: add new stock and sales to the budget rollups."""
+    with scheduler.app.app_context():
+        budget.roll_up(scheduler.app.config['BUDGET_ROLLUP_BATCH_SIZE'])
+
+def resume_recipe_queue():
+    """Scheduled: requeue jobs of dead workers and drain jobs left queued."""
+    with scheduler.app.app_context():
+        recipe_queue.resume()
@@ -0,0 +1,88 @@
+# app/tenancy.py
+
+from flask import g, request, jsonify, current_app, abort, make_response
+
+from app import db
+from app.cache import Cache
+from app.models import Restaurant
+
+RESTAURANT_HEADER = 'X-Restaurant-Id'
+
+# Restaurants seen to exist; a deleted one is served until its entry expires
+known_restaurants = Cache('restaurants', max_entries=4096, ttl=60)
+
+
+def init_app(app):
+    """Resolve the caller's restaurant before every request."""
+    app.config.setdefault('DEFAULT_RESTAURANT_ID', None)
+    app.before_request(resolve_restaurant)
+
+
+def unscoped(target):
+    """Mark a blueprint or view that does not belong to one restaurant."""
+    target.unscoped = True
+    return target
+
+
+def resolve_restaurant():
+    """
+    Read the caller's restaurant from the X-Restaurant-Id header, falling back
+    to a ?restaurant_id= query argument and then DEFAULT_RESTAURANT_ID when
+    that is configured. Unknown restaurants are rejected, and so are requests
+    to scoped views that name none.
+    """
+    value = request.headers.get(RESTAURANT_HEADER) or request.args.get('restaurant_id')
+    if value is None:
+        g.restaurant_id = current_app.config['DEFAULT_RESTAURANT_ID']
+        if g.restaurant_id is None and _needs_restaurant():
+            return _missing_restaurant()
+        return None
+    try:
+        restaurant_id = int(value)
+    except (TypeError, ValueError):
+        return jsonify({'message': f'Invalid {RESTAURANT_HEADER}'}), 400
+    if not restaurant_exists(restaurant_id):
+        return jsonify({'message': f'Restaurant {restaurant_id} not found'}), 400
+    g.restaurant_id = restaurant_id
+    return None
+
+
+def _needs_restaurant():
+    # CORS preflights and unmatched URLs carry no tenant
+    if request.method == 'OPTIONS' or request.endpoint in (None, 'static'):
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    if getattr(view, 'unscoped', False):
+        return False
+    blueprint = current_app.blueprints.get(request.blueprint)
+    return not getattr(blueprint, 'unscoped', False)
+
+
+def _missing_restaurant():
+    return make_response(jsonify({'message': f'Send the {RESTAURANT_HEADER} header to pick a restaurant'}), 400)
+
+
+def restaurant_exists(restaurant_id):
+    if known_restaurants.get(restaurant_id):
+        return True
+    if db.session.get(Restaurant, restaurant_id) is None:
+        return False
+    known_restaurants.set(restaurant_id, True)
+    return True
+
+
+def current_restaurant_id():
+    """The request's restaurant; answers 400 if the caller did not name one."""
+    restaurant_id = g.get('restaurant_id')
+    if restaurant_id is None:
+        abort(_missing_restaurant())
+    return restaurant_id
+
+
+def scoped(model):
+    """Query for `model` limited to the caller's restaurant."""
+    return model.query.filter(model.restaurant_id == current_restaurant_id())
+
+
+def get_scoped_or_404(model, id):
+    return scoped(model).filter(model.id == id).first_or_404()
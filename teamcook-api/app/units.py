@@ -0,0 +1,190 @@
+# app/units.py
+
+"""
+Unit-of-measure registry.
+
+Unit strings are resolved once to small integer ids; every id carries a
+dimension (mass, volume, count) and a factor into that dimension's base unit
+(g, ml, pc). Cross-dimension conversions go through an ingredient's density
+(g per ml) and piece weight (g per piece).
+"""
+
+import threading
+
+MASS = 0
+VOLUME = 1
+COUNT = 2
+
+BASE_UNITS = {MASS: 'g', VOLUME: 'ml', COUNT: 'pc'}
+
+# (canonical name, dimension, factor to base unit, aliases)
+UNIT_DEFINITIONS = [
+    ('mg', MASS, 0.001, ['milligram', 'milligrams']),
+    ('g', MASS, 1.0, ['gram', 'grams', 'gr']),
+    ('kg', MASS, 1000.0, ['kilogram', 'kilograms', 'kgs']),
+    ('oz', MASS, 28.349523125, ['ounce', 'ounces']),
+    ('lb', MASS, 453.59237, ['lbs', 'pound', 'pounds']),
+    ('ml', VOLUME, 1.0, ['milliliter', 'milliliters', 'millilitre', 'millilitres']),
+    ('cl', VOLUME, 10.0, ['centiliter', 'centiliters']),
+    ('dl', VOLUME, 100.0, ['deciliter', 'deciliters']),
+    ('l', VOLUME, 1000.0, ['liter', 'liters', 'litre', 'litres', 'ltr']),
+    ('tsp', VOLUME, 4.92892159375, ['teaspoon', 'teaspoons']),
+    ('tbsp', VOLUME, 14.78676478125, ['tablespoon', 'tablespoons']),
+    ('cup', VOLUME, 236.5882365, ['cups']),
+    ('fl oz', VOLUME, 29.5735295625, ['floz', 'fluid ounce', 'fluid ounces']),
+    ('gal', VOLUME, 3785.411784, ['gallon', 'gallons']),
+    ('pc', COUNT, 1.0, ['pcs', 'piece', 'pieces', 'unit', 'units', 'ea', 'each', 'x']),
+    ('dozen', COUNT, 12.0, ['dz']),
+]
+
+
+class UnitConversionError(ValueError):
+    """Raised when two units cannot be converted into each other."""
+
+
+class UnknownUnitError(UnitConversionError):
+    """Raised for a unit string the registry does not know."""
+
+
+def normalize(unit):
+    """Lower-case, dot-free, single-spaced spelling used for lookups."""
+    return ' '.join(str(unit or '').lower().replace('.', '').split())
+
+
+class UnitRegistry:
+    """Compiled lookup tables for unit conversion.
+
+    ``factors`` and ``dimensions`` are plain lists indexed by unit id, so the
+    hot path is a dict hit for the unit string followed by list indexing.
+    Units are only added through ``register``; looking up an unknown unit
+    raises UnknownUnitError, so user input cannot grow the tables.
+    """
+
+    def __init__(self, definitions):
+        self._lock = threading.Lock()
+        self.ids = {}
+        self.names = []
+        self.factors = []
+        self.dimensions = []
+        for name, dimension, factor, aliases in definitions:
+            self.register(name, dimension, factor, aliases)
+
+    def register(self, name, dimension, factor, aliases=()):
+        """Add a unit and its aliases; returns its id."""
+        with self._lock:
+            unit_id = self.ids.get(normalize(name))
+            if unit_id is None:
+                unit_id = len(self.names)
+                self.names.append(name)
+                self.factors.append(factor)
+                self.dimensions.append(dimension)
+            for spelling in (name, *aliases):
+                self.ids[normalize(spelling)] = unit_id
+            return unit_id
+
+    def unit_id(self, unit):
+        """Return the integer id for a unit string; raises UnknownUnitError."""
+        try:
+            return self.ids[unit]
+        except (KeyError, TypeError):
+            pass
+        unit_id = self.ids.get(normalize(unit))
+        if unit_id is None:
+            raise UnknownUnitError(f"Unknown unit '{unit}'")
+        return unit_id
+
+    def is_known(self, unit):
+        try:
+            self.unit_id(unit)
+        except UnknownUnitError:
+            return False
+        return True
+
+    def dimension(self, unit):
+        return self.dimensions[self.unit_id(unit)]
+
+    def factor(self, from_id, to_id, density=None, piece_weight=None):
+        """Multiplier turning an amount in ``from_id`` into ``to_id``."""
+        if from_id == to_id:
+            return 1.0
+        from_dim = self.dimensions[from_id]
+        to_dim = self.dimensions[to_id]
+        bridge = _bridge(from_dim, to_dim, density, piece_weight)
+        if bridge is None:
+            raise UnitConversionError(
+                f"Cannot convert '{self.names[from_id]}' to '{self.names[to_id]}'"
+            )
+        return self.factors[from_id] * bridge / self.factors[to_id]
+
+    def convert(self, amount, from_unit, to_unit, density=None, piece_weight=None):
+        return amount * self.factor(
+            self.unit_id(from_unit), self.unit_id(to_unit), density, piece_weight
+        )
+
+
+def _bridge(from_dim, to_dim, density, piece_weight):
+    """Base-unit multiplier between two dimensions, or None if impossible."""
+    if from_dim == to_dim:
+        return 1.0
+    # Express both sides in grams first
+    to_grams = {MASS: 1.0}
+    if density:
+        to_grams[VOLUME] = density
+    if piece_weight:
+        to_grams[COUNT] = piece_weight
+    if from_dim not in to_grams or to_dim not in to_grams:
+        return None
+    return to_grams[from_dim] / to_grams[to_dim]
+
+
+registry = UnitRegistry(UNIT_DEFINITIONS)
+
+
+class IngredientUnits:
+    """Per-ingredient conversion factors into the ingredient's own unit."""
+
+    __slots__ = ('unit', 'unit_id', 'density', 'piece_weight', '_factors')
+
+    def __init__(self, unit, density=None, piece_weight=None):
+        self.unit = unit
+        # Ingredients saved before units were validated may use a unit the
+        # registry does not know; amounts in that same unit still convert
+        self.unit_id = registry.unit_id(unit) if registry.is_known(unit) else None
+        self.density = density
+        self.piece_weight = piece_weight
+        self._factors = {self.unit_id: 1.0}
+
+    def factor(self, unit):
+        """Multiplier from ``unit`` into the ingredient unit."""
+        if self.unit_id is None:
+            if normalize(unit) == normalize(self.unit):
+                return 1.0
+            raise UnitConversionError(f"Cannot convert '{unit}' to '{self.unit}'")
+        unit_id = registry.unit_id(unit)
+        try:
+            return self._factors[unit_id]
+        except KeyError:
+            factor = registry.factor(unit_id, self.unit_id, self.density, self.piece_weight)
+            self._factors[unit_id] = factor
+            return factor
+
+    def to_ingredient_unit(self, amount, unit):
+        return amount * self.factor(unit)
+
+    def from_ingredient_unit(self, amount, unit):
+        return amount / self.factor(unit)
+
+
+_ingredient_cache = {}
+
+
+def ingredient_units(ingredient):
+    """Cached :class:`IngredientUnits` for an ``Ingredient`` row."""
+    cached = _ingredient_cache.get(ingredient.id)
+    if (cached is None
+            or cached.unit != ingredient.unit
+            or cached.density != ingredient.density
+            or cached.piece_weight != ingredient.piece_weight):
+        cached = IngredientUnits(ingredient.unit, ingredient.density, ingredient.piece_weight)
+        _ingredient_cache[ingredient.id] = cached
+    return cached
@@ -1,37 +1,181 @@
 # app/utils.py
 
-from app.models import Stock
-from datetime import datetime
+import logging
+from collections import namedtuple
+from app.models import Stock, Ingredient
+from app.units import ingredient_units, UnitConversionError
+from datetime import datetime, timezone
+from sqlalchemy.orm.exc import StaleDataError
+from flask import current_app
 from app import db
 
-def allocate_stock(ingredient_id, required_amount):
+ALLOCATION_RETRIES = 5
+
+logger = logging.getLogger(__name__)
+
+# One lot's share of an allocation; amount is in the lot's own unit and
+# unit_cost is the lot's purchase cost per unit
+Allocation = namedtuple('Allocation', ['stock_id', 'amount', 'unit_cost'])
+
+def parse_utc_time(value):
+    """ISO time as naive UTC, the way times are stored."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def lot_unit_cost(cost, initial_amount, amount):
+    """Purchase cost per lot unit; lots without an initial amount fall back to what remains."""
+    purchased = initial_amount or amount
+    return cost / purchased if purchased and purchased > 0 else 0
+
+def remaining_value(stock):
+    """Purchase cost of what is left of a lot, e.g. the value of expired stock written off as waste."""
+    return stock.amount * lot_unit_cost(stock.cost, stock.initial_amount, stock.amount)
+
+class LotQueue:
+    """
+    FIFO view over one ingredient's unexpired lots.
+    Amounts are tracked in the ingredient's unit; `take` deducts from the
+    underlying Stock rows and reports each deduction as an Allocation.
+    """
+
+    def __init__(self, ingredient, stocks):
+        self.ingredient = ingredient
+        self.units = ingredient_units(ingredient)
+        self.lots = []
+        self.available = 0.0
+        for stock in stocks:
+            try:
+                factor = self.units.factor(stock.unit)
+            except UnitConversionError as e:
+                # Lot recorded in a unit we cannot relate to the ingredient;
+                # left out, so allocations may report a shortage
+                logger.warning('Skipping stock lot %s of ingredient %s: %s', stock.id, ingredient.id, e)
+                continue
+            self.lots.append((stock, factor))
+            self.available += stock.amount * factor
+        self._head = 0
+
+    @classmethod
+    def load(cls, ingredient, session=None):
+        stocks = (
+            (session or db.session).query(Stock)
+            .filter_by(restaurant_id=ingredient.restaurant_id, ingredient_id=ingredient.id)
+            .filter(Stock.expiry_date > datetime.utcnow())
+            .order_by(Stock.purchase_date)
+            .all()
+        )
+        return cls(ingredient, stocks)
+
+    def add(self, stock):
+        """Append a lot created after loading, e.g. freshly produced stock."""
+        factor = self.units.factor(stock.unit)
+        self.lots.append((stock, factor))
+        self.available += stock.amount * factor
+
+    def to_base(self, amount, unit=None):
+        """Convert `amount` in `unit` into the ingredient's unit."""
+        return self.units.to_ingredient_unit(amount, unit or self.ingredient.unit)
+
+    def take(self, amount):
+        """
+        Deduct `amount` (ingredient unit) oldest lot first.
+        Returns a list of Allocation, or None without touching any lot if
+        there is not enough.
+        """
+        if amount > self.available + 1e-9:
+            return None
+        allocated = []
+        remaining = amount
+        while remaining > 1e-9 and self._head < len(self.lots):
+            stock, factor = self.lots[self._head]
+            available = stock.amount * factor
+            unit_cost = lot_unit_cost(stock.cost, stock.initial_amount, stock.amount)
+            if available > remaining:
+                deducted = remaining / factor
+                stock.amount -= deducted
+                allocated.append(Allocation(stock.id, deducted, unit_cost))
+                remaining = 0
+            else:
+                if stock.amount > 0:
+                    allocated.append(Allocation(stock.id, stock.amount, unit_cost))
+                stock.amount = 0
+                remaining -= available
+                self._head += 1
+        self.available = max(self.available - amount, 0.0)
+        return allocated
+
+def allocate_stock(ingredient_id, required_amount, unit=None):
     """
     Allocate stock using FIFO.
-    Returns a list of tuples containing (stock_entry, amount_deducted).
+    `required_amount` is expressed in `unit` (defaults to the ingredient's unit)
+    and is normalised against each lot's own unit before deducting.
+    Returns a list of Allocation tuples, amounts in each stock entry's unit.
     Returns None if insufficient stock.
+    Served from memory when INVENTORY_ENGINE_ENABLED; otherwise concurrent
+    calls for the same ingredient are merged into one FIFO pass and one
+    commit when ALLOCATION_COALESCING is enabled.
+    """
+    engine = current_app.extensions.get('inventory_engine')
+    if engine is not None:
+        return engine.allocate(ingredient_id, required_amount, unit)
+    coordinator = current_app.extensions.get('allocation_coordinator')
+    if coordinator is not None:
+        result = coordinator.allocate(ingredient_id, required_amount, unit)
+    else:
+        result = allocate_batch(ingredient_id, [(required_amount, unit)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def allocate_batch(ingredient_id, requests, session=None):
+    """
+    Serve several (required_amount, unit) requests for one ingredient in a
+    single FIFO pass and commit. Requests are served in order; each gets a
+    list of Allocation, None if it could not be fully served, or the
+    UnitConversionError raised for its unit.
+    Runs on `session`, the request's db.session by default.
+    """
+    session = session or db.session
+    for attempt in range(ALLOCATION_RETRIES):
+        ingredient = session.get(Ingredient, ingredient_id)
+        if ingredient is None:
+            return [None] * len(requests)
+
+        # Work in the ingredient's unit so lots bought in different units add up
+        lots = LotQueue.load(ingredient, session)
+        results = []
+        for required_amount, unit in requests:
+            try:
+                # None here means not enough stock available
+                results.append(lots.take(lots.to_base(required_amount, unit)))
+            except UnitConversionError as e:
+                results.append(e)
+
+        if not any(isinstance(result, list) for result in results):
+            return results
+
+        try:
+            session.commit()
+            return results
+        except StaleDataError:
+            # Another allocation changed one of these lots first; reload and retry
+            session.rollback()
+    raise StaleDataError(f'Could not allocate ingredient ID {ingredient_id} after {ALLOCATION_RETRIES} attempts')
+
+def available_stock(ingredient):
+    """Unexpired amount of `ingredient` on hand, in the ingredient's unit."""
+    engine = current_app.extensions.get('inventory_engine')
+    if engine is not None:
+        return engine.available(ingredient.id) or 0.0
+    return LotQueue.load(ingredient).available
+
+def flush_inventory():
+    """
+    Write the inventory engine's committed deductions to the stock table,
+    so lot amounts read or set next are current. No-op without the engine.
     """
-    allocated = []
-    remaining = required_amount
-
-    # Fetch stock entries ordered by purchase_date (FIFO) and not expired
-    stock_entries = Stock.query.filter_by(ingredient_id=ingredient_id).filter(Stock.expiry_date > datetime.utcnow()).order_by(Stock.purchase_date).all()
-
-    for stock in stock_entries:
-        if remaining <= 0:
-            break
-        available = stock.amount
-        if available >= remaining:
-            stock.amount -= remaining
-            allocated.append((stock, remaining))
-            remaining = 0
-        else:
-            stock.amount = 0
-            allocated.append((stock, available))
-            remaining -= available
-
-    if remaining > 0:
-        # Not enough stock available
-        return None
-
-    db.session.commit()
-    return allocated
\ No newline at end of file
+    engine = current_app.extensions.get('inventory_engine')
+    if engine is not None:
+        engine.flush()
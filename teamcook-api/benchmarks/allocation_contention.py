@@ -0,0 +1,108 @@
+# benchmarks/allocation_contention.py
+"""
+Allocation latency under contention: plain, coalesced, and served by the
+in-memory inventory engine.
+
+Fires bursts of concurrent allocate_stock calls at the same ingredient (ten
+cooks firing the same dish) and reports p50/p99 latency per call for each
+mode.
+
+    python benchmarks/allocation_contention.py [--threads 10] [--bursts 50]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app, db
+from app.models import Restaurant, Ingredient, Stock
+from app.utils import allocate_stock
+
+
+MODES = {
+    'plain': {},
+    'coalescing': {'ALLOCATION_COALESCING': True},
+    'engine': {'INVENTORY_ENGINE_ENABLED': True},
+}
+
+
+def run(mode, directory, threads, bursts):
+    profile = type('BenchConfig', (config.Config,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/{mode}.db',
+        'INVENTORY_JOURNAL_PATH': f'{directory}/{mode}.journal',
+        'SCHEDULER_ENABLED': False,
+        **MODES[mode],
+    })
+    app = create_app(profile)
+    with app.app_context():
+        db.session.add(Restaurant(id=1, name='Bench'))
+        ingredient = Ingredient(restaurant_id=1, name='Mozzarella', unit='kg', type='Raw')
+        db.session.add(ingredient)
+        db.session.flush()
+        now = datetime.utcnow()
+        for i in range(200):
+            db.session.add(Stock(restaurant_id=1, ingredient_id=ingredient.id, name=f'Lot {i}', amount=5.0,
+                                 unit='kg', purchase_date=now - timedelta(days=200 - i),
+                                 expiry_date=now + timedelta(days=30), cost=40.0))
+        db.session.commit()
+        ingredient_id = ingredient.id
+
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+
+    def cook(barrier):
+        with app.app_context():
+            for _ in range(bursts):
+                barrier.wait()
+                start = time.perf_counter()
+                try:
+                    allocated = allocate_stock(ingredient_id, 200, 'g')
+                except Exception:
+                    allocated = None
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if not allocated:
+                        failures[0] += 1
+                db.session.remove()
+
+    barrier = threading.Barrier(threads)
+    pool = [threading.Thread(target=cook, args=(barrier,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+    return len(latencies) / elapsed, p50, p99, failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=10)
+    parser.add_argument('--bursts', type=int, default=50)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+
+    print(f'{"mode":<12}{"alloc/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"failed":>8}')
+    for mode in MODES:
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            rate, p50, p99, failed = pool.apply(run, (mode, directory, args.threads, args.bursts))
+        print(f'{mode:<12}{rate:>10.1f}{p50:>10.1f}{p99:>10.1f}{failed:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+# benchmarks/endpoint_benchmark.py
+"""
+Endpoint latency at several data scales, with regression tracking.
+
+Seeds a fresh SQLite database per scale with populate_db.py, then calls every
+endpoint registered in app/routes/ through the Flask test client and reports
+median and p95 latency. Endpoints without a case below are listed so new
+routes do not silently escape the suite.
+
+    python benchmarks/endpoint_benchmark.py --scales small medium --save baseline.json
+    python benchmarks/endpoint_benchmark.py --compare baseline.json --tolerance 0.25
+
+With --compare the exit status is 1 when any endpoint's median got slower
+than the baseline by more than the tolerance.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import populate_db
+from app import create_app, db, dashboard, budget
+from app.models import Ingredient, Stock, Recipe, Event, User, RecipeJob
+
+RESTAURANT_ID = 1
+IMPORT_ROWS = 100
+
+
+def _future(days):
+    return (datetime.utcnow() + timedelta(days=days)).isoformat()
+
+
+def _import_body(ctx):
+    rows = ['name,ingredient_id,amount,unit,cost,expiry_date']
+    rows += [f'Bench lot {i},{ctx["ingredient_id"]},2,{ctx["ingredient_unit"]},5,{_future(30)}'
+             for i in range(IMPORT_ROWS)]
+    return '\n'.join(rows) + '\n'
+
+
+def _create(client, path, payload):
+    response = client.post(path, json=payload)
+    return response.get_json()['id']
+
+
+def _new_ingredient(client, ctx):
+    ctx['counter'] += 1
+    return _create(client, '/ingredients/', {'name': f'Bench ingredient {ctx["counter"]}', 'unit': 'kg', 'type': 'Raw'})
+
+
+def _new_stock(client, ctx):
+    return _create(client, '/stocks/', {'name': 'Bench lot', 'ingredient_id': ctx['ingredient_id'], 'amount': 1,
+                                        'unit': ctx['ingredient_unit'], 'cost': 1, 'expiry_date': _future(30)})
+
+
+def _new_recipe(client, ctx):
+    ctx['counter'] += 1
+    return _create(client, '/recipes/', _recipe_payload(ctx, f'Bench recipe {ctx["counter"]}'))
+
+
+def _new_restaurant(client, ctx):
+    ctx['counter'] += 1
+    return _create(client, '/restaurants/', {'name': f'Bench restaurant {ctx["counter"]}'})
+
+
+def _new_event(client, ctx):
+    return _create(client, '/events/', {'name': 'Bench event', 'time': _future(3)})
+
+
+def _new_user(client, ctx):
+    ctx['counter'] += 1
+    response = client.post('/users/', json={'login_id': f'bench{ctx["counter"]}', 'password': 'x',
+                                            'name': 'Bench', 'role': 'Cook'})
+    return response.get_json().get('id')
+
+
+def _cold_dashboard(client, ctx):
+    # Time the aggregate queries, not the cache
+    dashboard.summary_cache.clear()
+    return 30
+
+
+def _recipe_payload(ctx, name, type_='Full Recipe'):
+    return {
+        'name': name,
+        'type': type_,
+        'ingredients': [{'id': ctx['ingredient_id'], 'required_amount': 0.1, 'unit': ctx['ingredient_unit']}],
+        'steps': [{'step_number': 1, 'instruction': 'Mix'}, {'step_number': 2, 'instruction': 'Serve'}],
+    }
+
+
+def _counted(prefix):
+    def build(ctx):
+        ctx['counter'] += 1
+        return f'{prefix} {ctx["counter"]}'
+    return build
+
+
+# endpoint -> (method, path(ctx, setup_id), body(ctx) or None, setup(client, ctx) or None)
+CASES = {
+    'user_bp.get_users': ('GET', lambda c, _: '/users/', None, None),
+    'user_bp.get_user': ('GET', lambda c, _: f'/users/{c["user_id"]}', None, None),
+    'user_bp.create_user': ('POST', lambda c, _: '/users/', lambda c: {
+        'login_id': _counted('bench')(c).replace(' ', ''), 'password': 'x', 'name': 'Bench', 'role': 'Cook'}, None),
+    'user_bp.update_user': ('PUT', lambda c, _: f'/users/{c["user_id"]}', lambda c: {'name': 'Manager'}, None),
+    'user_bp.delete_user': ('DELETE', lambda c, i: f'/users/{i}', None, _new_user),
+    'ingredient_bp.get_ingredients': ('GET', lambda c, _: '/ingredients/', None, None),
+    'ingredient_bp.get_ingredient': ('GET', lambda c, _: f'/ingredients/{c["ingredient_id"]}', None, None),
+    'ingredient_bp.get_ingredient_available': (
+        'GET', lambda c, _: f'/ingredients/{c["ingredient_id"]}/available', None, None),
+    'ingredient_bp.get_ingredient_where_used': (
+        'GET', lambda c, _: f'/ingredients/{c["ingredient_id"]}/where-used', None, None),
+    'ingredient_bp.create_ingredient': ('POST', lambda c, _: '/ingredients/', lambda c: {
+        'name': _counted('Bench ingredient')(c), 'unit': 'kg', 'type': 'Raw'}, None),
+    'ingredient_bp.update_ingredient': (
+        'PUT', lambda c, _: f'/ingredients/{c["ingredient_id"]}', lambda c: {'categories': ['Bench']}, None),
+    'ingredient_bp.delete_ingredient': ('DELETE', lambda c, i: f'/ingredients/{i}', None, _new_ingredient),
+    'stock_bp.get_stocks': ('GET', lambda c, _: '/stocks/', None, None),
+    'stock_bp.get_stock': ('GET', lambda c, _: f'/stocks/{c["stock_id"]}', None, None),
+    'stock_bp.create_stock': ('POST', lambda c, _: '/stocks/', lambda c: {
+        'name': 'Bench lot', 'ingredient_id': c['ingredient_id'], 'amount': 1, 'unit': c['ingredient_unit'],
+        'cost': 1, 'expiry_date': _future(30)}, None),
+    'stock_bp.import_stocks': ('POST', lambda c, _: '/stocks/import?format=csv', _import_body, None),
+    'stock_bp.update_stock': ('PUT', lambda c, _: f'/stocks/{c["stock_id"]}', lambda c: {'cost': 2.5}, None),
+    'stock_bp.delete_stock': ('DELETE', lambda c, i: f'/stocks/{i}', None, _new_stock),
+    'stock_bp.get_grouped_stocks': ('GET', lambda c, _: '/stocks/grouped', None, None),
+    'stock_bp.get_stock_log': ('GET', lambda c, _: f'/stocks/log/{c["ingredient_name"]}', None, None),
+    'recipe_bp.get_recipes': ('GET', lambda c, _: '/recipes/', None, None),
+    'recipe_bp.get_recipe': ('GET', lambda c, _: f'/recipes/{c["recipe_id"]}', None, None),
+    'recipe_bp.create_recipe': (
+        'POST', lambda c, _: '/recipes/', lambda c: _recipe_payload(c, _counted('Bench recipe')(c)), None),
+    'recipe_bp.update_recipe': (
+        'PUT', lambda c, _: f'/recipes/{c["recipe_id"]}', lambda c: _recipe_payload(c, c['recipe_name']), None),
+    'recipe_bp.delete_recipe': ('DELETE', lambda c, i: f'/recipes/{i}', None, _new_recipe),
+    'restaurant_bp.get_restaurants': ('GET', lambda c, _: '/restaurants/', None, None),
+    'restaurant_bp.get_restaurant': ('GET', lambda c, _: f'/restaurants/{RESTAURANT_ID}', None, None),
+    'restaurant_bp.create_restaurant': (
+        'POST', lambda c, _: '/restaurants/', lambda c: {'name': _counted('Bench restaurant')(c)}, None),
+    'restaurant_bp.update_restaurant': (
+        'PUT', lambda c, _: f'/restaurants/{RESTAURANT_ID}', lambda c: {'phone': '555-0000'}, None),
+    'restaurant_bp.delete_restaurant': ('DELETE', lambda c, i: f'/restaurants/{i}', None, _new_restaurant),
+    'event_bp.get_events': ('GET', lambda c, _: f'/events/?from={_future(-3)}&to={_future(4)}', None, None),
+    'event_bp.get_event': ('GET', lambda c, _: f'/events/{c["event_id"]}', None, None),
+    'event_bp.create_event': ('POST', lambda c, _: '/events/', lambda c: {'name': 'Bench event', 'time': _future(3)}, None),
+    'event_bp.update_event': ('PUT', lambda c, _: f'/events/{c["event_id"]}', lambda c: {'name': 'Bench night'}, None),
+    'event_bp.delete_event': ('DELETE', lambda c, i: f'/events/{i}', None, _new_event),
+    'stats_bp.get_stock_counts': ('GET', lambda c, _: '/stats/stock_counts', None, None),
+    'stats_bp.get_stock_history': ('GET', lambda c, _: '/stats/stock_history', None, None),
+    'stats_bp.get_dashboard': ('GET', lambda c, days: f'/stats/dashboard?days={days}&bucket=week', None,
+                               _cold_dashboard),
+    'recipe_execution_bp.execute_processed_recipe': ('POST', lambda c, _: '/execute_processed_recipe', lambda c: {
+        'recipe_id': c['processed_recipe_id'], 'quantity': 1}, None),
+    'recipe_execution_bp.execute_full_recipe': ('POST', lambda c, _: '/execute_full_recipe', lambda c: {
+        'recipe_id': c['recipe_id'], 'quantity': 1, 'sale_price': 12.5}, None),
+    'recipe_execution_bp.produce_full_recipe_route': ('POST', lambda c, _: '/produce_full_recipe', lambda c: {
+        'recipe_id': c['recipe_id'], 'quantity': 1, 'sale_price': 12.5, 'dry_run': True}, None),
+    'job_bp.get_job': ('GET', lambda c, _: f'/jobs/{c["job_id"]}', None, None),
+    'search_bp.search_everything': ('GET', lambda c, _: f'/search/?q={c["ingredient_name"][:4]}', None, None),
+    'audit_bp.get_audit_entries': ('GET', lambda c, _: '/audit/?action=recipe.processed', None, None),
+    'audit_bp.get_audit_summary': ('GET', lambda c, _: '/audit/summary', None, None),
+    'budget_bp.get_budget': ('GET', lambda c, _: '/budget/?days=90&bucket=week', None, None),
+    'budget_bp.get_recipe_costs': ('GET', lambda c, _: '/budget/recipes?days=90', None, None),
+    'export_bp.export': ('GET', lambda c, _: '/export/?tables=recipe,recipe_ingredient&format=ndjson', None, None),
+}
+
+
+def _context():
+    """Pick representative rows of the benchmarked restaurant."""
+    ingredient = (Ingredient.query.filter_by(restaurant_id=RESTAURANT_ID, type='Raw')
+                  .join(Stock, Stock.ingredient_id == Ingredient.id)
+                  .group_by(Ingredient.id).order_by(db.func.count(Stock.id).desc()).first())
+    recipe = Recipe.query.filter_by(restaurant_id=RESTAURANT_ID, type='Full Recipe').first()
+    processed = Recipe.query.filter_by(restaurant_id=RESTAURANT_ID, type='Processed').first()
+    job = RecipeJob(id='benchmark-job', restaurant_id=RESTAURANT_ID, recipe_id=recipe.id, quantity=1,
+                    sale_price=1, status='done', message='Benchmark', finished_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    return {
+        'counter': 0,
+        'ingredient_id': ingredient.id,
+        'ingredient_name': ingredient.name,
+        'ingredient_unit': ingredient.unit,
+        'stock_id': Stock.query.filter_by(ingredient_id=ingredient.id).first().id,
+        'recipe_id': recipe.id,
+        'recipe_name': recipe.name,
+        'processed_recipe_id': processed.id,
+        'event_id': Event.query.filter_by(restaurant_id=RESTAURANT_ID).first().id,
+        'user_id': User.query.first().id,
+        'job_id': job.id,
+    }
+
+
+def run_scale(scale, directory, iterations, max_seconds, only):
+    profile = type('BenchConfig', (config.Config,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/{scale}.db',
+        'SCHEDULER_ENABLED': False,
+        'INVENTORY_JOURNAL_PATH': f'{directory}/{scale}.journal',
+    })
+    app = create_app(profile)
+    app.logger.disabled = True
+    with app.app_context():
+        started = time.perf_counter()
+        populate_db.seed(scale, seed=42)
+        seeded = time.perf_counter() - started
+        # As the scheduled job leaves it
+        budget.roll_up(profile.BUDGET_ROLLUP_BATCH_SIZE, settle=False)
+        ctx = _context()
+
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - {'static'}
+    missing = sorted(endpoints - CASES.keys())
+    client = app.test_client()
+    client.environ_base['HTTP_X_RESTAURANT_ID'] = str(RESTAURANT_ID)
+    results = {}
+    for endpoint, (method, path, body, setup) in CASES.items():
+        if endpoint not in endpoints or (only and not any(o in endpoint for o in only)):
+            continue
+        samples, statuses = [], set()
+        deadline = time.perf_counter() + max_seconds
+        for i in range(iterations):
+            setup_id = setup(client, ctx) if setup else None
+            payload = body(ctx) if body else None
+            kwargs = {}
+            if isinstance(payload, str):
+                kwargs = {'data': payload, 'content_type': 'text/csv'}
+            elif payload is not None:
+                kwargs = {'json': payload}
+            start = time.perf_counter()
+            response = client.open(path(ctx, setup_id), method=method, **kwargs)
+            response.get_data()
+            samples.append(time.perf_counter() - start)
+            statuses.add(response.status_code)
+            if i >= 2 and time.perf_counter() > deadline:
+                break
+        samples.sort()
+        results[f'{method} {endpoint}'] = {
+            'median_ms': statistics.median(samples) * 1000,
+            'p95_ms': samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000,
+            'runs': len(samples),
+            'statuses': sorted(statuses),
+        }
+    return {'seed_seconds': seeded, 'endpoints': results, 'missing': missing}
+
+
+def compare(current, baseline, tolerance):
+    """Yield (scale, endpoint, baseline ms, current ms) for slowdowns past tolerance."""
+    for scale, result in current.items():
+        previous = baseline.get(scale, {}).get('endpoints', {})
+        for endpoint, stats in result['endpoints'].items():
+            before = previous.get(endpoint)
+            # Ignore sub-millisecond noise
+            if before and stats['median_ms'] > before['median_ms'] * (1 + tolerance) + 1:
+                yield scale, endpoint, before['median_ms'], stats['median_ms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', nargs='+', choices=populate_db.SCALES, default=['small', 'medium'])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--max-seconds', type=float, default=5.0, help='Time budget per endpoint')
+    parser.add_argument('--only', nargs='+', help='Only endpoints whose name contains one of these')
+    parser.add_argument('--save', help='Write results as JSON (e.g. a new baseline)')
+    parser.add_argument('--compare', help='Baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown, 0.25 = 25%%')
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+
+    results = {}
+    for scale in args.scales:
+        # Each scale in its own process so engines and caches start cold
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            result = pool.apply(run_scale, (scale, directory, args.iterations, args.max_seconds, args.only))
+        results[scale] = result
+        print(f'\n{scale} (seeded in {result["seed_seconds"]:.1f}s)')
+        print(f'{"endpoint":<58}{"median ms":>11}{"p95 ms":>10}{"runs":>6}  status')
+        for endpoint, stats in result['endpoints'].items():
+            print(f'{endpoint:<58}{stats["median_ms"]:>11.1f}{stats["p95_ms"]:>10.1f}{stats["runs"]:>6}'
+                  f'  {",".join(map(str, stats["statuses"]))}')
+        if result['missing']:
+            print(f'No benchmark case for: {", ".join(result["missing"])}')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = list(compare(results, baseline, args.tolerance))
+        for scale, endpoint, before, after in regressions:
+            print(f'REGRESSION {scale} {endpoint}: {before:.1f} ms -> {after:.1f} ms')
+        if regressions:
+            sys.exit(1)
+        print(f'\nNo regressions beyond {args.tolerance:.0%} against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
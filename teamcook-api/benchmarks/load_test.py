@@ -0,0 +1,125 @@
+# benchmarks/load_test.py
+"""
+HTTP load test for a running server.
+
+Replays a fixed, seeded mix of the main read endpoints (plus an optional
+share of writes) from concurrent client threads and reports req/s with
+p50/p99 latency per endpoint.
+
+    python populate_sample_data.py
+    FLASK_CONFIG=config.ProductionConfig python serve.py &
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --clients 32 --seconds 30
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+READ_MIX = [
+    ('GET', '/stocks/', 3),
+    ('GET', '/stocks/grouped', 3),
+    ('GET', '/ingredients/', 2),
+    ('GET', '/recipes/', 2),
+    ('GET', '/stats/stock_counts', 1),
+    ('GET', '/stats/stock_history', 1),
+    ('GET', '/events/', 1),
+]
+
+
+def request(base_url, method, path, body, restaurant_id):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method, headers={
+        'Content-Type': 'application/json',
+        'X-Restaurant-Id': str(restaurant_id),
+    })
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def plan(seed, count, write_share, ingredient_id):
+    """A deterministic sequence of (method, path, body) for one client."""
+    rng = random.Random(seed)
+    weighted = [(m, p) for m, p, w in READ_MIX for _ in range(w)]
+    calls = []
+    for _ in range(count):
+        if rng.random() < write_share:
+            calls.append(('POST', '/stocks/', {
+                'name': 'Load test delivery', 'ingredient_id': ingredient_id, 'amount': 1,
+                'unit': 'kg', 'cost': 1,
+                'expiry_date': (datetime.utcnow() + timedelta(days=30)).isoformat(),
+            }))
+        else:
+            method, path = rng.choice(weighted)
+            calls.append((method, path, None))
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--write-share', type=float, default=0.0)
+    parser.add_argument('--ingredient-id', type=int, default=2)
+    parser.add_argument('--restaurant-id', type=int, default=1)
+    args = parser.parse_args()
+
+    samples = defaultdict(list)
+    failures = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def client(index):
+        local = defaultdict(list)
+        failed = defaultdict(int)
+        calls = plan(args.seed + index, 100000, args.write_share, args.ingredient_id)
+        for method, path, body in calls:
+            if time.perf_counter() >= deadline:
+                break
+            start = time.perf_counter()
+            status = request(args.url, method, path, body, args.restaurant_id)
+            key = f'{method} {path}'
+            local[key].append(time.perf_counter() - start)
+            if not 200 <= status < 300:
+                failed[key] += 1
+        with lock:
+            for key, values in local.items():
+                samples[key].extend(values)
+            for key, count in failed.items():
+                failures[key] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f'{"endpoint":<28}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    total = 0
+    for key in sorted(samples):
+        values = sorted(samples[key])
+        total += len(values)
+        p99 = values[max(int(len(values) * 0.99) - 1, 0)] * 1000
+        print(f'{key:<28}{len(values):>10}{len(values) / elapsed:>10.1f}'
+              f'{statistics.median(values) * 1000:>10.1f}{p99:>10.1f}{failures[key]:>8}')
+    print(f'{"total":<28}{total:>10}{total / elapsed:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/pool_load_test.py
+"""
+Concurrency load test for the database profiles in config.py.
+
+Runs reader and writer threads against the app in-process and compares a
+baseline SQLite setup (rollback journal, no busy timeout) with the tuned
+profile (WAL + busy_timeout). Pass --database-url to run the tuned profile
+against PostgreSQL with ProductionConfig's pool settings instead.
+
+    python benchmarks/pool_load_test.py [--threads 16] [--seconds 5]
+    python benchmarks/pool_load_test.py --database-url postgresql+psycopg2://localhost/teamcook_bench
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app, db
+from app.models import Restaurant, Ingredient, Stock
+
+READ_ENDPOINTS = ['/stocks/grouped', '/stats/stock_counts', '/ingredients/']
+
+
+def make_profile(name, database_url, base, **overrides):
+    attrs = {'SQLALCHEMY_DATABASE_URI': database_url, **overrides}
+    return type(name, (base,), attrs)
+
+
+def seed(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Restaurant(id=1, name='Bench'))
+        now = datetime.utcnow()
+        for i in range(20):
+            ingredient = Ingredient(restaurant_id=1, name=f'Ingredient {i}', unit='kg', type='Raw')
+            db.session.add(ingredient)
+            db.session.flush()
+            for j in range(20):
+                db.session.add(Stock(restaurant_id=1, ingredient_id=ingredient.id, name=f'Lot {i}-{j}',
+                                     amount=5.0, unit='kg', purchase_date=now - timedelta(days=j),
+                                     expiry_date=now + timedelta(days=30), cost=10.0))
+        db.session.commit()
+
+
+def build_profile(name, target):
+    if name == 'BenchProduction':
+        return make_profile(name, target, config.ProductionConfig)
+    if name == 'BenchBaseline':
+        return make_profile(name, f'sqlite:///{target}/baseline.db', config.Config,
+                            SQLITE_JOURNAL_MODE='DELETE', SQLITE_SYNCHRONOUS='FULL', SQLITE_BUSY_TIMEOUT_MS=0)
+    return make_profile(name, f'sqlite:///{target}/tuned.db', config.EdgeConfig)
+
+
+def run(name, target, threads, seconds, write_ratio):
+    app = create_app(build_profile(name, target))
+    seed(app)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        client = app.test_client()
+        client.environ_base['HTTP_X_RESTAURANT_ID'] = '1'
+        local, failed, n = [], 0, 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if (n + index) % write_ratio == 0:
+                response = client.post('/stocks/', json={
+                    'name': 'Delivery', 'ingredient_id': 1 + n % 20, 'amount': 1, 'unit': 'kg',
+                    'cost': 2, 'expiry_date': (datetime.utcnow() + timedelta(days=10)).isoformat()
+                })
+            else:
+                response = client.get(READ_ENDPOINTS[n % len(READ_ENDPOINTS)])
+            local.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                failed += 1
+            n += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    with app.app_context():
+        db.engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    return (len(latencies) - errors[0]) / seconds, p99, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=int, default=5, help='one write every N requests')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    names = ['BenchProduction'] if args.database_url else ['BenchBaseline', 'BenchTuned']
+    directory = tempfile.mkdtemp()
+
+    print(f'{"profile":<18}{"ok req/s":>10}{"p99 (ms)":>12}{"errors":>10}')
+    for name in names:
+        # Each profile gets a fresh process so app-level singletons start clean
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            throughput, p99, errors = pool.apply(
+                run, (name, args.database_url or directory, args.threads, args.seconds, args.write_ratio)
+            )
+        print(f'{name:<18}{throughput:>10.1f}{p99:>12.1f}{errors:>10}')
+
+
+if __name__ == '__main__':
+    main()
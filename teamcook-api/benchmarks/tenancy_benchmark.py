@@ -0,0 +1,134 @@
+# benchmarks/tenancy_benchmark.py
+"""
+Per-tenant query cost benchmark.
+
+Seeds one measured restaurant with a fixed amount of data, times its main
+read endpoints, then seeds 199 more restaurants of the same size and times
+them again. With restaurant-leading indexes the two runs should be close:
+a tenant's cost depends on its own rows, not on the size of the table.
+
+    python benchmarks/tenancy_benchmark.py [--ingredients 40] [--lots 400]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.models import Restaurant, Ingredient, Stock, Recipe, RecipeIngredient, Sales, Waste
+
+TARGET_RESTAURANT_ID = 1
+ENDPOINTS = [
+    '/stocks/',
+    '/stocks/grouped',
+    '/stats/stock_counts',
+    '/stats/stock_history',
+    '/stocks/log/Ingredient 0',
+    '/recipes/',
+]
+
+
+def seed_restaurant(restaurant_id, ingredients, lots):
+    """Bulk insert one restaurant's ingredients, lots, a recipe, sales and waste."""
+    now = datetime.utcnow()
+    db.session.execute(insert(Restaurant), [{'id': restaurant_id, 'name': f'Restaurant {restaurant_id}'}])
+    first_ingredient = db.session.query(db.func.coalesce(db.func.max(Ingredient.id), 0)).scalar() + 1
+    db.session.execute(insert(Ingredient), [
+        {
+            'id': first_ingredient + i,
+            'restaurant_id': restaurant_id,
+            'name': f'Ingredient {i}',
+            'unit': 'kg',
+            'type': 'Raw' if i % 4 else 'Processed',
+        }
+        for i in range(ingredients)
+    ])
+    first_stock = db.session.query(db.func.coalesce(db.func.max(Stock.id), 0)).scalar() + 1
+    db.session.execute(insert(Stock), [
+        {
+            'id': first_stock + i,
+            'restaurant_id': restaurant_id,
+            'ingredient_id': first_ingredient + i % ingredients,
+            'name': f'Lot {i}',
+            'amount': 10.0,
+            'unit': 'kg',
+            'purchase_date': now - timedelta(days=i % 14),
+            'expiry_date': now + timedelta(days=30),
+            'cost': 25.0,
+        }
+        for i in range(lots)
+    ])
+    recipe = Recipe(name=f'Dish {restaurant_id}', type='Full Recipe', restaurant_id=restaurant_id)
+    db.session.add(recipe)
+    db.session.flush()
+    db.session.execute(insert(RecipeIngredient), [
+        {'recipe_id': recipe.id, 'ingredient_id': first_ingredient, 'required_amount': 0.2, 'unit': 'kg'}
+    ])
+    db.session.execute(insert(Sales), [
+        {'recipe_id': recipe.id, 'quantity': 1, 'sale_price': 12.0, 'sale_date': now - timedelta(hours=i),
+         'restaurant_id': restaurant_id}
+        for i in range(lots // 10)
+    ])
+    db.session.execute(insert(Waste), [
+        {'restaurant_id': restaurant_id, 'stock_id': first_stock + i, 'waste_amount': 1.0, 'unit': 'kg',
+         'waste_date': now - timedelta(days=1), 'reason': 'Expired'}
+        for i in range(lots // 20)
+    ])
+    db.session.commit()
+
+
+def time_endpoints(client, repeat):
+    headers = {'X-Restaurant-Id': str(TARGET_RESTAURANT_ID)}
+    results = {}
+    for endpoint in ENDPOINTS:
+        client.get(endpoint, headers=headers)  # warm up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(endpoint, headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (endpoint, response.status_code)
+        results[endpoint] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--restaurants', type=int, default=200)
+    parser.add_argument('--ingredients', type=int, default=40)
+    parser.add_argument('--lots', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'tenancy.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    app = create_app()
+    client = app.test_client()
+
+    with app.app_context():
+        seed_restaurant(TARGET_RESTAURANT_ID, args.ingredients, args.lots)
+    alone = time_endpoints(client, args.repeat)
+
+    with app.app_context():
+        for restaurant_id in range(2, args.restaurants + 1):
+            seed_restaurant(restaurant_id, args.ingredients, args.lots)
+        total_lots = db.session.query(db.func.count(Stock.id)).scalar()
+    crowded = time_endpoints(client, args.repeat)
+
+    print(f'{"endpoint":<28}{"1 tenant (ms)":>16}{f"{args.restaurants} tenants (ms)":>20}{"ratio":>8}')
+    for endpoint in ENDPOINTS:
+        print(f'{endpoint:<28}{alone[endpoint]:>16.2f}{crowded[endpoint]:>20.2f}'
+              f'{crowded[endpoint] / alone[endpoint]:>8.2f}')
+    print(f'stock rows in table: {total_lots}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,133 @@
 import os
 from datetime import timedelta
 
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes')
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
+
+    # Optional read replica; read-only GET requests are routed to it
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    # After a client writes, its reads stay on the primary for this long
+    REPLICA_READ_YOUR_WRITES_SECONDS = _env_int('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+
+    # Restaurant for requests without an X-Restaurant-Id header; unset, they get a 400
+    DEFAULT_RESTAURANT_ID = int(os.environ['DEFAULT_RESTAURANT_ID']) if os.environ.get('DEFAULT_RESTAURANT_ID') else None
+
+    # SQLite connection settings (ignored for other databases)
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT_MS = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+
+    # Background jobs run in whichever process calls create_app
+    SCHEDULER_ENABLED = _env_flag('SCHEDULER_ENABLED', True)
+    # Under serve.py, the worker holding this lock runs the scheduler
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE') or '/tmp/teamcook-scheduler.lock'
+
+    # Scheduled jobs (flask-apscheduler), run in the process that owns the scheduler
+    JOBS = [
+        {'id': 'compact_audit_log', 'func': 'app.tasks:compact_audit_log',
+         'trigger': 'cron', 'hour': 3, 'minute': 15},
+        {'id': 'archive_history', 'func': 'app.tasks:archive_history',
+         'trigger': 'cron', 'hour': 3, 'minute': 45},
+        {'id': 'roll_up_budget', 'func': 'app.tasks:roll_up_budget',
+         'trigger': 'interval', 'minutes': 10},
+        {'id': 'resume_recipe_queue', 'func': 'app.tasks:resume_recipe_queue',
+         'trigger': 'interval', 'minutes': 1},
+    ]
+    # Audit entries older than this many months are folded into monthly totals
+    AUDIT_RETENTION_MONTHS = _env_int('AUDIT_RETENTION_MONTHS', 13)
+    AUDIT_COMPACT_BATCH_SIZE = _env_int('AUDIT_COMPACT_BATCH_SIZE', 5000)
+    # Sales, waste and past events older than this move to archive tables
+    ARCHIVE_AFTER_DAYS = _env_int('ARCHIVE_AFTER_DAYS', 365)
+    ARCHIVE_BATCH_SIZE = _env_int('ARCHIVE_BATCH_SIZE', 2000)
+    # Stock and sales rows per transaction when rolling up budget totals
+    BUDGET_ROLLUP_BATCH_SIZE = _env_int('BUDGET_ROLLUP_BATCH_SIZE', 5000)
+
+    # Queued /execute_full_recipe for clients sending `Prefer: respond-async`
+    RECIPE_QUEUE_ENABLED = _env_flag('RECIPE_QUEUE_ENABLED', False)
+    RECIPE_QUEUE_WORKERS = _env_int('RECIPE_QUEUE_WORKERS', 2)
+    RECIPE_QUEUE_BATCH_SIZE = _env_int('RECIPE_QUEUE_BATCH_SIZE', 50)
+    # Claims older than this belong to a dead worker and are requeued
+    RECIPE_QUEUE_CLAIM_TIMEOUT_SECONDS = _env_int('RECIPE_QUEUE_CLAIM_TIMEOUT_SECONDS', 300)
+
+    # Merge concurrent allocations of the same ingredient into one FIFO pass
+    ALLOCATION_COALESCING = _env_flag('ALLOCATION_COALESCING', False)
+    ALLOCATION_COALESCE_WINDOW_MS = _env_int('ALLOCATION_COALESCE_WINDOW_MS', 2)
+
+    # Serve allocations from memory, persisting through a journal and a
+    # periodic batched flush. Single-process deployments only
+    INVENTORY_ENGINE_ENABLED = _env_flag('INVENTORY_ENGINE_ENABLED', False)
+    INVENTORY_JOURNAL_PATH = os.environ.get('INVENTORY_JOURNAL_PATH')  # defaults to the instance folder
+    INVENTORY_JOURNAL_FSYNC = _env_flag('INVENTORY_JOURNAL_FSYNC', True)
+    INVENTORY_FLUSH_SECONDS = float(os.environ.get('INVENTORY_FLUSH_SECONDS', 2.0))
+
+    # Server-Timing headers and /metrics histograms
+    INSTRUMENTATION_ENABLED = _env_flag('INSTRUMENTATION_ENABLED', True)
+    # Log repeated identical SELECTs within one request (default: in debug mode)
+    N_PLUS_ONE_THRESHOLD = _env_int('N_PLUS_ONE_THRESHOLD', 10)
+
+    # Statements slower than this are logged with their plan (negative disables)
+    SLOW_QUERY_THRESHOLD_MS = _env_int('SLOW_QUERY_THRESHOLD_MS', 200)
+    # Share of slow Postgres SELECTs re-run under EXPLAIN ANALYZE
+    SLOW_QUERY_ANALYZE_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_ANALYZE_SAMPLE_RATE', 0.1))
+    SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE')  # defaults to the instance folder
+
+    # Logging: JSON lines (or 'text') written off the request thread
+    LOG_LEVEL = os.environ.get('LOG_LEVEL')  # default: DEBUG in debug mode, else INFO
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    # Keep records at or below LOG_SAMPLE_LEVEL for this share of requests
+    LOG_SAMPLE_LEVEL = os.environ.get('LOG_SAMPLE_LEVEL', 'INFO')
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+
+    # Allow ?__profile=1 and /admin/profile for admin callers (off: no hooks at all)
+    PROFILING_ENABLED = _env_flag('PROFILING_ENABLED', False)
+
+    # Shared secret for /admin endpoints, sent as X-Admin-Token; unset disables them
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
     # CORS settings
-    CORS_HEADERS = 'Content-Type'
\ No newline at end of file
+    CORS_HEADERS = 'Content-Type'
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class EdgeConfig(Config):
+    """Single-box deployment on SQLite, e.g. a tablet or mini PC in the kitchen."""
+    SQLITE_BUSY_TIMEOUT_MS = _env_int('SQLITE_BUSY_TIMEOUT_MS', 15000)
+
+
+class ProductionConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'postgresql+psycopg2://localhost/teamcook'
+
+    # serve.py starts the scheduler in one designated worker instead
+    SCHEDULER_ENABLED = _env_flag('SCHEDULER_ENABLED', False)
+
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT', 10)
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+    DB_STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+    if SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
+            'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+        }
@@ -0,0 +1,237 @@
+"""Normalize ingredient categories and add the search index
+
+Revision ID: 2821d44f3d1c
+Revises: b1f621f59813
+Create Date: 2026-10-19 12:54:20.465808
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2821d44f3d1c'
+down_revision = 'b1f621f59813'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the search DDL at this revision. The migration must not
+# import app.search, which changes along with the app.
+SEARCH_TABLE_DDL = (
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, restaurant, title, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+)
+
+SQLITE_TRIGGERS = {
+    'search_ingredient_insert': (
+        'AFTER INSERT ON ingredient',
+        [
+            "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) VALUES (NEW.id * 4 + 1, 'ingredient', NEW.id, 'r' || NEW.restaurant_id, NEW.name, (SELECT group_concat(c.name, ' ') FROM ingredient_category ic JOIN category c ON c.id = ic.category_id WHERE ic.ingredient_id = NEW.id))",
+        ]),
+    'search_ingredient_update': (
+        'AFTER UPDATE OF name, restaurant_id ON ingredient',
+        [
+            'DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1',
+            "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) VALUES (NEW.id * 4 + 1, 'ingredient', NEW.id, 'r' || NEW.restaurant_id, NEW.name, (SELECT group_concat(c.name, ' ') FROM ingredient_category ic JOIN category c ON c.id = ic.category_id WHERE ic.ingredient_id = NEW.id))",
+        ]),
+    'search_ingredient_delete': (
+        'AFTER DELETE ON ingredient',
+        [
+            'DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1',
+        ]),
+    'search_ingredient_category_insert': (
+        'AFTER INSERT ON ingredient_category',
+        [
+            "UPDATE search_index SET body = (SELECT group_concat(c.name, ' ') FROM ingredient_category ic JOIN category c ON c.id = ic.category_id WHERE ic.ingredient_id = NEW.ingredient_id) WHERE rowid = NEW.ingredient_id * 4 + 1",
+        ]),
+    'search_ingredient_category_delete': (
+        'AFTER DELETE ON ingredient_category',
+        [
+            "UPDATE search_index SET body = (SELECT group_concat(c.name, ' ') FROM ingredient_category ic JOIN category c ON c.id = ic.category_id WHERE ic.ingredient_id = OLD.ingredient_id) WHERE rowid = OLD.ingredient_id * 4 + 1",
+        ]),
+    'search_category_update': (
+        'AFTER UPDATE OF name ON category',
+        [
+            "UPDATE search_index SET body = (SELECT group_concat(c.name, ' ') FROM ingredient_category ic JOIN category c ON c.id = ic.category_id WHERE ic.ingredient_id = ingredient_category.ingredient_id) FROM ingredient_category WHERE ingredient_category.category_id = NEW.id AND search_index.rowid = ingredient_category.ingredient_id * 4 + 1",
+        ]),
+    'search_recipe_insert': (
+        'AFTER INSERT ON recipe',
+        [
+            "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) VALUES (NEW.id * 4 + 2, 'recipe', NEW.id, 'r' || NEW.restaurant_id, NEW.name, (SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = NEW.id))",
+        ]),
+    'search_recipe_update': (
+        'AFTER UPDATE OF name, restaurant_id ON recipe',
+        [
+            'DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2',
+            "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) VALUES (NEW.id * 4 + 2, 'recipe', NEW.id, 'r' || NEW.restaurant_id, NEW.name, (SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = NEW.id))",
+        ]),
+    'search_recipe_delete': (
+        'AFTER DELETE ON recipe',
+        [
+            'DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2',
+        ]),
+    'search_recipe_step_insert': (
+        'AFTER INSERT ON recipe_step',
+        [
+            "UPDATE search_index SET body = (SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = NEW.recipe_id) WHERE rowid = NEW.recipe_id * 4 + 2",
+        ]),
+    'search_recipe_step_update': (
+        'AFTER UPDATE OF instruction, recipe_id ON recipe_step',
+        [
+            "UPDATE search_index SET body = (SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = OLD.recipe_id) WHERE rowid = OLD.recipe_id * 4 + 2",
+            "UPDATE search_index SET body = (SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = NEW.recipe_id) WHERE rowid = NEW.recipe_id * 4 + 2",
+        ]),
+    'search_recipe_step_delete': (
+        'AFTER DELETE ON recipe_step',
+        [
+            "UPDATE search_index SET body = (SELECT group_concat(instruction, ' ') FROM recipe_step WHERE recipe_id = OLD.recipe_id) WHERE rowid = OLD.recipe_id * 4 + 2",
+        ]),
+    'search_stock_insert': (
+        'AFTER INSERT ON stock',
+        [
+            "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) VALUES (NEW.id * 4 + 3, 'stock', NEW.id, 'r' || NEW.restaurant_id, NEW.name, NULL)",
+        ]),
+    'search_stock_update': (
+        'AFTER UPDATE OF name, restaurant_id ON stock',
+        [
+            'DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3',
+            "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) VALUES (NEW.id * 4 + 3, 'stock', NEW.id, 'r' || NEW.restaurant_id, NEW.name, NULL)",
+        ]),
+    'search_stock_delete': (
+        'AFTER DELETE ON stock',
+        [
+            'DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3',
+        ]),
+}
+
+SQLITE_REBUILD = [
+    'DELETE FROM search_index',
+    "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) SELECT i.id * 4 + 1, 'ingredient', i.id, 'r' || i.restaurant_id, i.name, b.body FROM ingredient i LEFT JOIN (SELECT ic.ingredient_id, group_concat(c.name, ' ') AS body FROM ingredient_category ic JOIN category c ON c.id = ic.category_id GROUP BY ic.ingredient_id) b ON b.ingredient_id = i.id",
+    "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) SELECT r.id * 4 + 2, 'recipe', r.id, 'r' || r.restaurant_id, r.name, b.body FROM recipe r LEFT JOIN (SELECT recipe_id, group_concat(instruction, ' ') AS body FROM recipe_step GROUP BY recipe_id) b ON b.recipe_id = r.id",
+    "INSERT INTO search_index (rowid, kind, ref_id, restaurant, title, body) SELECT id * 4 + 3, 'stock', id, 'r' || restaurant_id, name, NULL FROM stock",
+    "INSERT INTO search_index (search_index) VALUES ('optimize')",
+]
+
+POSTGRES_INDEXES = {
+    'ix_ingredient_name_search': ('ingredient', 'name'),
+    'ix_category_name_search': ('category', 'name'),
+    'ix_recipe_name_search': ('recipe', 'name'),
+    'ix_recipe_step_instruction_search': ('recipe_step', 'instruction'),
+    'ix_stock_name_search': ('stock', 'name'),
+}
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('category',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('restaurant_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['restaurant_id'], ['restaurant.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('restaurant_id', 'name', name='uq_category_restaurant_name')
+    )
+    op.create_table('ingredient_category',
+    sa.Column('ingredient_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+    sa.ForeignKeyConstraint(['ingredient_id'], ['ingredient.id'], ),
+    sa.PrimaryKeyConstraint('ingredient_id', 'category_id')
+    )
+    with op.batch_alter_table('ingredient_category', schema=None) as batch_op:
+        batch_op.create_index('ix_ingredient_category_category', ['category_id', 'ingredient_id'], unique=False)
+
+    # ### end Alembic commands ###
+    _split_categories()
+
+    with op.batch_alter_table('ingredient', schema=None) as batch_op:
+        batch_op.drop_column('categories')
+
+    _install_search()
+
+
+def downgrade():
+    _uninstall_search()
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('ingredient', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('categories', sa.VARCHAR(length=256), nullable=True))
+
+    _join_categories()
+
+    with op.batch_alter_table('ingredient_category', schema=None) as batch_op:
+        batch_op.drop_index('ix_ingredient_category_category')
+
+    op.drop_table('ingredient_category')
+    op.drop_table('category')
+    # ### end Alembic commands ###
+
+
+def _split_categories():
+    """Move the comma-joined ingredient.categories strings into the join table."""
+    conn = op.get_bind()
+    ids = {}
+    links = set()
+    for ingredient_id, restaurant_id, categories in conn.execute(
+            sa.text('SELECT id, restaurant_id, categories FROM ingredient WHERE categories IS NOT NULL')):
+        for name in categories.split(','):
+            name = name.strip()[:64]
+            if not name:
+                continue
+            key = (restaurant_id, name)
+            if key not in ids:
+                ids[key] = conn.execute(
+                    sa.text('INSERT INTO category (restaurant_id, name) VALUES (:r, :n) RETURNING id'),
+                    {'r': restaurant_id, 'n': name}
+                ).scalar()
+            links.add((ingredient_id, ids[key]))
+    if links:
+        conn.execute(
+            sa.text('INSERT INTO ingredient_category (ingredient_id, category_id) VALUES (:i, :c)'),
+            [{'i': i, 'c': c} for i, c in links]
+        )
+
+
+def _join_categories():
+    conn = op.get_bind()
+    names = {}
+    for ingredient_id, name in conn.execute(sa.text(
+            'SELECT ic.ingredient_id, c.name FROM ingredient_category ic '
+            'JOIN category c ON c.id = ic.category_id ORDER BY c.name')):
+        names.setdefault(ingredient_id, []).append(name)
+    if names:
+        conn.execute(
+            sa.text('UPDATE ingredient SET categories = :c WHERE id = :i'),
+            [{'i': i, 'c': ','.join(n)[:256]} for i, n in names.items()]
+        )
+
+
+def _install_search():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        exists = conn.execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")).first()
+        if not exists:
+            conn.execute(sa.text(SEARCH_TABLE_DDL))
+        for name, (when, statements) in SQLITE_TRIGGERS.items():
+            body = ''.join(f'{statement}; ' for statement in statements)
+            conn.execute(sa.text(f"CREATE TRIGGER IF NOT EXISTS {name} {when} BEGIN {body}END"))
+        if not exists:
+            for statement in SQLITE_REBUILD:
+                conn.execute(sa.text(statement))
+    elif conn.dialect.name == 'postgresql':
+        for name, (table, column) in POSTGRES_INDEXES.items():
+            conn.execute(sa.text(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (to_tsvector('simple', {column}))"))
+
+
+def _uninstall_search():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        for name in SQLITE_TRIGGERS:
+            conn.execute(sa.text(f"DROP TRIGGER IF EXISTS {name}"))
+        conn.execute(sa.text("DROP TABLE IF EXISTS search_index"))
+    elif conn.dialect.name == 'postgresql':
+        for name in POSTGRES_INDEXES:
+            conn.execute(sa.text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,124 @@
+"""Add restaurant scoping to ingredient, stock and waste
+
+Revision ID: 8868ae964b37
+Revises: 9838a46a409a
+Create Date: 2026-10-19 12:24:15.951089
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8868ae964b37'
+down_revision = '9838a46a409a'
+branch_labels = None
+depends_on = None
+
+
+# Existing single-site data belonged to the restaurant that sales were
+# hard-coded to, so it is backfilled into restaurant 1.
+DEFAULT_RESTAURANT_ID = 1
+
+
+def _old_name_unique():
+    """Name of the unnamed UNIQUE(name) constraint from the initial migration."""
+    if op.get_bind().dialect.name == 'sqlite':
+        return 'uq_ingredient_name', {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+    return 'ingredient_name_key', None
+
+
+def _ensure_default_restaurant():
+    """Create the restaurant the backfill points at if rows need it and it is missing."""
+    op.execute(
+        f"INSERT INTO restaurant (id, name) SELECT {DEFAULT_RESTAURANT_ID}, 'Default restaurant' "
+        f"WHERE NOT EXISTS (SELECT 1 FROM restaurant WHERE id = {DEFAULT_RESTAURANT_ID}) "
+        "AND (EXISTS (SELECT 1 FROM ingredient) OR EXISTS (SELECT 1 FROM waste) "
+        "OR EXISTS (SELECT 1 FROM recipe WHERE restaurant_id IS NULL) "
+        "OR EXISTS (SELECT 1 FROM event WHERE restaurant_id IS NULL))"
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        # The explicit id does not advance the serial sequence
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('restaurant', 'id'), "
+            "COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM restaurant"
+        )
+
+
+def upgrade():
+    for table in ('ingredient', 'stock', 'waste'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('restaurant_id', sa.Integer(), nullable=True))
+
+    _ensure_default_restaurant()
+    op.execute(f"UPDATE recipe SET restaurant_id = {DEFAULT_RESTAURANT_ID} WHERE restaurant_id IS NULL")
+    op.execute(f"UPDATE event SET restaurant_id = {DEFAULT_RESTAURANT_ID} WHERE restaurant_id IS NULL")
+    op.execute(f"UPDATE ingredient SET restaurant_id = {DEFAULT_RESTAURANT_ID}")
+    op.execute(
+        "UPDATE stock SET restaurant_id = "
+        "(SELECT ingredient.restaurant_id FROM ingredient WHERE ingredient.id = stock.ingredient_id)"
+    )
+    op.execute(
+        "UPDATE waste SET restaurant_id = "
+        f"COALESCE((SELECT stock.restaurant_id FROM stock WHERE stock.id = waste.stock_id), {DEFAULT_RESTAURANT_ID})"
+    )
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_restaurant_time', ['restaurant_id', 'time'], unique=False)
+
+    uq_name, naming_convention = _old_name_unique()
+    with op.batch_alter_table('ingredient', schema=None, naming_convention=naming_convention) as batch_op:
+        batch_op.alter_column('restaurant_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_constraint(uq_name, type_='unique')
+        batch_op.create_index('ix_ingredient_restaurant_type', ['restaurant_id', 'type'], unique=False)
+        batch_op.create_unique_constraint('uq_ingredient_restaurant_name', ['restaurant_id', 'name'])
+        batch_op.create_foreign_key('fk_ingredient_restaurant_id', 'restaurant', ['restaurant_id'], ['id'])
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.create_index('ix_recipe_restaurant_name', ['restaurant_id', 'name'], unique=False)
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.create_index('ix_sales_restaurant_date', ['restaurant_id', 'sale_date'], unique=False)
+        batch_op.create_index('ix_sales_restaurant_recipe', ['restaurant_id', 'recipe_id'], unique=False)
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.alter_column('restaurant_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_stock_restaurant_expiry', ['restaurant_id', 'expiry_date'], unique=False)
+        batch_op.create_index('ix_stock_restaurant_ingredient_purchase', ['restaurant_id', 'ingredient_id', 'purchase_date'], unique=False)
+        batch_op.create_foreign_key('fk_stock_restaurant_id', 'restaurant', ['restaurant_id'], ['id'])
+
+    with op.batch_alter_table('waste', schema=None) as batch_op:
+        batch_op.alter_column('restaurant_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_waste_restaurant_date', ['restaurant_id', 'waste_date'], unique=False)
+        batch_op.create_foreign_key('fk_waste_restaurant_id', 'restaurant', ['restaurant_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('waste', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_waste_restaurant_id', type_='foreignkey')
+        batch_op.drop_index('ix_waste_restaurant_date')
+        batch_op.drop_column('restaurant_id')
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_stock_restaurant_id', type_='foreignkey')
+        batch_op.drop_index('ix_stock_restaurant_ingredient_purchase')
+        batch_op.drop_index('ix_stock_restaurant_expiry')
+        batch_op.drop_column('restaurant_id')
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_restaurant_recipe')
+        batch_op.drop_index('ix_sales_restaurant_date')
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_index('ix_recipe_restaurant_name')
+
+    uq_name, _ = _old_name_unique()
+    with op.batch_alter_table('ingredient', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_ingredient_restaurant_id', type_='foreignkey')
+        batch_op.drop_constraint('uq_ingredient_restaurant_name', type_='unique')
+        batch_op.drop_index('ix_ingredient_restaurant_type')
+        batch_op.drop_column('restaurant_id')
+        batch_op.create_unique_constraint(uq_name, ['name'])
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_restaurant_time')
@@ -0,0 +1,135 @@
+"""record ingredient consumption in the audit log
+
+Revision ID: 8ad99b5cea04
+Revises: 492f3c44facb
+Create Date: 2026-10-19 14:04:08.693595
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8ad99b5cea04'
+down_revision = '492f3c44facb'
+branch_labels = None
+depends_on = None
+
+ACTIONS = ('ingredient.processed', 'ingredient.sold')
+BATCH_SIZE = 1000
+
+recipe = sa.table('recipe', sa.column('id', sa.Integer), sa.column('name', sa.String))
+recipe_ingredient = sa.table(
+    'recipe_ingredient', sa.column('recipe_id', sa.Integer), sa.column('ingredient_id', sa.Integer),
+    sa.column('required_amount', sa.Float), sa.column('unit', sa.String)
+)
+sales = sa.table(
+    'sales', sa.column('id', sa.Integer), sa.column('recipe_id', sa.Integer), sa.column('quantity', sa.Float),
+    sa.column('sale_date', sa.DateTime), sa.column('restaurant_id', sa.Integer)
+)
+sales_daily = sa.table(
+    'sales_daily', sa.column('id', sa.Integer), sa.column('restaurant_id', sa.Integer), sa.column('day', sa.Date),
+    sa.column('recipe_id', sa.Integer), sa.column('sales', sa.Integer), sa.column('quantity', sa.Float)
+)
+audit_log = sa.table(
+    'audit_log', sa.column('id', sa.Integer), sa.column('restaurant_id', sa.Integer),
+    sa.column('occurred_at', sa.DateTime), sa.column('month', sa.Integer), sa.column('action', sa.String),
+    sa.column('subject_type', sa.String), sa.column('subject_id', sa.Integer), sa.column('quantity', sa.Float),
+    sa.column('unit', sa.String), sa.column('details', sa.JSON)
+)
+audit_summary = sa.table(
+    'audit_summary', sa.column('restaurant_id', sa.Integer), sa.column('month', sa.Integer),
+    sa.column('action', sa.String), sa.column('subject_type', sa.String), sa.column('subject_id', sa.Integer),
+    sa.column('unit', sa.String), sa.column('entries', sa.Integer), sa.column('quantity', sa.Float),
+    sa.column('first_at', sa.DateTime), sa.column('last_at', sa.DateTime)
+)
+
+
+def _batches(conn, table, query):
+    """Rows of `query` in id order, BATCH_SIZE at a time."""
+    last_id = 0
+    while True:
+        rows = conn.execute(query.where(table.c.id > last_id).order_by(table.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def upgrade():
+    """
+    Backfill what past runs used, from the recipes as they are now: the
+    closest record there is of runs written before their amounts were.
+    """
+    conn = op.get_bind()
+    lines = {}
+    for row in conn.execute(sa.select(recipe_ingredient)):
+        lines.setdefault(row.recipe_id, []).append(row)
+    names = dict(conn.execute(sa.select(recipe.c.id, recipe.c.name)).all())
+
+    def used(restaurant_id, action, recipe_id, times, at, **details):
+        return [
+            {
+                'restaurant_id': restaurant_id, 'occurred_at': at, 'month': at.year * 100 + at.month,
+                'action': action, 'subject_type': 'ingredient', 'subject_id': line.ingredient_id,
+                'quantity': line.required_amount * (times or 0.0), 'unit': line.unit,
+                'details': {'recipe_id': recipe_id, 'recipe': names.get(recipe_id), **details}
+            }
+            for line in lines.get(recipe_id, [])
+        ]
+
+    for rows in _batches(conn, sales, sa.select(sales)):
+        entries = [
+            entry for sale in rows
+            for entry in used(sale.restaurant_id, 'ingredient.sold', sale.recipe_id, sale.quantity,
+                              sale.sale_date or datetime.utcnow(), sale_id=sale.id)
+        ]
+        if entries:
+            conn.execute(audit_log.insert(), entries)
+
+    for rows in _batches(conn, sales_daily, sa.select(sales_daily)):
+        entries = [
+            entry for day in rows
+            for entry in used(day.restaurant_id, 'ingredient.sold', day.recipe_id, day.quantity,
+                              datetime.combine(day.day, datetime.min.time()), sales=day.sales, archived=True)
+        ]
+        if entries:
+            conn.execute(audit_log.insert(), entries)
+
+    processed = sa.select(audit_log).where(audit_log.c.action == 'recipe.processed')
+    for rows in _batches(conn, audit_log, processed):
+        entries = [
+            entry for run in rows
+            for entry in used(run.restaurant_id, 'ingredient.processed', run.subject_id, run.quantity,
+                              run.occurred_at, stock_id=(run.details or {}).get('stock_id'))
+        ]
+        if entries:
+            conn.execute(audit_log.insert(), entries)
+
+    # Compacted months: the summaries are keyed per ingredient and unit
+    totals = {}
+    for summary in conn.execute(sa.select(audit_summary).where(audit_summary.c.action == 'recipe.processed')):
+        for line in lines.get(summary.subject_id, []):
+            key = (summary.restaurant_id, summary.month, line.ingredient_id, line.unit)
+            total = totals.setdefault(key, [0, 0.0, summary.first_at, summary.last_at])
+            total[0] += summary.entries
+            total[1] += line.required_amount * summary.quantity
+            total[2] = min(filter(None, (total[2], summary.first_at)), default=None)
+            total[3] = max(filter(None, (total[3], summary.last_at)), default=None)
+    if totals:
+        conn.execute(audit_summary.insert(), [
+            {
+                'restaurant_id': restaurant_id, 'month': month, 'action': 'ingredient.processed',
+                'subject_type': 'ingredient', 'subject_id': ingredient_id, 'unit': unit,
+                'entries': entries, 'quantity': quantity, 'first_at': first_at, 'last_at': last_at
+            }
+            for (restaurant_id, month, ingredient_id, unit), (entries, quantity, first_at, last_at) in totals.items()
+        ])
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(audit_log.delete().where(audit_log.c.action.in_(ACTIONS)))
+    conn.execute(audit_summary.delete().where(audit_summary.c.action.in_(ACTIONS)))
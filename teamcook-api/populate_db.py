@@ -1,189 +1,297 @@
+# populate_db.py
+"""
+Deterministic synthetic data generator.
+
+Builds restaurants with users, thousands of ingredients, processed recipes
+(sub-recipes) that produce ingredients used by full recipes, stock lots,
+sales, waste and events. Everything is bulk-inserted in chunks, and the same
+--seed and --today always produce the same rows (password salts aside).
+
+    python populate_db.py --scale medium --seed 7
+    python populate_db.py --scale small --lots 50000 --database-url sqlite:///bench.db
+
+Existing tables are dropped and recreated.
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
 from app import create_app, db
 from app.models import (
-    Stock, RawIngredient, ProcessedIngredient,
-    Recipe, Restaurant, User, Event
+    User, Restaurant, Ingredient, Category, IngredientCategory, Stock, Recipe,
+    RecipeIngredient, RecipeStep, Event, Waste, Sales
 )
-from datetime import datetime, timedelta
-import random
-import requests
-import json
-
-
-BASE_URL = "http://127.0.0.1:5000"
-# Create the Flask app
-app = create_app()
-test_data = {
-    "raw_ingredients": {
-        "name": "Tomato",
-        "unit": "kg",
-        "categories": "vegetables, fruits"
-    },
-    "stocks": {
-        "name": "Tomato Stock",
-        "purchase_date": datetime.utcnow().isoformat(),
-        "expiry_date": (datetime.utcnow() + timedelta(days=7)).isoformat(),
-        "cost": 2.5,
-        "quantity_id": 1,
-        "raw_ingredient_id": 1
-    },
-    "processed_ingredients": {
-        "name": "Tomato Sauce",
-        "expiry_date": (datetime.utcnow() + timedelta(days=30)).isoformat(),
-        "cost": 3.0
-    },
-    "recipes": {
-        "name": "Tomato Pasta",
-        "type": "Full Recipe",
-        "restaurant_id": 1
-    },
-    "restaurants": {
-        "name": "Italian Bistro",
-        "address": "123 Pasta St.",
-        "phone": "123-456-7890"
-    },
-    "users": {
-        "login_id": "chef123",
-        "password": "securepassword",
-        "name": "Chef Mario",
-        "role": "Chef"
-    },
-    "events": {
-        "name": "Pasta Night",
-        "time": (datetime.utcnow() + timedelta(days=1)).isoformat(),
-        "restaurant_id": 1,
-        "created_by_id": 1
-    }
+
+# Per restaurant
+SCALES = {
+    'small': {'restaurants': 1, 'ingredients': 200, 'recipes': 60, 'lots': 5000,
+              'sales': 5000, 'waste': 500, 'events': 20},
+    'medium': {'restaurants': 3, 'ingredients': 1000, 'recipes': 300, 'lots': 100000,
+               'sales': 100000, 'waste': 10000, 'events': 100},
+    'large': {'restaurants': 10, 'ingredients': 3000, 'recipes': 1000, 'lots': 200000,
+              'sales': 100000, 'waste': 10000, 'events': 500},
 }
 
-# Sample data
-raw_ingredients = [
-    {'name': 'Tomato', 'unit': 'kg', 'categories': 'Vegetable, Ingredient'},
-    {'name': 'Onion', 'unit': 'kg', 'categories': 'Vegetable, Ingredient'},
-    {'name': 'Chicken', 'unit': 'kg', 'categories': 'Meat, Ingredient'},
-    {'name': 'Salt', 'unit': 'g', 'categories': 'Condiment, Ingredient'},
-    {'name': 'Olive Oil', 'unit': 'L', 'categories': 'Oil, Ingredient'}
-]
+CHUNK_SIZE = 5000
 
-restaurants = [
-    {'name': 'Pasta Palace', 'address': '123 Pasta Lane', 'phone': '555-1234'},
-    {'name': 'Burger Barn', 'address': '456 Burger St', 'phone': '555-5678'},
-    {'name': 'Pizza Planet', 'address': '789 Pizza Ave', 'phone': '555-9876'}
+# name, unit, categories, density (g/ml), piece weight (g)
+BASE_INGREDIENTS = [
+    ('Tomato', 'kg', 'Vegetable', None, 120), ('Onion', 'kg', 'Vegetable', None, 150),
+    ('Garlic', 'kg', 'Vegetable', None, 5), ('Carrot', 'kg', 'Vegetable', None, 60),
+    ('Potato', 'kg', 'Vegetable', None, 200), ('Bell Pepper', 'kg', 'Vegetable', None, 160),
+    ('Spinach', 'kg', 'Vegetable', None, None), ('Mushroom', 'kg', 'Vegetable', None, 20),
+    ('Basil', 'g', 'Herb', None, None), ('Parsley', 'g', 'Herb', None, None),
+    ('Chicken Breast', 'kg', 'Meat', None, 250), ('Ground Beef', 'kg', 'Meat', None, None),
+    ('Pork Shoulder', 'kg', 'Meat', None, None), ('Salmon Fillet', 'kg', 'Fish', None, 180),
+    ('Shrimp', 'kg', 'Fish', None, 15), ('Flour', 'kg', 'Dry Goods', 0.59, None),
+    ('Sugar', 'kg', 'Dry Goods', 0.85, None), ('Rice', 'kg', 'Dry Goods', 0.85, None),
+    ('Pasta', 'kg', 'Dry Goods', None, None), ('Salt', 'g', 'Condiment', 1.2, None),
+    ('Black Pepper', 'g', 'Condiment', 0.5, None), ('Olive Oil', 'l', 'Oil', 0.91, None),
+    ('Vegetable Oil', 'l', 'Oil', 0.92, None), ('Butter', 'kg', 'Dairy', 0.91, None),
+    ('Milk', 'l', 'Dairy', 1.03, None), ('Cream', 'l', 'Dairy', 1.01, None),
+    ('Mozzarella', 'kg', 'Dairy', None, None), ('Parmesan', 'kg', 'Dairy', None, None),
+    ('Egg', 'pc', 'Dairy', None, 50), ('Lemon', 'pc', 'Fruit', None, 100),
+    ('Lime', 'pc', 'Fruit', None, 60), ('Apple', 'kg', 'Fruit', None, 180),
+    ('Vinegar', 'l', 'Condiment', 1.01, None), ('Soy Sauce', 'l', 'Condiment', 1.2, None),
+    ('Honey', 'kg', 'Condiment', 1.42, None), ('Yeast', 'g', 'Dry Goods', None, None),
+    ('Chickpeas', 'kg', 'Legume', None, None), ('Lentils', 'kg', 'Legume', None, None),
+    ('Bread Roll', 'pc', 'Bakery', None, 80), ('Tortilla', 'pc', 'Bakery', None, 45),
 ]
+QUALIFIERS = ['', 'Organic ', 'Fresh ', 'Frozen ', 'Local ', 'Imported ', 'Premium ', 'Bulk ']
+# Other units a lot of an ingredient may be bought in, by ingredient unit
+PURCHASE_UNITS = {'kg': ['kg', 'kg', 'g'], 'g': ['g', 'kg'], 'l': ['l', 'l', 'ml'], 'pc': ['pc', 'pc', 'dozen']}
+UNIT_COST = {'kg': 6.0, 'g': 0.02, 'l': 4.0, 'ml': 0.004, 'pc': 0.4, 'dozen': 4.5}
+PREPARATIONS = ['Sauce', 'Dough', 'Stock', 'Marinade', 'Dressing', 'Puree', 'Glaze', 'Filling']
+DISHES = ['Pasta', 'Pizza', 'Salad', 'Bowl', 'Burger', 'Curry', 'Soup', 'Stew', 'Taco', 'Risotto', 'Wrap', 'Tart']
+STYLES = ['Classic', 'Spicy', 'Smoky', 'Garden', 'House', 'Rustic', 'Coastal', 'Summer', 'Winter', 'Chef\'s']
+STEP_VERBS = ['Prepare', 'Chop', 'Mix', 'Season', 'Simmer', 'Roast', 'Blend', 'Rest', 'Plate', 'Garnish']
+WASTE_REASONS = ['Expired', 'Spoiled', 'Dropped', 'Overproduction', 'Quality check']
 
-users = [
-    {'login_id': 'chef1', 'password_hash': 'password123', 'name': 'Chef John', 'role': 'Chef'},
-    {'login_id': 'manager1', 'password_hash': 'password123', 'name': 'Manager Sue', 'role': 'Manager'}
-]
 
-recipes = [
-    {'name': 'Spaghetti Bolognese', 'type': 'Full Recipe', 'restaurant_id': 1},
-    {'name': 'Chicken Alfredo', 'type': 'Full Recipe', 'restaurant_id': 1},
-    {'name': 'Margherita Pizza', 'type': 'Processed', 'restaurant_id': 3}
-]
+class IdSequence:
+    """Hands out ids so rows can reference each other before they are inserted."""
 
-events = [
-    {'name': 'Italian Night', 'time': datetime.utcnow() + timedelta(days=10), 'created_by_id': 1, 'restaurant_id': 1},
-    {'name': 'Burger Festival', 'time': datetime.utcnow() + timedelta(days=15), 'created_by_id': 1, 'restaurant_id': 2},
-    {'name': 'Pizza Making Workshop', 'time': datetime.utcnow() + timedelta(days=20), 'created_by_id': 2, 'restaurant_id': 3}
-]
+    def __init__(self):
+        self.next = 1
+
+    def take(self):
+        value = self.next
+        self.next += 1
+        return value
+
+
+def bulk_insert(model, rows, chunk_size=CHUNK_SIZE):
+    """Insert an iterable of row dicts in chunks; returns the row count."""
+    statement = insert(model.__table__)
+    chunk = []
+    count = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(statement, chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(statement, chunk)
+        count += len(chunk)
+    return count
+
+
+def seed(scale='small', seed=42, today=None, **overrides):
+    """Drop, recreate and fill every table. Returns the row counts."""
+    sizes = dict(SCALES[scale], **{k: v for k, v in overrides.items() if v is not None})
+    today = today or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rng = random.Random(seed)
+    ids = {name: IdSequence() for name in ('user', 'ingredient', 'category', 'stock', 'recipe', 'recipe_ingredient')}
+    counts = {}
 
-# Populate the database
-with app.app_context():
-    # Clear existing data
     db.drop_all()
     db.create_all()
 
-    # Add raw ingredients
-    for ingredient in raw_ingredients:
-        raw_ingredient = RawIngredient(**ingredient)
-        db.session.add(raw_ingredient)
-    db.session.commit()
+    # One hash for every generated account: hashing is deliberately slow
+    password_hash = generate_password_hash('password')
+
+    restaurants = [
+        {'id': r, 'name': f'{rng.choice(STYLES)} {rng.choice(DISHES)} House {r}',
+         'address': f'{rng.randint(1, 999)} Market St', 'phone': f'555-{rng.randint(1000, 9999)}'}
+        for r in range(1, sizes['restaurants'] + 1)
+    ]
+    counts['restaurant'] = bulk_insert(Restaurant, restaurants)
+
+    users = []
+    for restaurant in restaurants:
+        for role in ('Manager', 'Chef', 'Cook'):
+            user_id = ids['user'].take()
+            users.append({'id': user_id, 'login_id': f'{role.lower()}{user_id}', 'name': f'{role} {user_id}',
+                          'role': role, 'password_hash': password_hash})
+    counts['user'] = bulk_insert(User, users)
+
+    for key in ('ingredient', 'category', 'ingredient_category', 'recipe', 'recipe_ingredient', 'recipe_step', 'stock', 'sales', 'waste', 'event'):
+        counts[key] = 0
 
-    # Add restaurants
     for restaurant in restaurants:
-        restaurant_instance = Restaurant(**restaurant)
-        db.session.add(restaurant_instance)
-    db.session.commit()
-
-    # Add users
-    for user in users:
-        user_instance = User(**user)
-        user_instance.set_password(user['password_hash'])  # Hash the password
-        db.session.add(user_instance)
-    db.session.commit()
-
-    # Add recipes
-    for recipe in recipes:
-        recipe_instance = Recipe(**recipe)
-        db.session.add(recipe_instance)
-    db.session.commit()
-
-    # Add stocks
-    raw_ingredient_ids = [ri.id for ri in RawIngredient.query.all()]
-    for i in range(10):  # Create 10 stock entries
-        stock = Stock(
-            name=f'Stock {i + 1}',
-            purchase_date=datetime.utcnow() - timedelta(days=random.randint(1, 30)),
-            expiry_date=datetime.utcnow() + timedelta(days=random.randint(30, 60)),
-            cost=round(random.uniform(1.0, 100.0), 2),
-            quantity_id=random.randint(1, 5),  # Assuming quantity model exists
-            raw_ingredient_id=random.choice(raw_ingredient_ids)
-        )
-        db.session.add(stock)
-    db.session.commit()
-
-    # Add events
-    for event in events:
-        event_instance = Event(**event)
-        db.session.add(event_instance)
-    db.session.commit()
-
-print("Database populated successfully!")
-def test_route(method, endpoint, data=None):
-    url = f"{BASE_URL}/{endpoint}"
-    try:
-        if method == 'GET':
-            response = requests.get(url)
-        elif method == 'POST':
-            response = requests.post(url, json=data)
-        elif method == 'PUT':
-            response = requests.put(url, json=data)
-        elif method == 'DELETE':
-            response = requests.delete(url)
-
-        print(f"{method} {url} - Status Code: {response.status_code}")
-        if response.status_code in [200, 201]:
-            print("Response:", response.json())
+        restaurant_users = [u['id'] for u in users[(restaurant['id'] - 1) * 3:restaurant['id'] * 3]]
+        _seed_restaurant(rng, restaurant['id'], restaurant_users, sizes, today, ids, counts)
+        db.session.commit()
+    return counts
+
+
+def _seed_restaurant(rng, restaurant_id, user_ids, sizes, today, ids, counts):
+    categories = {}
+    links = []
+
+    def categorise(ingredient_id, *names):
+        for name in names:
+            if name not in categories:
+                categories[name] = {'id': ids['category'].take(), 'restaurant_id': restaurant_id, 'name': name}
+            links.append({'ingredient_id': ingredient_id, 'category_id': categories[name]['id']})
+
+    # Raw ingredients: qualifier x base name, numbered once the combinations run out
+    raw = []
+    for i in range(sizes['ingredients']):
+        name, unit, category, density, piece_weight = BASE_INGREDIENTS[i % len(BASE_INGREDIENTS)]
+        round_ = i // len(BASE_INGREDIENTS)
+        qualifier = QUALIFIERS[round_ % len(QUALIFIERS)]
+        suffix = f' #{round_ // len(QUALIFIERS) + 1}' if round_ >= len(QUALIFIERS) else ''
+        raw.append({
+            'id': ids['ingredient'].take(), 'restaurant_id': restaurant_id,
+            'name': f'{qualifier}{name}{suffix}', 'unit': unit,
+            'type': 'Raw', 'density': density, 'piece_weight': piece_weight,
+        })
+        categorise(raw[-1]['id'], category, 'Ingredient')
+
+    # A quarter of the recipes are processed: each produces an ingredient of
+    # the same name that full recipes then use as a sub-recipe
+    recipes, lines, steps, processed = [], [], [], []
+    n_processed = max(sizes['recipes'] // 4, 1)
+    for i in range(sizes['recipes']):
+        is_processed = i < n_processed
+        recipe_id = ids['recipe'].take()
+        if is_processed:
+            name = f'{rng.choice(STYLES)} {rng.choice(PREPARATIONS)} {i + 1}'
         else:
-            print("Error:", response.json())
-    except Exception as e:
-        print(f"Exception occurred: {e}")
-
-# Test Raw Ingredients
-test_route('POST', 'raw_ingredients', test_data['raw_ingredients'])
-test_route('GET', 'raw_ingredients')
-
-# Test Stocks
-test_route('POST', 'stocks', test_data['stocks'])
-test_route('GET', 'stocks')
-
-# Test Processed Ingredients
-test_route('POST', 'processed_ingredients', test_data['processed_ingredients'])
-test_route('GET', 'processed_ingredients')
-
-# Test Recipes
-test_route('POST', 'recipes', test_data['recipes'])
-test_route('GET', 'recipes')
-
-# Test Restaurants
-test_route('POST', 'restaurants', test_data['restaurants'])
-test_route('GET', 'restaurants')
-
-# Test Users
-test_route('POST', 'users', test_data['users'])
-test_route('GET', 'users')
-
-# Test Events
-test_route('POST', 'events', test_data['events'])
-test_route('GET', 'events')
-print("Database routes test successful")
\ No newline at end of file
+            name = f'{rng.choice(STYLES)} {rng.choice(DISHES)} {i + 1}'
+        recipes.append({
+            'id': recipe_id, 'restaurant_id': restaurant_id, 'name': name,
+            'type': 'Processed' if is_processed else 'Full Recipe',
+            'creation_time': today - timedelta(days=rng.randint(30, 720)),
+        })
+
+        components = rng.sample(raw, rng.randint(3, 6) if is_processed else rng.randint(4, 9))
+        if not is_processed and processed:
+            components += rng.sample(processed, min(len(processed), rng.randint(0, 2)))
+        for ingredient in components:
+            unit = ingredient['unit']
+            amount = {'kg': rng.uniform(0.05, 0.6), 'g': rng.uniform(2, 40), 'l': rng.uniform(0.02, 0.4),
+                      'pc': rng.randint(1, 4)}[unit]
+            lines.append({'id': ids['recipe_ingredient'].take(), 'recipe_id': recipe_id,
+                          'ingredient_id': ingredient['id'], 'required_amount': round(amount, 3), 'unit': unit})
+        for step in range(1, rng.randint(3, 8) + 1):
+            steps.append({'recipe_id': recipe_id, 'step_number': step,
+                          'instruction': f'{rng.choice(STEP_VERBS)} the {rng.choice(components)["name"].lower()}.'})
+
+        if is_processed:
+            processed.append({
+                'id': ids['ingredient'].take(), 'restaurant_id': restaurant_id, 'name': name,
+                'unit': 'kg', 'type': 'Processed', 'density': None, 'piece_weight': None,
+            })
+            categorise(processed[-1]['id'], 'Prepared')
+
+    ingredients = raw + processed
+    counts['ingredient'] += bulk_insert(Ingredient, ingredients)
+    counts['category'] += bulk_insert(Category, categories.values())
+    counts['ingredient_category'] += bulk_insert(IngredientCategory, links)
+    counts['recipe'] += bulk_insert(Recipe, recipes)
+    counts['recipe_ingredient'] += bulk_insert(RecipeIngredient, lines)
+    counts['recipe_step'] += bulk_insert(RecipeStep, steps)
+
+    first_stock = ids['stock'].next
+    counts['stock'] += bulk_insert(Stock, _lots(rng, restaurant_id, ingredients, sizes['lots'], today, ids))
+    last_stock = ids['stock'].next - 1
+
+    full_recipes = [r['id'] for r in recipes if r['type'] == 'Full Recipe'] or [recipes[0]['id']]
+    counts['sales'] += bulk_insert(Sales, _sales(rng, restaurant_id, full_recipes, sizes['sales'], today))
+    counts['waste'] += bulk_insert(Waste, (
+        _waste(rng, restaurant_id, first_stock, last_stock, sizes['waste'], today)
+        if last_stock >= first_stock else ()
+    ))
+    counts['event'] += bulk_insert(Event, (
+        {'restaurant_id': restaurant_id, 'name': f'{rng.choice(STYLES)} Night',
+         'time': today + timedelta(hours=rng.randint(-60 * 24, 60 * 24)), 'created_by_id': rng.choice(user_ids)}
+        for _ in range(sizes['events'])
+    ))
+
+
+def _lots(rng, restaurant_id, ingredients, count, today, ids):
+    for i in range(count):
+        ingredient = ingredients[rng.randrange(len(ingredients))]
+        unit = rng.choice(PURCHASE_UNITS[ingredient['unit']])
+        amount = {'kg': rng.uniform(1, 25), 'g': rng.uniform(100, 5000), 'l': rng.uniform(1, 20),
+                  'ml': rng.uniform(250, 5000), 'pc': rng.randint(6, 120), 'dozen': rng.randint(1, 10)}[unit]
+        purchased = today - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1439))
+        yield {
+            'id': ids['stock'].take(), 'restaurant_id': restaurant_id, 'ingredient_id': ingredient['id'],
+            'name': f'{ingredient["name"]} lot {i + 1}', 'amount': round(amount, 3), 'unit': unit,
+            'purchase_date': purchased, 'expiry_date': purchased + timedelta(days=rng.randint(7, 180)),
+            'cost': round(amount * UNIT_COST[unit] * rng.uniform(0.8, 1.25), 2), 'version': 1,
+        }
+
+
+def _sales(rng, restaurant_id, recipe_ids, count, today):
+    for _ in range(count):
+        quantity = rng.choice((1, 1, 1, 2, 2, 3, 4))
+        price = round(rng.uniform(8, 32), 2)
+        yield {
+            'restaurant_id': restaurant_id, 'recipe_id': rng.choice(recipe_ids), 'quantity': quantity,
+            'sale_price': price, 'sale_date': today - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+            'cost': round(quantity * price * rng.uniform(0.25, 0.4), 2),
+        }
+
+
+def _waste(rng, restaurant_id, first_stock, last_stock, count, today):
+    for _ in range(count):
+        amount = round(rng.uniform(0.05, 2), 3)
+        yield {
+            'restaurant_id': restaurant_id, 'stock_id': rng.randint(first_stock, last_stock),
+            'waste_amount': amount, 'unit': 'kg', 'waste_date': today - timedelta(minutes=rng.randint(0, 90 * 24 * 60)),
+            'reason': rng.choice(WASTE_REASONS), 'notes': None,
+            'cost': round(amount * UNIT_COST['kg'] * rng.uniform(0.8, 1.25), 2),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the database with deterministic synthetic data.')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--today', type=datetime.fromisoformat,
+                        help='Date the data is generated around (default: today, UTC)')
+    parser.add_argument('--database-url', help='Overrides DATABASE_URL')
+    for key in SCALES['small']:
+        parser.add_argument(f'--{key}', type=int, help=f'{key} per restaurant (restaurants: total)')
+    args = parser.parse_args()
+
+    config = None
+    if args.database_url:
+        import config as config_module
+        config = type('SeedConfig', (config_module.Config,), {
+            'SQLALCHEMY_DATABASE_URI': args.database_url, 'SCHEDULER_ENABLED': False,
+        })
+    app = create_app(config)
+
+    started = time.perf_counter()
+    with app.app_context():
+        counts = seed(args.scale, args.seed, args.today, **{key: getattr(args, key) for key in SCALES['small']})
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f'{table:<20}{count:>12,}')
+    print(f'Seeded {sum(counts.values()):,} rows in {elapsed:.1f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from app import create_app, db
-from app.models import Ingredient, Recipe, RecipeIngredient, RecipeStep, Restaurant, User, Stock
+from app.models import Ingredient, Category, Recipe, RecipeIngredient, RecipeStep, Restaurant, User, Stock
 from datetime import datetime, timedelta
 import random
 
@@ -30,15 +30,15 @@ def populate_data():
             db.session.commit()
 
             # Add Raw Ingredients
-            yeast = Ingredient(name='Yeast', unit='g', categories='Leavening Agent', type='Raw')
-            flour = Ingredient(name='Flour', unit='kg', categories='Grain', type='Raw')
-            tomato = Ingredient(name='Tomato', unit='kg', categories='Vegetable', type='Raw')
-            mozzarella_cheese = Ingredient(name='Mozzarella Cheese', unit='kg', categories='Dairy', type='Raw')
-            pepperoni = Ingredient(name='Pepperoni', unit='kg', categories='Meat', type='Raw')
+            yeast = Ingredient(name='Yeast', unit='g', categories=[Category(name='Leavening Agent', restaurant_id=restaurant.id)], type='Raw', restaurant_id=restaurant.id)
+            flour = Ingredient(name='Flour', unit='kg', categories=[Category(name='Grain', restaurant_id=restaurant.id)], type='Raw', restaurant_id=restaurant.id)
+            tomato = Ingredient(name='Tomato', unit='kg', categories=[Category(name='Vegetable', restaurant_id=restaurant.id)], type='Raw', restaurant_id=restaurant.id)
+            mozzarella_cheese = Ingredient(name='Mozzarella Cheese', unit='kg', categories=[Category(name='Dairy', restaurant_id=restaurant.id)], type='Raw', restaurant_id=restaurant.id)
+            pepperoni = Ingredient(name='Pepperoni', unit='kg', categories=[Category(name='Meat', restaurant_id=restaurant.id)], type='Raw', restaurant_id=restaurant.id)
 
             # Add Processed Ingredients
-            pizza_dough = Ingredient(name='Pizza Dough', unit='kg', categories='Dough', type='Processed')
-            tomato_sauce = Ingredient(name='Tomato Sauce', unit='L', categories='Sauce', type='Processed')
+            pizza_dough = Ingredient(name='Pizza Dough', unit='kg', categories=[Category(name='Dough', restaurant_id=restaurant.id)], type='Processed', restaurant_id=restaurant.id)
+            tomato_sauce = Ingredient(name='Tomato Sauce', unit='L', categories=[Category(name='Sauce', restaurant_id=restaurant.id)], type='Processed', restaurant_id=restaurant.id)
 
             db.session.add_all([yeast, flour, tomato, mozzarella_cheese, pepperoni, pizza_dough, tomato_sauce])
             db.session.commit()
@@ -46,6 +46,7 @@ def populate_data():
             # Add Stocks
             for ingredient in [yeast, flour, tomato, mozzarella_cheese, pepperoni]:
                 stock = Stock(
+                    restaurant_id=restaurant.id,
                     name=f'{ingredient.name} Stock',
                     ingredient_id=ingredient.id,
                     amount=random.uniform(10, 100),
@@ -1,4 +1,5 @@
 # run.py
+# Local debug server. Use serve.py to run under gunicorn in production.
 from app import create_app
 
 app = create_app()
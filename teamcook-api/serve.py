@@ -0,0 +1,126 @@
+# serve.py
+"""
+Production launcher: runs the app under gunicorn.
+
+    FLASK_CONFIG=config.ProductionConfig python serve.py [--workers N] [--threads N] [--bind HOST:PORT]
+
+The app is built once in the master (preload) and forked into gthread
+workers. Database connections inherited from the master are discarded after
+fork, the scheduler runs only in the worker that holds SCHEDULER_LOCK_FILE,
+and SIGTERM drains in-flight requests and running jobs before exiting.
+With INVENTORY_ENGINE_ENABLED the in-memory inventory and its journal must
+belong to one process: serve.py then runs a single worker and builds the app
+in it rather than in the master, so a replacement worker replays the journal
+instead of inheriting the master's copy of the lots.
+Use `python run.py` for the local debug server.
+"""
+
+import argparse
+import fcntl
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+from werkzeug.utils import import_string
+
+
+def default_workers():
+    return int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+
+def inventory_engine_enabled():
+    config = import_string(os.environ['FLASK_CONFIG'])
+    return bool(getattr(config, 'INVENTORY_ENGINE_ENABLED', False))
+
+
+def default_threads():
+    return int(os.environ.get('WEB_THREADS', 4))
+
+
+class TeamcookApplication(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import create_app
+        return create_app()
+
+
+def post_fork(server, worker):
+    """Drop pooled connections copied from the master process."""
+    from app import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Start the scheduler in exactly one worker, chosen by a file lock."""
+    from app import start_scheduler
+    app = worker.app.wsgi()
+    lock_path = app.config['SCHEDULER_LOCK_FILE']
+    lock_file = open(lock_path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return
+    # Keep the descriptor open: the lock is released when this worker exits
+    worker.scheduler_lock = lock_file
+    with app.app_context():
+        start_scheduler()
+    worker.log.info('Scheduler started in worker %s', worker.pid)
+
+
+def worker_exit(server, worker):
+    """Let running jobs finish and close connections on graceful shutdown."""
+    from app import db, shutdown_scheduler
+    shutdown_scheduler(wait=True)
+    app = worker.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run TeamCook API under gunicorn.')
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threads', type=int, default=default_threads())
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WEB_TIMEOUT', 30)))
+    args = parser.parse_args()
+
+    os.environ.setdefault('FLASK_CONFIG', 'config.ProductionConfig')
+    single_process = inventory_engine_enabled()
+    workers = args.workers or (1 if single_process else default_workers())
+    if single_process and workers > 1:
+        parser.error('INVENTORY_ENGINE_ENABLED needs a single worker; use --workers 1 or turn the engine off')
+    options = {
+        'bind': args.bind,
+        'workers': workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': not single_process,
+        'timeout': args.timeout,
+        'graceful_timeout': args.timeout,
+        'keepalive': 5,
+        # Recycle workers periodically to bound memory growth
+        'max_requests': 5000,
+        'max_requests_jitter': 500,
+        # Requests are logged as JSON lines by app.log instead
+        'accesslog': None,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+    TeamcookApplication(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ const api = axios.create({
   withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
+    // Every inventory endpoint is scoped to one restaurant
+    'X-Restaurant-Id': process.env.REACT_APP_RESTAURANT_ID || '1',
   },
 })
 
@@ -11,24 +11,20 @@ const Dashboard = () => {
   const [stockHistory, setStockHistory] = useState({ dates: [], raw_data: [], processed_data: [] })
 
   useEffect(() => {
-    // Fetch stock counts
+    // Fetch every KPI for the last 7 days in one request
     api
-      .get('/stats/stock_counts')
+      .get('/stats/dashboard')
       .then((response) => {
-        setStockCounts(response.data)
+        const { stock, series } = response.data
+        setStockCounts({ raw_count: stock.raw_count, processed_count: stock.processed_count })
+        setStockHistory({
+          dates: series.map((bucket) => bucket.start),
+          raw_data: series.map((bucket) => bucket.purchases_by_type.Raw || 0),
+          processed_data: series.map((bucket) => bucket.purchases_by_type.Processed || 0),
+        })
       })
       .catch((error) => {
-        console.error('Error fetching stock counts:', error)
-      })
-
-    // Fetch stock history
-    api
-      .get('/stats/stock_history')
-      .then((response) => {
-        setStockHistory(response.data)
-      })
-      .catch((error) => {
-        console.error('Error fetching stock history:', error)
+        console.error('Error fetching dashboard stats:', error)
       })
   }, [])
 